@@ -0,0 +1,35 @@
+"""use numeric invoice amounts
+
+Revision ID: 6a3c9d2e8f14
+Revises: 4d8e1f0b7a25
+Create Date: 2026-10-18 16:41:09.304117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a3c9d2e8f14'
+down_revision: Union[str, Sequence[str], None] = '4d8e1f0b7a25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('invoices') as batch_op:
+        batch_op.alter_column('total_amount', existing_type=sa.Float(), type_=sa.Numeric(precision=12, scale=2), existing_nullable=True)
+    with op.batch_alter_table('invoice_items') as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Float(), type_=sa.Numeric(precision=12, scale=2), existing_nullable=True)
+    # Totals were client-supplied until now; run `python -m ToDoApp.billing` after upgrading.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('invoice_items') as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Numeric(precision=12, scale=2), type_=sa.Float(), existing_nullable=True)
+    with op.batch_alter_table('invoices') as batch_op:
+        batch_op.alter_column('total_amount', existing_type=sa.Numeric(precision=12, scale=2), type_=sa.Float(), existing_nullable=True)
@@ -0,0 +1,28 @@
+"""add appointment duration
+
+Revision ID: 8e5b2a7c4f19
+Revises: 6a3c9d2e8f14
+Create Date: 2026-10-18 18:02:47.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e5b2a7c4f19'
+down_revision: Union[str, Sequence[str], None] = '6a3c9d2e8f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('appointments', sa.Column('duration_minutes', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('appointments', 'duration_minutes')
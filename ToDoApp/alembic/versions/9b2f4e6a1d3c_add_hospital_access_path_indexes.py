@@ -0,0 +1,64 @@
+"""add hospital access path indexes
+
+Revision ID: 9b2f4e6a1d3c
+Revises: 1c311bce95f8
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2f4e6a1d3c'
+down_revision: Union[str, Sequence[str], None] = '1c311bce95f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# SQL Server cannot use NVARCHAR(max) as an index key, so the status
+# columns are narrowed to the length the API already enforces.
+STATUS_TABLES = ('appointments', 'lab_tests', 'invoices')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in STATUS_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('status', existing_type=sa.String(), type_=sa.String(length=50), existing_nullable=True)
+
+    op.create_index('ix_appointments_patient_id_scheduled_at', 'appointments', ['patient_id', 'scheduled_at'], unique=False)
+    op.create_index('ix_appointments_doctor_id_scheduled_at', 'appointments', ['doctor_id', 'scheduled_at'], unique=False)
+    op.create_index('ix_appointments_scheduled_at', 'appointments', ['scheduled_at'], unique=False)
+    op.create_index('ix_admissions_patient_id_admitted_at', 'admissions', ['patient_id', 'admitted_at'], unique=False)
+    op.create_index('ix_admissions_attending_doctor_id_admitted_at', 'admissions', ['attending_doctor_id', 'admitted_at'], unique=False)
+    op.create_index('ix_admissions_discharged_at', 'admissions', ['discharged_at'], unique=False)
+    op.create_index('ix_prescriptions_patient_id_issued_at', 'prescriptions', ['patient_id', 'issued_at'], unique=False)
+    op.create_index(op.f('ix_prescription_items_prescription_id'), 'prescription_items', ['prescription_id'], unique=False)
+    op.create_index('ix_lab_tests_patient_id_ordered_at', 'lab_tests', ['patient_id', 'ordered_at'], unique=False)
+    op.create_index('ix_lab_tests_status_ordered_at', 'lab_tests', ['status', 'ordered_at'], unique=False)
+    op.create_index('ix_invoices_patient_id_issued_at', 'invoices', ['patient_id', 'issued_at'], unique=False)
+    op.create_index('ix_invoices_status_issued_at', 'invoices', ['status', 'issued_at'], unique=False)
+    op.create_index(op.f('ix_invoice_items_invoice_id'), 'invoice_items', ['invoice_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_invoice_items_invoice_id'), table_name='invoice_items')
+    op.drop_index('ix_invoices_status_issued_at', table_name='invoices')
+    op.drop_index('ix_invoices_patient_id_issued_at', table_name='invoices')
+    op.drop_index('ix_lab_tests_status_ordered_at', table_name='lab_tests')
+    op.drop_index('ix_lab_tests_patient_id_ordered_at', table_name='lab_tests')
+    op.drop_index(op.f('ix_prescription_items_prescription_id'), table_name='prescription_items')
+    op.drop_index('ix_prescriptions_patient_id_issued_at', table_name='prescriptions')
+    op.drop_index('ix_admissions_discharged_at', table_name='admissions')
+    op.drop_index('ix_admissions_attending_doctor_id_admitted_at', table_name='admissions')
+    op.drop_index('ix_admissions_patient_id_admitted_at', table_name='admissions')
+    op.drop_index('ix_appointments_scheduled_at', table_name='appointments')
+    op.drop_index('ix_appointments_doctor_id_scheduled_at', table_name='appointments')
+    op.drop_index('ix_appointments_patient_id_scheduled_at', table_name='appointments')
+
+    for table in STATUS_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('status', existing_type=sa.String(length=50), type_=sa.String(), existing_nullable=True)
@@ -0,0 +1,38 @@
+"""add admission daily stats
+
+Revision ID: b7d41c9e2a60
+Revises: 8e5b2a7c4f19
+Create Date: 2026-10-18 19:26:12.804419
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d41c9e2a60'
+down_revision: Union[str, Sequence[str], None] = '8e5b2a7c4f19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('admission_daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('admissions', sa.Integer(), nullable=False),
+    sa.Column('discharges', sa.Integer(), nullable=False),
+    sa.Column('stay_minutes', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'doctor_id')
+    )
+    op.create_index('ix_admissions_admitted_at', 'admissions', ['admitted_at'], unique=False)
+    # Existing admissions are not counted yet; run `python -m ToDoApp.census` after upgrading.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_admissions_admitted_at', table_name='admissions')
+    op.drop_table('admission_daily_stats')
@@ -0,0 +1,34 @@
+"""add lab test claims
+
+Revision ID: c3f8a1d5e7b2
+Revises: b7d41c9e2a60
+Create Date: 2026-10-18 21:14:09.306517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8a1d5e7b2'
+down_revision: Union[str, Sequence[str], None] = 'b7d41c9e2a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('lab_tests') as batch_op:
+        batch_op.add_column(sa.Column('claimed_by', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key('fk_lab_tests_claimed_by_users', 'users', ['claimed_by'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('lab_tests') as batch_op:
+        batch_op.drop_constraint('fk_lab_tests_claimed_by_users', type_='foreignkey')
+        batch_op.drop_column('claimed_at')
+        batch_op.drop_column('claimed_by')
@@ -0,0 +1,36 @@
+"""add patient search grams
+
+Revision ID: d5a9e3c7b1f4
+Revises: c3f8a1d5e7b2
+Create Date: 2026-10-18 23:02:31.874120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a9e3c7b1f4'
+down_revision: Union[str, Sequence[str], None] = 'c3f8a1d5e7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('patient_search_grams',
+    sa.Column('gram', sa.String(length=3), nullable=False),
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('gram', 'patient_id'),
+    sqlite_with_rowid=False
+    )
+    op.create_index('ix_patient_search_grams_patient_id', 'patient_search_grams', ['patient_id'], unique=False)
+    # Existing patients are not indexed yet; run `python -m ToDoApp.patient_search` after upgrading.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_patient_search_grams_patient_id', table_name='patient_search_grams')
+    op.drop_table('patient_search_grams')
@@ -0,0 +1,97 @@
+import argparse
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import Numeric, bindparam, func, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from .crud import WriteHooks, commit_write
+from .database import SessionLocal
+from .models import InvoiceItems, Invoices
+
+RECONCILE_CHUNK_SIZE = 1000
+
+invoices = Invoices.__table__
+invoice_items = InvoiceItems.__table__
+
+# One executemany for all invoices touched by a write; ROUND keeps SQLite's
+# float storage from accumulating noise (SQL Server's DECIMAL is exact anyway).
+adjust_total_statement = (
+    update(invoices)
+    .where(invoices.c.id == bindparam("invoice"))
+    .values(total_amount=func.round(
+        func.coalesce(invoices.c.total_amount, 0) + bindparam("delta", type_=Numeric(12, 2)), 2,
+    ))
+)
+
+
+def adjust_invoice_totals(db: Session, deltas: dict) -> None:
+    params = [{"invoice": invoice_id, "delta": delta} for invoice_id, delta in deltas.items()
+              if invoice_id is not None and delta]
+    if params:
+        db.execute(adjust_total_statement, params)
+
+
+class InvoiceTotals(WriteHooks):
+    # Keeps invoices.total_amount equal to the sum of its items by applying
+    # each item write as a delta in the same transaction.
+    touches = (Invoices,)
+
+    def created(self, db: Session, rows: list[Row]) -> None:
+        deltas = defaultdict(Decimal)
+        for row in rows:
+            deltas[row.invoice_id] += row.amount or 0
+        adjust_invoice_totals(db, deltas)
+
+    def updated(self, db: Session, old: Row, new: Row) -> None:
+        # An item can move between invoices, so both sides get a delta.
+        deltas = defaultdict(Decimal)
+        deltas[old.invoice_id] -= old.amount or 0
+        deltas[new.invoice_id] += new.amount or 0
+        adjust_invoice_totals(db, deltas)
+
+    def deleted(self, db: Session, old: Row) -> None:
+        adjust_invoice_totals(db, {old.invoice_id: -(old.amount or 0)})
+
+
+def reconcile_invoice_totals(db: Session, chunk_size: int = RECONCILE_CHUNK_SIZE) -> int:
+    # Recomputes totals from invoice_items in id-ordered chunks, one short
+    # transaction each, and only rewrites invoices that drifted.
+    item_total = (
+        select(func.round(func.coalesce(func.sum(invoice_items.c.amount), 0), 2))
+        .where(invoice_items.c.invoice_id == invoices.c.id)
+        .scalar_subquery()
+    )
+    fixed = 0
+    after = 0
+    while True:
+        ids = db.execute(
+            select(invoices.c.id).where(invoices.c.id > after).order_by(invoices.c.id).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            return fixed
+        drifted = db.execute(
+            update(invoices)
+            .where(invoices.c.id > after, invoices.c.id <= ids[-1])
+            .where(or_(invoices.c.total_amount.is_(None), invoices.c.total_amount != item_total))
+            .values(total_amount=item_total)
+        ).rowcount
+        if drifted:
+            commit_write(db, Invoices)
+        else:
+            db.commit()
+        fixed += drifted
+        after = ids[-1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fix invoice totals that drifted from their items.")
+    parser.add_argument("--chunk-size", type=int, default=RECONCILE_CHUNK_SIZE)
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        print(f"Reconciled {reconcile_invoice_totals(db, args.chunk_size)} invoice totals.")
+
+
+if __name__ == "__main__":
+    main()
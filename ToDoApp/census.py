@@ -0,0 +1,198 @@
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .crud import WriteHooks
+from .database import SessionLocal
+from .models import AdmissionDailyStats, Admissions, Doctors
+
+BACKFILL_CHUNK_DAYS = 31
+CENSUS_MAX_DAYS = 366
+# Rollup key for admissions without an attending doctor.
+UNASSIGNED_DOCTOR = 0
+
+admissions = Admissions.__table__
+doctors = Doctors.__table__
+stats = AdmissionDailyStats.__table__
+
+
+def stay_minutes(row) -> int:
+    if row.admitted_at is None:
+        return 0
+    return max(int((row.discharged_at - row.admitted_at).total_seconds() // 60), 0)
+
+
+def contributions(row) -> list[tuple[tuple[date, int], tuple[int, int, int]]]:
+    # What one admission adds to the rollup: an admission on the day it was
+    # admitted and a discharge, with its length of stay, on the day it left.
+    doctor_id = row.attending_doctor_id or UNASSIGNED_DOCTOR
+    found = []
+    if row.admitted_at is not None:
+        found.append(((row.admitted_at.date(), doctor_id), (1, 0, 0)))
+    if row.discharged_at is not None:
+        found.append(((row.discharged_at.date(), doctor_id), (0, 1, stay_minutes(row))))
+    return found
+
+
+def accumulate(totals: dict, rows, sign: int = 1) -> dict:
+    for row in rows:
+        for key, values in contributions(row):
+            totals[key] = [total + sign * value for total, value in zip(totals[key], values)]
+    return totals
+
+
+def empty_totals() -> dict:
+    return defaultdict(lambda: [0, 0, 0])
+
+
+def apply_rollup_deltas(db: Session, deltas: dict) -> None:
+    for (day, doctor_id), (admitted, discharged, stay) in deltas.items():
+        if not (admitted or discharged or stay):
+            continue
+        key = and_(stats.c.day == day, stats.c.doctor_id == doctor_id)
+        change = update(stats).where(key).values(
+            admissions=stats.c.admissions + admitted,
+            discharges=stats.c.discharges + discharged,
+            stay_minutes=stats.c.stay_minutes + stay,
+        )
+        if db.execute(change).rowcount:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(stats).values(day=day, doctor_id=doctor_id, admissions=admitted,
+                                                discharges=discharged, stay_minutes=stay))
+        except IntegrityError:
+            # Another transaction created the row in the meantime.
+            db.execute(change)
+
+
+class CensusRollup(WriteHooks):
+    # Keeps admission_daily_stats in step with admissions by applying each
+    # write as a delta in the same transaction: the new row's contributions
+    # minus the old row's.
+    def created(self, db: Session, rows: list[Row]) -> None:
+        apply_rollup_deltas(db, accumulate(empty_totals(), rows))
+
+    def updated(self, db: Session, old: Row, new: Row) -> None:
+        apply_rollup_deltas(db, accumulate(accumulate(empty_totals(), [new]), [old], -1))
+
+    def deleted(self, db: Session, old: Row) -> None:
+        apply_rollup_deltas(db, accumulate(empty_totals(), [old], -1))
+
+
+def history_bounds(db: Session) -> Optional[tuple[date, date]]:
+    first_admitted, last_admitted, first_discharged, last_discharged = db.execute(select(
+        func.min(admissions.c.admitted_at), func.max(admissions.c.admitted_at),
+        func.min(admissions.c.discharged_at), func.max(admissions.c.discharged_at),
+    )).one()
+    found = [value for value in (first_admitted, last_admitted, first_discharged, last_discharged) if value]
+    if not found:
+        return None
+    return min(found).date(), max(found).date() + timedelta(days=1)
+
+
+def rebuild_admission_stats(db: Session, chunk_days: int = BACKFILL_CHUNK_DAYS, start: Optional[date] = None,
+                            end: Optional[date] = None) -> int:
+    # Recomputes the rollup for [start, end) a range of days at a time, one
+    # short transaction each, from two indexed range scans on admitted_at and
+    # discharged_at. Days outside the range are left alone.
+    if start is None or end is None:
+        bounds = history_bounds(db)
+        if bounds is None:
+            return 0
+        start, end = start or bounds[0], end or bounds[1]
+    rebuilt = 0
+    day = start
+    while day < end:
+        until = min(day + timedelta(days=chunk_days), end)
+        low, high = datetime.combine(day, time()), datetime.combine(until, time())
+        rows = db.execute(
+            select(admissions.c.attending_doctor_id, admissions.c.admitted_at, admissions.c.discharged_at)
+            .where(or_(and_(admissions.c.admitted_at >= low, admissions.c.admitted_at < high),
+                       and_(admissions.c.discharged_at >= low, admissions.c.discharged_at < high)))
+        ).all()
+        totals = {key: values for key, values in accumulate(empty_totals(), rows).items() if day <= key[0] < until}
+        db.execute(delete(stats).where(stats.c.day >= day, stats.c.day < until))
+        if totals:
+            db.execute(insert(stats), [
+                {"day": key_day, "doctor_id": doctor_id, "admissions": admitted, "discharges": discharged,
+                 "stay_minutes": stay}
+                for (key_day, doctor_id), (admitted, discharged, stay) in totals.items()
+            ])
+        db.commit()
+        rebuilt += len(totals)
+        day = until
+    return rebuilt
+
+
+def census_report(db: Session, start: date, end: date, group_by: str = "hospital") -> list[dict]:
+    # Daily census for [start, end) from the rollup alone: the census on a day
+    # is everyone admitted up to it minus everyone discharged up to it, so one
+    # grouped query gives the opening census and one gives the days in range.
+    field, group = {
+        "hospital": (None, None),
+        "doctor": ("doctor_id", stats.c.doctor_id),
+        "department": ("department_id", doctors.c.department_id),
+    }[group_by]
+    keys = [group] if group is not None else []
+    source = stats.outerjoin(doctors, doctors.c.id == stats.c.doctor_id) if group_by == "department" else stats
+
+    opening = {}
+    statement = (
+        select(*keys, func.sum(stats.c.admissions - stats.c.discharges))
+        .select_from(source).where(stats.c.day < start).group_by(*keys)
+    )
+    for row in db.execute(statement):
+        if row[-1]:
+            opening[row[0] if keys else None] = row[-1]
+
+    activity = {}
+    statement = (
+        select(*keys, stats.c.day, func.sum(stats.c.admissions), func.sum(stats.c.discharges),
+               func.sum(stats.c.stay_minutes))
+        .select_from(source).where(stats.c.day >= start, stats.c.day < end).group_by(*keys, stats.c.day)
+    )
+    for row in db.execute(statement):
+        key = row[0] if keys else None
+        activity[key, row[-4]] = row[-3:]
+
+    report = []
+    groups = set(opening) | {key for key, _ in activity}
+    if not keys:
+        # The hospital as a whole gets every day, even with nothing recorded.
+        groups.add(None)
+    for key in sorted(groups, key=lambda key: (key is None, key)):
+        census = opening.get(key, 0)
+        day = start
+        while day < end:
+            admitted, discharged, stay = activity.get((key, day), (0, 0, 0))
+            census += admitted - discharged
+            entry = {
+                "day": day, "admissions": admitted, "discharges": discharged, "census": census,
+                "average_stay_days": round(stay / discharged / 1440, 2) if discharged else None,
+            }
+            if field is not None:
+                entry[field] = None if field == "doctor_id" and key == UNASSIGNED_DOCTOR else key
+            report.append(entry)
+            day += timedelta(days=1)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild admission_daily_stats from admissions.")
+    parser.add_argument("--chunk-days", type=int, default=BACKFILL_CHUNK_DAYS)
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="first day to rebuild")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="day after the last one to rebuild")
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        print(f"Rebuilt {rebuild_admission_stats(db, args.chunk_days, args.start, args.end)} census rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,580 @@
+import os
+import threading
+from typing import Annotated, Any, Literal, Optional
+
+from fastapi import APIRouter, Body, HTTPException, Path, Request, Response
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache
+from .invalidation import bump_version, bump_version_async, invalidation_bus
+from .pagination import Page, page_dependency, paginate, paginate_async
+from .streaming import stream_ndjson, stream_ndjson_async
+
+LIST_CACHE_SIZE = int(os.getenv('LIST_CACHE_SIZE', '256'))
+LIST_CACHE_TTL = int(os.getenv('LIST_CACHE_TTL', '60'))
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '1000'))
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '10000'))
+
+# Writes go through Core statements with RETURNING (OUTPUT inserted.* on SQL
+# Server), so each create/update/delete is a single round trip instead of
+# SELECT + write + refresh. The same transaction bumps the table's row in
+# cache_versions, which is how other workers learn about the write.
+
+
+class WriteRejected(HTTPException):
+    # Raised by hooks to veto a write. The transaction rolls back and the client
+    # gets a 409; bulk creates report it per item like a constraint violation.
+    def __init__(self, detail: str):
+        super().__init__(status_code=409, detail=detail)
+
+
+def after_commit(db: Session, callback) -> None:
+    # For in-memory state that must only follow writes that actually committed.
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def run_after_commit(session: Session) -> None:
+    for callback in session.info.pop("after_commit", ()):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_after_commit(session: Session) -> None:
+    session.info.pop("after_commit", None)
+
+
+class WriteHooks:
+    # Side effects that must commit with a write, e.g. maintaining a parent's
+    # aggregate. Each method runs inside the write's transaction, after the
+    # statement and before the commit, and may raise WriteRejected to undo it.
+    # `touches` lists the other models whose cache version the hooks change.
+    touches: tuple = ()
+
+    def creating(self, values: list[dict]) -> None:
+        # Runs before the INSERT, for checks cheap enough to skip the round trip.
+        pass
+
+    def created(self, db: Session, rows: list[Row]) -> None:
+        pass
+
+    def updated(self, db: Session, old: Row, new: Row) -> None:
+        pass
+
+    def deleted(self, db: Session, old: Row) -> None:
+        pass
+
+
+class ChainedHooks(WriteHooks):
+    # Several hooks on one resource, run in the order given.
+    def __init__(self, *hooks: WriteHooks):
+        self.hooks = hooks
+        self.touches = tuple(dict.fromkeys(model for hook in hooks for model in hook.touches))
+
+    def creating(self, values: list[dict]) -> None:
+        for hook in self.hooks:
+            hook.creating(values)
+
+    def created(self, db: Session, rows: list[Row]) -> None:
+        for hook in self.hooks:
+            hook.created(db, rows)
+
+    def updated(self, db: Session, old: Row, new: Row) -> None:
+        for hook in self.hooks:
+            hook.updated(db, old, new)
+
+    def deleted(self, db: Session, old: Row) -> None:
+        for hook in self.hooks:
+            hook.deleted(db, old)
+
+
+def get_statement(model, item_id: int):
+    table = model.__table__
+    return select(*table.columns).where(table.c.id == item_id)
+
+
+def lock_statement(model, item_id: int):
+    # The row as get_statement reads it, locked until the transaction ends.
+    # SQL Server ignores FOR UPDATE, so it gets the lock as a table hint.
+    table = model.__table__
+    return get_statement(model, item_id).with_for_update().with_hint(table, "WITH (UPDLOCK, ROWLOCK)", "mssql")
+
+
+def insert_statement(model, values: dict):
+    return insert(model.__table__).values(**values).returning(*model.__table__.columns)
+
+
+def update_statement(model, item_id: int, values: dict):
+    table = model.__table__
+    if not values:
+        # Nothing to SET, an empty UPDATE is invalid SQL.
+        return get_statement(model, item_id)
+    return update(table).where(table.c.id == item_id).values(**values).returning(*table.columns)
+
+
+def delete_statement(model, item_id: int, returning: bool = False):
+    table = model.__table__
+    statement = delete(table).where(table.c.id == item_id)
+    return statement.returning(*table.columns) if returning else statement
+
+
+def touched(hooks: Optional[WriteHooks]) -> tuple:
+    return hooks.touches if hooks is not None else ()
+
+
+def get_row(db: Session, model, item_id: int) -> Optional[Row]:
+    return db.execute(get_statement(model, item_id)).one_or_none()
+
+
+def commit_write(db: Session, *models) -> None:
+    versions = [(model.__tablename__, bump_version(db, model.__tablename__)) for model in models]
+    db.commit()
+    for name, version in versions:
+        invalidation_bus.observe(name, version)
+
+
+def create_row(db: Session, model, values: dict, hooks: Optional[WriteHooks] = None) -> Row:
+    if hooks is not None:
+        hooks.creating([values])
+    row = db.execute(insert_statement(model, values)).one()
+    if hooks is not None:
+        hooks.created(db, [row])
+    commit_write(db, model, *touched(hooks))
+    return row
+
+
+def check_references(db: Session, model, rows: list[dict], skip: tuple = ()) -> None:
+    # Every foreign key the rows set must name an existing row: one query per
+    # key for all the rows. SQLite does not enforce foreign keys, and on SQL
+    # Server this turns a failed write into a 422 naming the bad value.
+    for column in model.__table__.columns:
+        if column.name in skip:
+            continue
+        for foreign_key in column.foreign_keys:
+            wanted = {row[column.name] for row in rows if row.get(column.name) is not None}
+            if not wanted:
+                continue
+            target = foreign_key.column
+            missing = wanted - set(db.execute(select(target).where(target.in_(wanted))).scalars())
+            if missing:
+                raise HTTPException(status_code=422, detail=f"Unknown {column.name} {min(missing)}.")
+
+
+def create_with_children(db: Session, model, values: dict, child_model, parent_key: str,
+                         children: list[dict]) -> tuple[Row, list[Row]]:
+    # Parent and children commit together: one INSERT for the parent and one
+    # executemany INSERT for the children, both returning their rows.
+    check_references(db, model, [values])
+    check_references(db, child_model, children, skip=(parent_key,))
+    parent = db.execute(insert_statement(model, values)).one()
+    table = child_model.__table__
+    rows = db.execute(
+        insert(table).returning(*table.columns, sort_by_parameter_order=True),
+        [{**child, parent_key: parent.id} for child in children],
+    ).all()
+    commit_write(db, model, child_model)
+    return parent, rows
+
+
+def update_row(db: Session, model, item_id: int, values: dict, hooks: Optional[WriteHooks] = None) -> Optional[Row]:
+    old = None
+    if hooks is not None and values:
+        # Hooks need the previous values; lock the row so they stay accurate.
+        old = db.execute(lock_statement(model, item_id)).one_or_none()
+        if old is None:
+            return None
+    row = db.execute(update_statement(model, item_id, values)).one_or_none()
+    if row is not None and values:
+        if hooks is not None:
+            hooks.updated(db, old, row)
+        commit_write(db, model, *touched(hooks))
+    return row
+
+
+def delete_row(db: Session, model, item_id: int, hooks: Optional[WriteHooks] = None) -> bool:
+    if hooks is None:
+        deleted = db.execute(delete_statement(model, item_id)).rowcount
+    else:
+        old = db.execute(delete_statement(model, item_id, returning=True)).one_or_none()
+        deleted = old is not None
+        if deleted:
+            hooks.deleted(db, old)
+    if deleted:
+        commit_write(db, model, *touched(hooks))
+    return deleted > 0
+
+
+async def get_row_async(db: AsyncSession, model, item_id: int) -> Optional[Row]:
+    return (await db.execute(get_statement(model, item_id))).one_or_none()
+
+
+async def commit_write_async(db: AsyncSession, *models) -> None:
+    versions = [(model.__tablename__, await bump_version_async(db, model.__tablename__)) for model in models]
+    await db.commit()
+    for name, version in versions:
+        invalidation_bus.observe(name, version)
+
+
+# Hooks are plain sync code; run_sync hands them the AsyncSession's underlying Session.
+
+
+async def create_row_async(db: AsyncSession, model, values: dict, hooks: Optional[WriteHooks] = None) -> Row:
+    if hooks is not None:
+        hooks.creating([values])
+    row = (await db.execute(insert_statement(model, values))).one()
+    if hooks is not None:
+        await db.run_sync(hooks.created, [row])
+    await commit_write_async(db, model, *touched(hooks))
+    return row
+
+
+async def update_row_async(db: AsyncSession, model, item_id: int, values: dict,
+                           hooks: Optional[WriteHooks] = None) -> Optional[Row]:
+    old = None
+    if hooks is not None and values:
+        old = (await db.execute(lock_statement(model, item_id))).one_or_none()
+        if old is None:
+            return None
+    row = (await db.execute(update_statement(model, item_id, values))).one_or_none()
+    if row is not None and values:
+        if hooks is not None:
+            await db.run_sync(hooks.updated, old, row)
+        await commit_write_async(db, model, *touched(hooks))
+    return row
+
+
+async def delete_row_async(db: AsyncSession, model, item_id: int, hooks: Optional[WriteHooks] = None) -> bool:
+    if hooks is None:
+        deleted = (await db.execute(delete_statement(model, item_id))).rowcount
+    else:
+        old = (await db.execute(delete_statement(model, item_id, returning=True))).one_or_none()
+        deleted = old is not None
+        if deleted:
+            await db.run_sync(hooks.deleted, old)
+    if deleted:
+        await commit_write_async(db, model, *touched(hooks))
+    return deleted > 0
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: Literal["created", "invalid", "failed"]
+    id: Optional[int] = None
+    errors: Optional[list[dict]] = None
+
+
+class BulkResult(BaseModel):
+    created: int
+    failed: int
+    items: list[BulkItemResult]
+
+
+def bulk_insert_statement(model, hooks: Optional[WriteHooks] = None):
+    # executemany with RETURNING; SQLAlchemy batches it into multi-row
+    # INSERTs and keeps the rows in parameter order. Hooks get whole rows.
+    table = model.__table__
+    columns = table.columns if hooks is not None else (table.c.id,)
+    return insert(table).returning(*columns, sort_by_parameter_order=True)
+
+
+def validate_items(schema, items: list) -> tuple[list, list]:
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.model_validate(item).model_dump()))
+        except ValidationError as exc:
+            errors = exc.errors(include_url=False, include_context=False, include_input=False)
+            results[index] = BulkItemResult(index=index, status="invalid", errors=errors)
+    return results, valid
+
+
+def chunks(rows: list, size: int = BULK_CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def failed_item(index: int, exc: Exception) -> BulkItemResult:
+    message = exc.detail if isinstance(exc, WriteRejected) else str(exc.orig)
+    return BulkItemResult(index=index, status="failed", errors=[{"msg": message}])
+
+
+def bulk_result(results: list) -> BulkResult:
+    created = sum(result.status == "created" for result in results)
+    return BulkResult(created=created, failed=len(results) - created, items=results)
+
+
+def bulk_create_rows(db: Session, model, schema, items: list, hooks: Optional[WriteHooks] = None) -> BulkResult:
+    results, valid = validate_items(schema, items)
+    for chunk in chunks(valid):
+        try:
+            if hooks is not None:
+                hooks.creating([values for _, values in chunk])
+            rows = db.execute(bulk_insert_statement(model, hooks), [values for _, values in chunk]).all()
+            if hooks is not None:
+                hooks.created(db, rows)
+            commit_write(db, model, *touched(hooks))
+        except (IntegrityError, WriteRejected):
+            # One bad row rolls back its chunk; retry the chunk row by row to find it.
+            db.rollback()
+            for index, values in chunk:
+                try:
+                    row = create_row(db, model, values, hooks)
+                    results[index] = BulkItemResult(index=index, status="created", id=row.id)
+                except (IntegrityError, WriteRejected) as exc:
+                    db.rollback()
+                    results[index] = failed_item(index, exc)
+            continue
+        for (index, _), row in zip(chunk, rows):
+            results[index] = BulkItemResult(index=index, status="created", id=row.id)
+    return bulk_result(results)
+
+
+async def bulk_create_rows_async(db: AsyncSession, model, schema, items: list,
+                                 hooks: Optional[WriteHooks] = None) -> BulkResult:
+    results, valid = validate_items(schema, items)
+    for chunk in chunks(valid):
+        try:
+            if hooks is not None:
+                hooks.creating([values for _, values in chunk])
+            rows = (await db.execute(bulk_insert_statement(model, hooks), [values for _, values in chunk])).all()
+            if hooks is not None:
+                await db.run_sync(hooks.created, rows)
+            await commit_write_async(db, model, *touched(hooks))
+        except (IntegrityError, WriteRejected):
+            await db.rollback()
+            for index, values in chunk:
+                try:
+                    row = await create_row_async(db, model, values, hooks)
+                    results[index] = BulkItemResult(index=index, status="created", id=row.id)
+                except (IntegrityError, WriteRejected) as exc:
+                    await db.rollback()
+                    results[index] = failed_item(index, exc)
+            continue
+        for (index, _), row in zip(chunk, rows):
+            results[index] = BulkItemResult(index=index, status="created", id=row.id)
+    return bulk_result(results)
+
+
+bulk_items = Annotated[list[Any], Body(max_length=BULK_MAX_ITEMS)]
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    # Weak comparison (RFC 9110 8.8.3.2): the W/ prefix is ignored on both sides.
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    return etag.removeprefix("W/") in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def with_etag(result, response: Response, etag: str):
+    # Handlers return either data for the response model or a ready Response.
+    (result if isinstance(result, Response) else response).headers["ETag"] = etag
+    return result
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+class CRUDResource:
+    # Everything the route factories need to expose one model:
+    # POST path, GET path, GET/PUT/DELETE path/{item_id}.
+    def __init__(self, path: str, model, create_schema, update_schema, out_schema, query_dependency,
+                 read_dependency, write_dependency, label: str, stream: bool = False, cached: bool = False,
+                 bulk: bool = False, hooks: Optional[WriteHooks] = None):
+        self.path = path
+        self.model = model
+        self.create_schema = create_schema
+        self.update_schema = update_schema
+        self.out_schema = out_schema
+        self.query_dependency = query_dependency
+        self.read_dependency = read_dependency
+        self.write_dependency = write_dependency
+        self.label = label
+        self.stream = stream
+        self.bulk = bulk
+        self.hooks = hooks
+        self.not_found = f"{label} not found."
+        # Route names follow the old hand-written handlers: list_patients, get_patient, ...
+        self.plural = model.__tablename__
+        self.singular = label.lower().replace(" ", "_")
+        self.page_model = Page[out_schema]
+        # Last cache_versions value seen for the table, from this or any other worker.
+        self.generation = 0
+        self._lock = threading.Lock()
+        # Rendered list pages keyed by query string, for small, rarely written tables.
+        self.cache = TTLCache(LIST_CACHE_SIZE, LIST_CACHE_TTL) if cached else None
+        invalidation_bus.subscribe(self.plural, self.invalidate)
+
+    def invalidate(self, version: int) -> None:
+        with self._lock:
+            self.generation = version
+            if self.cache is not None:
+                self.cache.clear()
+
+    def etag(self, generation: int) -> str:
+        # Read before querying, so a tag can lag the data it labels but never run ahead of it.
+        return f'W/"{self.plural}-{generation}"'
+
+    def cache_key(self, request: Request) -> tuple:
+        return tuple(sorted(request.query_params.multi_items()))
+
+    def store_page(self, key: tuple, generation: int, result) -> bytes:
+        if isinstance(result, Response):
+            body = result.body
+        else:
+            body = self.page_model.model_validate(result).model_dump_json().encode()
+        with self._lock:
+            # A write committed while this page was being read; do not cache it.
+            if generation == self.generation:
+                self.cache.set(key, body)
+        return body
+
+
+def add_crud_routes(router: APIRouter, db_dependency, resource: CRUDResource) -> None:
+    model, hooks = resource.model, resource.hooks
+    create_schema, update_schema = resource.create_schema, resource.update_schema
+    query_dependency = resource.query_dependency
+    read_dependency, write_dependency = resource.read_dependency, resource.write_dependency
+    # Only digits match, so static routes such as /doctors/availability can sit
+    # beside the item routes whichever router is mounted first.
+    item_path = resource.path + "/{item_id:int}"
+
+    @router.post(resource.path, response_model=resource.out_schema, status_code=201,
+                 name=f"create_{resource.singular}")
+    def create(payload: create_schema, db: db_dependency, user: write_dependency):
+        return create_row(db, model, payload.model_dump(), hooks)
+
+    if resource.bulk:
+        @router.post(resource.path + "/bulk", response_model=BulkResult, name=f"bulk_create_{resource.plural}")
+        def bulk_create(items: bulk_items, db: db_dependency, user: write_dependency):
+            return bulk_create_rows(db, model, create_schema, items, hooks)
+
+    def list_page(request: Request, response: Response, db: Session, query, page):
+        generation = resource.generation
+        etag = resource.etag(generation)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        if resource.cache is None:
+            return with_etag(paginate(db, query, page), response, etag)
+        key = resource.cache_key(request)
+        body = resource.cache.get(key)
+        if body is None:
+            body = resource.store_page(key, generation, paginate(db, query, page))
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    if resource.stream:
+        def list_all(request: Request, response: Response, db: db_dependency, user: read_dependency,
+                     page: page_dependency, query: query_dependency, stream: Optional[Literal["ndjson"]] = None):
+            if stream:
+                return stream_ndjson(db, query, after=page.after)
+            return list_page(request, response, db, query, page)
+    else:
+        def list_all(request: Request, response: Response, db: db_dependency, user: read_dependency,
+                     page: page_dependency, query: query_dependency):
+            return list_page(request, response, db, query, page)
+
+    router.add_api_route(resource.path, list_all, methods=["GET"], response_model=Page[resource.out_schema],
+                         name=f"list_{resource.plural}")
+
+    @router.get(item_path, response_model=resource.out_schema, name=f"get_{resource.singular}")
+    def get(request: Request, response: Response, db: db_dependency, item_id: int = Path(gt=0),
+            user: read_dependency = None):
+        etag = resource.etag(resource.generation)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        row = get_row(db, model, item_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail=resource.not_found)
+        return with_etag(row, response, etag)
+
+    @router.put(item_path, response_model=resource.out_schema,
+                name=f"update_{resource.singular}")
+    def update(payload: update_schema, db: db_dependency, item_id: int = Path(gt=0),
+               user: write_dependency = None):
+        row = update_row(db, model, item_id, payload.model_dump(exclude_unset=True), hooks)
+        if row is None:
+            raise HTTPException(status_code=404, detail=resource.not_found)
+        return row
+
+    @router.delete(item_path, status_code=204, name=f"delete_{resource.singular}")
+    def remove(db: db_dependency, item_id: int = Path(gt=0), user: write_dependency = None):
+        if not delete_row(db, model, item_id, hooks):
+            raise HTTPException(status_code=404, detail=resource.not_found)
+
+
+def add_async_crud_routes(router: APIRouter, db_dependency, resource: CRUDResource) -> None:
+    model, hooks = resource.model, resource.hooks
+    create_schema, update_schema = resource.create_schema, resource.update_schema
+    query_dependency = resource.query_dependency
+    read_dependency, write_dependency = resource.read_dependency, resource.write_dependency
+    item_path = resource.path + "/{item_id:int}"
+
+    @router.post(resource.path, response_model=resource.out_schema, status_code=201,
+                 name=f"create_{resource.singular}")
+    async def create(payload: create_schema, db: db_dependency, user: write_dependency):
+        return await create_row_async(db, model, payload.model_dump(), hooks)
+
+    if resource.bulk:
+        @router.post(resource.path + "/bulk", response_model=BulkResult, name=f"bulk_create_{resource.plural}")
+        async def bulk_create(items: bulk_items, db: db_dependency, user: write_dependency):
+            return await bulk_create_rows_async(db, model, create_schema, items, hooks)
+
+    async def list_page(request: Request, response: Response, db: AsyncSession, query, page):
+        generation = resource.generation
+        etag = resource.etag(generation)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        if resource.cache is None:
+            return with_etag(await paginate_async(db, query, page), response, etag)
+        key = resource.cache_key(request)
+        body = resource.cache.get(key)
+        if body is None:
+            body = resource.store_page(key, generation, await paginate_async(db, query, page))
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    if resource.stream:
+        async def list_all(request: Request, response: Response, db: db_dependency, user: read_dependency,
+                           page: page_dependency, query: query_dependency,
+                           stream: Optional[Literal["ndjson"]] = None):
+            if stream:
+                return stream_ndjson_async(db, query, after=page.after)
+            return await list_page(request, response, db, query, page)
+    else:
+        async def list_all(request: Request, response: Response, db: db_dependency, user: read_dependency,
+                           page: page_dependency, query: query_dependency):
+            return await list_page(request, response, db, query, page)
+
+    router.add_api_route(resource.path, list_all, methods=["GET"], response_model=Page[resource.out_schema],
+                         name=f"list_{resource.plural}")
+
+    @router.get(item_path, response_model=resource.out_schema, name=f"get_{resource.singular}")
+    async def get(request: Request, response: Response, db: db_dependency, item_id: int = Path(gt=0),
+                  user: read_dependency = None):
+        etag = resource.etag(resource.generation)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        row = await get_row_async(db, model, item_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail=resource.not_found)
+        return with_etag(row, response, etag)
+
+    @router.put(item_path, response_model=resource.out_schema,
+                name=f"update_{resource.singular}")
+    async def update(payload: update_schema, db: db_dependency, item_id: int = Path(gt=0),
+                     user: write_dependency = None):
+        row = await update_row_async(db, model, item_id, payload.model_dump(exclude_unset=True), hooks)
+        if row is None:
+            raise HTTPException(status_code=404, detail=resource.not_found)
+        return row
+
+    @router.delete(item_path, status_code=204, name=f"delete_{resource.singular}")
+    async def remove(db: db_dependency, item_id: int = Path(gt=0), user: write_dependency = None):
+        if not await delete_row_async(db, model, item_id, hooks):
+            raise HTTPException(status_code=404, detail=resource.not_found)
@@ -1,17 +1,154 @@
-from sqlalchemy import create_engine
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import QueuePool
 
 # SQL Server (Windows Authentication)
-SQLALCHEMY_DATABASE_URL = (
+DEFAULT_DATABASE_URL = (
     "mssql+pyodbc://@DESKTOP-7JIA76J\\SQLEXPRESS/Hospitalmanag"
     "?driver=ODBC+Driver+17+for+SQL+Server"
     "&trusted_connection=yes"
     "&TrustServerCertificate=yes"
 )
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return value.lower() in ("1", "true", "yes", "on") if value else default
+
+
+class PoolMetrics:
+    # Upper bounds (seconds) of the checkout-wait histogram buckets.
+    BUCKETS = (0.001, 0.01, 0.1, 1.0, float("inf"))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.histogram = [0] * len(self.BUCKETS)
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.histogram[next(i for i, bound in enumerate(self.BUCKETS) if wait <= bound)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_total, 6),
+                "wait_seconds_max": round(self.wait_max, 6),
+                "wait_seconds_avg": round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_histogram": {f"le_{bound}": count for bound, count in zip(self.BUCKETS, self.histogram)},
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    # _do_get is where a checkout blocks when the pool is exhausted, so timing
+    # it measures how long requests queue for a connection.
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            pool_metrics.record(time.perf_counter() - started, timed_out)
+
+
+def engine_options(url: str) -> dict:
+    url = make_url(url)
+    options = {}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            return options
+    options.update(
+        poolclass=MeteredQueuePool,
+        pool_size=env_int("DB_POOL_SIZE", 20),
+        max_overflow=env_int("DB_MAX_OVERFLOW", 20),
+        pool_timeout=env_int("DB_POOL_TIMEOUT", 30),
+        pool_recycle=env_int("DB_POOL_RECYCLE", 1800),
+        pool_pre_ping=env_bool("DB_POOL_PRE_PING", True),
+    )
+    if url.get_backend_name() == "mssql" and url.get_driver_name() == "pyodbc":
+        options["fast_executemany"] = env_bool("DB_FAST_EXECUTEMANY", True)
+    if os.getenv("DB_ISOLATION_LEVEL"):
+        options["isolation_level"] = os.environ["DB_ISOLATION_LEVEL"]
+    return options
+
+
+def apply_sqlite_profile(engine) -> None:
+    mmap_size = env_int("DB_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={mmap_size}")
+        cursor.close()
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    apply_sqlite_profile(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def async_database_url(url: str) -> str:
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    elif url.get_backend_name() == "mssql":
+        url = url.set(drivername="mssql+aioodbc")
+    return url.render_as_string(hide_password=False)
+
+
+# The async stack is opt-in: aiosqlite/aioodbc are only imported when enabled.
+HOSPITAL_ASYNC = env_bool("HOSPITAL_ASYNC", False)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = None
+AsyncSessionLocal = None
+if HOSPITAL_ASYNC:
+    async_options = engine_options(ASYNC_DATABASE_URL)
+    # Checkout metering hooks the sync QueuePool; the async engine keeps its default pool class.
+    async_options.pop("poolclass", None)
+    async_options.pop("fast_executemany", None)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_options)
+    if async_engine.dialect.name == "sqlite":
+        apply_sqlite_profile(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
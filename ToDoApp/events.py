@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from .crud import WriteHooks, after_commit
+from .invalidation import invalidation_bus
+from .models import Doctors
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+TOPIC_KINDS = ("patient", "doctor", "department")
+
+doctors = Doctors.__table__
+
+
+def parse_topic(topic: str) -> Optional[tuple[str, int]]:
+    kind, _, key = topic.partition(":")
+    if kind not in TOPIC_KINDS or not key.isdigit():
+        return None
+    return kind, int(key)
+
+
+class Subscription:
+    # One client's queue of serialized events, owned by the event loop that
+    # serves the client. When the client falls EVENT_QUEUE_SIZE events behind
+    # the queue is replaced by a single resync event, so a slow client costs
+    # bounded memory and learns it has to refetch.
+    def __init__(self, topics: frozenset, loop: asyncio.AbstractEventLoop, size: int):
+        self.topics = topics
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(size)
+
+    def put(self, message: str) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(json.dumps({"type": "resync", "reason": "lagging"}))
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def deliver(subscriptions: Iterable[Subscription], message: str) -> None:
+    for subscription in subscriptions:
+        subscription.put(message)
+
+
+class EventHub:
+    # In-process pub/sub. publish() may be called from any thread (sync
+    # handlers run in the threadpool); delivery is handed to each
+    # subscriber's event loop, once per loop and message. Topic sets are
+    # replaced on change, never modified, so publishers read them unlocked.
+    def __init__(self, size: int = EVENT_QUEUE_SIZE):
+        self.size = size
+        self._topics: dict[str, frozenset] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        subscription = Subscription(frozenset(topics), asyncio.get_running_loop(), self.size)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics[topic] = self._topics.get(topic, frozenset()) | {subscription}
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for topic in subscription.topics:
+                remaining = self._topics.get(topic, frozenset()) - {subscription}
+                if remaining:
+                    self._topics[topic] = remaining
+                else:
+                    self._topics.pop(topic, None)
+
+    def idle(self) -> bool:
+        return not self._topics
+
+    def _send(self, subscriptions: Iterable[Subscription], message: str) -> None:
+        by_loop = defaultdict(list)
+        for subscription in subscriptions:
+            by_loop[subscription.loop].append(subscription)
+        for loop, group in by_loop.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(deliver, group, message)
+
+    def publish(self, topic: str, event: dict) -> None:
+        subscriptions = self._topics.get(topic)
+        if subscriptions:
+            self._send(subscriptions, json.dumps({"topic": topic, **event}))
+
+    def broadcast(self, event: dict) -> None:
+        subscriptions = set().union(*self._topics.values())
+        if subscriptions:
+            self._send(subscriptions, json.dumps(event))
+
+
+class ChangeEvents(WriteHooks):
+    # Publishes a resource's committed writes to the patient, doctor and
+    # department topics of the rows involved (old and new, so a moved
+    # appointment reaches both doctors). `doctor_fields` name the row's
+    # doctor columns; the department comes from the doctor.
+    def __init__(self, hub: EventHub, resource: str, doctor_fields: tuple = ("doctor_id",)):
+        self.hub = hub
+        self.resource = resource
+        self.doctor_fields = doctor_fields
+
+    def topics(self, db: Session, rows: list) -> list[set[str]]:
+        doctor_ids = {getattr(row, field) for row in rows for field in self.doctor_fields} - {None}
+        departments = {}
+        if doctor_ids:
+            departments = dict(db.execute(
+                select(doctors.c.id, doctors.c.department_id).where(doctors.c.id.in_(doctor_ids))
+            ).all())
+        found = []
+        for row in rows:
+            topics = set()
+            if row.patient_id is not None:
+                topics.add(f"patient:{row.patient_id}")
+            for field in self.doctor_fields:
+                doctor_id = getattr(row, field)
+                if doctor_id is not None:
+                    topics.add(f"doctor:{doctor_id}")
+                    if departments.get(doctor_id) is not None:
+                        topics.add(f"department:{departments[doctor_id]}")
+            found.append(topics)
+        return found
+
+    def publish(self, db: Session, action: str, rows: list, previous: Optional[list] = None) -> None:
+        # Topics are worked out in the transaction, published after the commit.
+        if self.hub.idle():
+            return
+        topics = self.topics(db, rows + (previous or []))
+        events = []
+        for index, row in enumerate(rows):
+            targets = topics[index] | (topics[len(rows) + index] if previous else set())
+            event = {"type": f"{self.resource}.{action}", "id": row.id, "data": jsonable_encoder(dict(row._mapping))}
+            events.extend((topic, event) for topic in sorted(targets))
+        after_commit(db, lambda: [self.hub.publish(topic, event) for topic, event in events])
+
+    def created(self, db: Session, rows: list[Row]) -> None:
+        self.publish(db, "created", rows)
+
+    def updated(self, db: Session, old: Row, new: Row) -> None:
+        self.publish(db, "updated", [new], [old])
+
+    def deleted(self, db: Session, old: Row) -> None:
+        self.publish(db, "deleted", [old])
+
+
+event_hub = EventHub()
+
+
+def resync_remote_writes(name: str):
+    # Another worker's writes never pass through this hub; its subscribers
+    # are told to refetch instead. The bus runs this when it polls a new
+    # version, or when a local write skips one, so this is about one event
+    # per table and poll interval.
+    def resync(version: int) -> None:
+        event_hub.broadcast({"type": "resync", "reason": "remote_write", "resource": name})
+    return resync
+
+
+for table_name in ("appointments", "admissions", "lab_tests"):
+    invalidation_bus.subscribe(table_name, resync_remote_writes(table_name), remote_only=True)
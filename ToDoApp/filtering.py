@@ -0,0 +1,127 @@
+from typing import Optional
+
+from fastapi import HTTPException, Query, Request
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import and_, or_, select
+
+RANGE_OPERATORS = {
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+}
+
+row_adapter = TypeAdapter(dict)
+
+
+class ListQuery:
+    def __init__(self, model, schema, filters: list, order_by: str, descending: bool,
+                 fields: Optional[list[str]], adapters: dict):
+        self.model = model
+        self.schema = schema
+        self.filters = filters
+        self.order_by = order_by
+        self.descending = descending
+        self.fields = fields
+        self.adapters = adapters
+
+    @property
+    def sort_spec(self) -> str:
+        return f"-{self.order_by}" if self.descending else self.order_by
+
+    def columns(self) -> list:
+        table = self.model.__table__
+        if self.fields is None:
+            return list(table.columns)
+        names = dict.fromkeys(["id", self.order_by, *self.fields])
+        return [table.c[name] for name in names]
+
+    def statement(self):
+        table = self.model.__table__
+        keys = [table.c[self.order_by], table.c.id] if self.order_by != "id" else [table.c.id]
+        order = [key.desc() if self.descending else key.asc() for key in keys]
+        return select(*self.columns()).where(*self.filters).order_by(*order)
+
+    def position(self, row) -> dict:
+        position = {"id": row.id}
+        if self.order_by != "id":
+            position["o"] = self.sort_spec
+            position["k"] = row._mapping[self.order_by]
+        return position
+
+    def after(self, position: dict):
+        table = self.model.__table__
+        last_id = position["id"]
+        if self.order_by == "id":
+            return table.c.id < last_id if self.descending else table.c.id > last_id
+        if position.get("o") != self.sort_spec:
+            raise HTTPException(status_code=400, detail="Cursor does not match order_by.")
+        column = table.c[self.order_by]
+        key = parse_value(self.adapters[self.order_by], position.get("k"), self.order_by)
+        # SQL Server and SQLite both sort NULLs before any value.
+        if self.descending:
+            if key is None:
+                return and_(column.is_(None), table.c.id < last_id)
+            return or_(column < key, and_(column == key, table.c.id < last_id), column.is_(None))
+        if key is None:
+            return or_(column.is_not(None), table.c.id > last_id)
+        return or_(column > key, and_(column == key, table.c.id > last_id))
+
+    def sparse(self, row) -> dict:
+        mapping = row._mapping
+        return {name: mapping[name] for name in dict.fromkeys(["id", *self.fields])}
+
+    def to_json(self, row) -> str:
+        if self.fields is None:
+            return self.schema.model_validate(dict(row._mapping)).model_dump_json()
+        return row_adapter.dump_json(self.sparse(row)).decode()
+
+
+def parse_value(adapter: TypeAdapter, raw, name: str):
+    if raw is None:
+        return None
+    try:
+        return adapter.validate_python(raw)
+    except ValidationError:
+        raise HTTPException(status_code=400, detail=f"Invalid value for '{name}'.")
+
+
+def list_query(model, schema, filterable: tuple = ()):
+    table = model.__table__
+    adapters = {name: TypeAdapter(table.c[name].type.python_type) for name in ("id", *filterable)}
+
+    async def dependency(
+        request: Request,
+        order_by: Optional[str] = Query(default=None),
+        fields: Optional[str] = Query(default=None),
+    ) -> ListQuery:
+        filters = []
+        for key, raw in request.query_params.multi_items():
+            name, _, operator = key.partition("__")
+            if name not in table.c:
+                continue
+            if name not in filterable:
+                raise HTTPException(status_code=400, detail=f"Filtering on '{name}' is not supported.")
+            if operator and operator not in RANGE_OPERATORS:
+                raise HTTPException(status_code=400, detail=f"Unknown filter operator '{operator}'.")
+            value = parse_value(adapters[name], raw, key)
+            column = table.c[name]
+            filters.append(RANGE_OPERATORS[operator](column, value) if operator else column == value)
+
+        sort_name, descending = "id", False
+        if order_by:
+            descending = order_by.startswith("-")
+            sort_name = order_by.lstrip("-")
+            if sort_name not in adapters:
+                raise HTTPException(status_code=400, detail=f"Sorting on '{sort_name}' is not supported.")
+
+        selected = None
+        if fields:
+            selected = [name.strip() for name in fields.split(",") if name.strip()]
+            unknown = [name for name in selected if name not in schema.model_fields and name != "id"]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}.")
+
+        return ListQuery(model, schema, filters, sort_name, descending, selected, adapters)
+
+    return dependency
@@ -0,0 +1,117 @@
+import bisect
+import re
+from types import SimpleNamespace
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from .crud import WriteHooks, after_commit
+from .indexes import MaintainedIndex
+from .invalidation import invalidation_bus
+from .models import Medications
+
+SUGGEST_MAX_RESULTS = 50
+WORD = re.compile(r"\w+")
+
+medications = Medications.__table__
+
+
+class MedicationSuggestion(NamedTuple):
+    id: int
+    name: str
+
+
+def fold(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def name_keys(name: str) -> tuple[str, list[str]]:
+    # The whole folded name, and the rest of it from each later word on, so
+    # "clav" finds "Amoxicillin Clavulanate".
+    folded = fold(name)
+    return folded, [folded[match.start():] for match in WORD.finditer(folded) if match.start()]
+
+
+def prefixed(entries: list, prefix: str):
+    index = bisect.bisect_left(entries, (prefix,))
+    while index < len(entries) and entries[index][0].startswith(prefix):
+        yield entries[index]
+        index += 1
+
+
+class MedicationNameIndex(MaintainedIndex):
+    # Medication names in two sorted arrays of (key, id, name): whole names,
+    # and names from their second word on. A prefix is a bisect and a short
+    # scan. Writes insert into and remove from copies of the arrays, which
+    # then replace the ones readers may be scanning.
+    def __init__(self):
+        super().__init__(self.build(()))
+
+    def load(self, db: Session) -> list[Row]:
+        return db.execute(select(medications.c.id, medications.c.name)).all()
+
+    def build(self, rows) -> SimpleNamespace:
+        state = SimpleNamespace(names=[], words=[], by_id={})
+        for row in rows:
+            if row.name:
+                state.by_id[row.id] = row.name
+                whole, words = name_keys(row.name)
+                state.names.append((whole, row.id, row.name))
+                state.words.extend((key, row.id, row.name) for key in words)
+        state.names.sort()
+        state.words.sort()
+        return state
+
+    def apply(self, state: SimpleNamespace, medication_id: int, name: Optional[str]) -> None:
+        names, words = list(state.names), list(state.words)
+        previous = state.by_id.pop(medication_id, None)
+        if previous is not None:
+            whole, keys = name_keys(previous)
+            for entries, key in [(names, whole)] + [(words, key) for key in keys]:
+                index = bisect.bisect_left(entries, (key, medication_id, previous))
+                if index < len(entries) and entries[index] == (key, medication_id, previous):
+                    del entries[index]
+        if name:
+            state.by_id[medication_id] = name
+            whole, keys = name_keys(name)
+            bisect.insort(names, (whole, medication_id, name))
+            for key in keys:
+                bisect.insort(words, (key, medication_id, name))
+        state.names, state.words = names, words
+
+    def suggest(self, prefix: str, limit: int) -> list[MedicationSuggestion]:
+        # Names starting with the prefix first, then names with a later word
+        # that does, each in alphabetical order.
+        prefix = fold(prefix)
+        state = self.state
+        found = {}
+        for entries in (state.names, state.words):
+            for _, medication_id, name in prefixed(entries, prefix):
+                found.setdefault(medication_id, MedicationSuggestion(medication_id, name))
+                if len(found) == limit:
+                    return list(found.values())
+        return list(found.values())
+
+
+class MedicationNameUpdates(WriteHooks):
+    # Records medication writes in the name index once they commit.
+    def __init__(self, index: MedicationNameIndex):
+        self.index = index
+
+    def created(self, db: Session, rows: list[Row]) -> None:
+        entries = [(row.id, row.name) for row in rows]
+        after_commit(db, lambda: [self.index.record(medication_id, name) for medication_id, name in entries])
+
+    def updated(self, db: Session, old: Row, new: Row) -> None:
+        after_commit(db, lambda: self.index.record(new.id, new.name))
+
+    def deleted(self, db: Session, old: Row) -> None:
+        after_commit(db, lambda: self.index.record(old.id, None))
+
+
+medication_names = MedicationNameIndex()
+# Reloaded on the next read after another worker writes medications (and on
+# startup, via the bus's first poll).
+invalidation_bus.subscribe(medications.name, medication_names.invalidate, remote_only=True)
@@ -0,0 +1,92 @@
+import logging
+from abc import ABC, abstractmethod
+import threading
+from typing import Any, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class MaintainedIndex(ABC):
+    # In-memory state derived from database rows. warm() loads it, this
+    # worker's committed writes keep it current through record() (usually
+    # from an after_commit callback in a WriteHooks), and invalidate() is
+    # subscribed to the bus for writes made by other workers. Writes recorded
+    # while warm() is reading are replayed onto the new state before it is
+    # swapped in, so none are lost.
+    #
+    # invalidate() only marks the index stale; the next read reloads it. Any
+    # number of remote writes between two reads cost one load, and an index
+    # nobody reads is never reloaded. Reads that arrive while another reader
+    # is reloading use the previous state rather than wait.
+    #
+    # Subclasses define load(db) -> data, build(data) -> state and
+    # apply(state, key, value), where value None removes key. Readers use
+    # self.state without the lock, so apply replaces any container a reader
+    # may iterate instead of changing it in place.
+    def __init__(self, state):
+        self._state = state
+        self.warmed = False
+        self._stale = False
+        self._lock = threading.Lock()
+        self._reloading = threading.Lock()
+        self._replay: Optional[list] = None
+
+    @property
+    def state(self):
+        if self._stale:
+            self.reload()
+        return self._state
+
+    @abstractmethod
+    def load(self, db: Session) -> Any:
+        ...
+
+    @abstractmethod
+    def build(self, data) -> Any:
+        ...
+
+    @abstractmethod
+    def apply(self, state, key, value) -> None:
+        ...
+
+    def record(self, key, value) -> None:
+        with self._lock:
+            self.apply(self._state, key, value)
+            if self._replay is not None:
+                self._replay.append((key, value))
+
+    def warm(self, db: Session) -> None:
+        with self._lock:
+            # Cleared before the load, so an invalidation during it is kept.
+            self._stale = False
+            self._replay = []
+        try:
+            data = self.load(db)
+        except BaseException:
+            with self._lock:
+                self._replay, self._stale = None, True
+            raise
+        state = self.build(data)
+        with self._lock:
+            for key, value in self._replay:
+                self.apply(state, key, value)
+            self._state, self._replay, self.warmed = state, None, True
+
+    def invalidate(self, version: int) -> None:
+        self._stale = True
+
+    def reload(self) -> None:
+        if not self._reloading.acquire(blocking=False):
+            return
+        try:
+            with SessionLocal() as db:
+                self.warm(db)
+        except SQLAlchemyError:
+            logger.warning("Warming %s failed", type(self).__name__, exc_info=True)
+        finally:
+            self._reloading.release()
@@ -0,0 +1,120 @@
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Callable, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .database import engine
+from .models import CacheVersions
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_POLL_INTERVAL = float(os.getenv('INVALIDATION_POLL_INTERVAL', '0.2'))
+
+versions_table = CacheVersions.__table__
+
+
+def bump_statement(name: str):
+    return (
+        update(versions_table)
+        .where(versions_table.c.name == name)
+        .values(version=versions_table.c.version + 1)
+        .returning(versions_table.c.version)
+    )
+
+
+def bump_version(db: Session, name: str) -> int:
+    # Runs inside the caller's transaction, so the bump commits with the write.
+    version = db.execute(bump_statement(name)).scalar_one_or_none()
+    if version is None:
+        db.execute(insert(versions_table).values(name=name, version=1))
+        version = 1
+    return version
+
+
+async def bump_version_async(db: AsyncSession, name: str) -> int:
+    version = (await db.execute(bump_statement(name))).scalar_one_or_none()
+    if version is None:
+        await db.execute(insert(versions_table).values(name=name, version=1))
+        version = 1
+    return version
+
+
+class InvalidationBus:
+    # Workers share no memory, so every cache is named by a row in
+    # cache_versions. Writers bump the row in their own transaction and each
+    # worker polls the (tiny) table, running the subscribers of every name
+    # whose version moved. No broker is needed beyond the database itself.
+    def __init__(self, bind, interval: float):
+        self.bind = bind
+        self.interval = interval
+        self.versions: dict[str, int] = {}
+        self._subscribers: dict[str, list[tuple[Callable[[int], None], bool]]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, name: str, callback: Callable[[int], None], remote_only: bool = False) -> None:
+        # remote_only callbacks skip this worker's own writes, for state the
+        # writer already updated itself.
+        self._subscribers[name].append((callback, remote_only))
+
+    def observe(self, name: str, version: int, remote: bool = False) -> None:
+        with self._lock:
+            previous = self.versions.get(name)
+            if previous is not None and version <= previous:
+                return
+            self.versions[name] = version
+        # A local write that skips versions follows writes this worker has not
+        # polled yet; once it is recorded the poll would ignore them, so they
+        # are handled as remote now.
+        if previous is not None and version > previous + 1:
+            remote = True
+        for callback, remote_only in self._subscribers[name]:
+            if remote or not remote_only:
+                callback(version)
+
+    def poll(self) -> None:
+        with self.bind.connect() as connection:
+            rows = connection.execute(select(versions_table.c.name, versions_table.c.version)).all()
+        for name, version in rows:
+            self.observe(name, version, remote=True)
+
+    def seed(self) -> None:
+        # Create missing rows up front so concurrent first writes only UPDATE.
+        with self.bind.connect() as connection:
+            known = set(connection.execute(select(versions_table.c.name)).scalars())
+            for name in self._subscribers.keys() - known:
+                try:
+                    connection.execute(insert(versions_table).values(name=name, version=0))
+                    connection.commit()
+                except IntegrityError:
+                    connection.rollback()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except SQLAlchemyError:
+                logger.warning("Polling cache_versions failed", exc_info=True)
+
+    def start(self) -> None:
+        self.seed()
+        self.poll()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="invalidation-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+invalidation_bus = InvalidationBus(engine, INVALIDATION_POLL_INTERVAL)
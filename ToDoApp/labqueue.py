@@ -0,0 +1,65 @@
+import threading
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from .crud import commit_write
+from .events import ChangeEvents
+from .models import LabTests
+
+LAB_TEST_QUEUED = "ordered"
+LAB_TEST_CLAIMED = "in_progress"
+CLAIM_MAX = 50
+
+lab_tests = LabTests.__table__
+# SQLite has no row locks to skip: concurrent claimers would all contend for
+# the database write lock and back off in its busy handler, which is where
+# the convoys come from. Claimers in this process queue here instead.
+sqlite_claim_lock = threading.Lock()
+
+
+def claim_statement(user_id: int, limit: int, now: datetime):
+    # The next `limit` queued tests, oldest first, read from
+    # ix_lab_tests_status_ordered_at. Rows another claimer has locked are
+    # skipped instead of waited on: READPAST on SQL Server, SKIP LOCKED on
+    # PostgreSQL. SQLite has one writer at a time, so the single UPDATE is
+    # already atomic there. The status check is repeated on the UPDATE so a
+    # row is never claimed twice whatever the isolation level.
+    candidates = (
+        select(lab_tests.c.id)
+        .where(lab_tests.c.status == LAB_TEST_QUEUED)
+        .order_by(lab_tests.c.ordered_at, lab_tests.c.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .with_hint(lab_tests, "WITH (ROWLOCK, UPDLOCK, READPAST)", "mssql")
+    )
+    return (
+        update(lab_tests)
+        .where(lab_tests.c.id.in_(candidates.scalar_subquery()), lab_tests.c.status == LAB_TEST_QUEUED)
+        .values(status=LAB_TEST_CLAIMED, claimed_by=user_id, claimed_at=now)
+        .returning(*lab_tests.c)
+    )
+
+
+def claim(db: Session, user_id: int, limit: int, events: Optional[ChangeEvents]) -> list[Row]:
+    rows = db.execute(claim_statement(user_id, limit, datetime.now())).all()
+    if rows:
+        if events is not None:
+            events.publish(db, "updated", rows)
+        commit_write(db, LabTests)
+    else:
+        db.rollback()
+    return rows
+
+
+def claim_lab_tests(db: Session, user_id: int, limit: int, events: Optional[ChangeEvents] = None) -> list[Row]:
+    if db.get_bind().dialect.name == "sqlite":
+        with sqlite_claim_lock:
+            rows = claim(db, user_id, limit, events)
+    else:
+        rows = claim(db, user_id, limit, events)
+    # OUTPUT / RETURNING rows come back in no particular order.
+    return sorted(rows, key=lambda row: (row.ordered_at is not None, row.ordered_at or datetime.min, row.id))
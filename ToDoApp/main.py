@@ -1,14 +1,25 @@
-from fastapi import FastAPI, status
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, status
 from .models import Base
-from .database import engine
-from .routers import auth, users, hospital
+from .database import HOSPITAL_ASYNC, engine, pool_metrics
+from .invalidation import invalidation_bus
+from .routers import auth, users, hospital, hospital_async
+from .routers.auth import require_roles
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 
-app = FastAPI()
-
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Each uvicorn worker polls cache_versions to drop caches other workers wrote through.
+    invalidation_bus.start()
+    yield
+    invalidation_bus.stop()
+
+app = FastAPI(lifespan=lifespan)
+
 app.mount("/static", StaticFiles(directory="ToDoApp/static"), name="static")
 @app.get("/")
 def test():
@@ -18,6 +29,17 @@ def test():
 def health_check():
     return {'status': 'healthy'}
 
+@app.get('/metrics/db-pool', dependencies=[Depends(require_roles('admin'))])
+def db_pool_metrics():
+    metrics = pool_metrics.snapshot()
+    pool = engine.pool
+    if hasattr(pool, 'checkedout'):
+        metrics.update(pool_size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return metrics
+
+if HOSPITAL_ASYNC:
+    # Registered first so its CRUD routes take precedence over the sync ones.
+    app.include_router(hospital_async.router)
 app.include_router(hospital.router)
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -1,5 +1,6 @@
 from .database import Base
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Date, DateTime, Float, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Date, DateTime, Float, Text, Index, Numeric
+from sqlalchemy.orm import relationship
 
 
 class Users(Base):
@@ -68,6 +69,12 @@ class Patients(Base):
     emergency_contact_name = Column(String)
     emergency_contact_phone = Column(String)
 
+    appointments = relationship("Appointments", back_populates="patient")
+    admissions = relationship("Admissions", back_populates="patient")
+    prescriptions = relationship("Prescriptions", back_populates="patient")
+    lab_tests = relationship("LabTests", back_populates="patient")
+    invoices = relationship("Invoices", back_populates="patient")
+
 
 class Appointments(Base):
     __tablename__ = 'appointments'
@@ -76,8 +83,17 @@ class Appointments(Base):
     patient_id = Column(Integer, ForeignKey('patients.id'))
     doctor_id = Column(Integer, ForeignKey('doctors.id'))
     scheduled_at = Column(DateTime)
+    duration_minutes = Column(Integer, default=30)
     reason = Column(Text)
-    status = Column(String, default="scheduled")
+    status = Column(String(50), default="scheduled")
+
+    patient = relationship("Patients", back_populates="appointments")
+
+    __table_args__ = (
+        Index('ix_appointments_patient_id_scheduled_at', 'patient_id', 'scheduled_at'),
+        Index('ix_appointments_doctor_id_scheduled_at', 'doctor_id', 'scheduled_at'),
+        Index('ix_appointments_scheduled_at', 'scheduled_at'),
+    )
 
 
 class Admissions(Base):
@@ -91,6 +107,15 @@ class Admissions(Base):
     room_number = Column(String)
     diagnosis = Column(Text)
 
+    patient = relationship("Patients", back_populates="admissions")
+
+    __table_args__ = (
+        Index('ix_admissions_patient_id_admitted_at', 'patient_id', 'admitted_at'),
+        Index('ix_admissions_attending_doctor_id_admitted_at', 'attending_doctor_id', 'admitted_at'),
+        Index('ix_admissions_discharged_at', 'discharged_at'),
+        Index('ix_admissions_admitted_at', 'admitted_at'),
+    )
+
 
 class Medications(Base):
     __tablename__ = 'medications'
@@ -109,17 +134,27 @@ class Prescriptions(Base):
     issued_at = Column(DateTime)
     notes = Column(Text)
 
+    patient = relationship("Patients", back_populates="prescriptions")
+    items = relationship("PrescriptionItems", back_populates="prescription")
+
+    __table_args__ = (
+        Index('ix_prescriptions_patient_id_issued_at', 'patient_id', 'issued_at'),
+    )
+
 
 class PrescriptionItems(Base):
     __tablename__ = 'prescription_items'
 
     id = Column(Integer, primary_key=True, index=True)
-    prescription_id = Column(Integer, ForeignKey('prescriptions.id'))
+    prescription_id = Column(Integer, ForeignKey('prescriptions.id'), index=True)
     medication_id = Column(Integer, ForeignKey('medications.id'))
     dosage = Column(String)
     frequency = Column(String)
     duration_days = Column(Integer)
 
+    prescription = relationship("Prescriptions", back_populates="items")
+    medication = relationship("Medications")
+
 
 class LabTests(Base):
     __tablename__ = 'lab_tests'
@@ -130,7 +165,17 @@ class LabTests(Base):
     test_name = Column(String(255), index=True)
     ordered_at = Column(DateTime)
     result = Column(Text)
-    status = Column(String, default="ordered")
+    status = Column(String(50), default="ordered")
+    # Set when a technician takes the test from the queue.
+    claimed_by = Column(Integer, ForeignKey('users.id'), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+
+    patient = relationship("Patients", back_populates="lab_tests")
+
+    __table_args__ = (
+        Index('ix_lab_tests_patient_id_ordered_at', 'patient_id', 'ordered_at'),
+        Index('ix_lab_tests_status_ordered_at', 'status', 'ordered_at'),
+    )
 
 
 class Invoices(Base):
@@ -139,14 +184,68 @@ class Invoices(Base):
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey('patients.id'))
     issued_at = Column(DateTime)
-    total_amount = Column(Float)
-    status = Column(String, default="unpaid")
+    # Maintained from invoice_items by billing.InvoiceTotals.
+    total_amount = Column(Numeric(12, 2), default=0)
+    status = Column(String(50), default="unpaid")
+
+    patient = relationship("Patients", back_populates="invoices")
+    items = relationship("InvoiceItems", back_populates="invoice")
+
+    __table_args__ = (
+        Index('ix_invoices_patient_id_issued_at', 'patient_id', 'issued_at'),
+        Index('ix_invoices_status_issued_at', 'status', 'issued_at'),
+    )
 
 
 class InvoiceItems(Base):
     __tablename__ = 'invoice_items'
 
     id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey('invoices.id'))
+    invoice_id = Column(Integer, ForeignKey('invoices.id'), index=True)
     description = Column(String)
-    amount = Column(Float)
+    amount = Column(Numeric(12, 2))
+
+    invoice = relationship("Invoices", back_populates="items")
+
+
+class AdmissionDailyStats(Base):
+    # Per day and attending doctor (0 when none): admissions on that day,
+    # discharges on that day and the summed stay of those discharges.
+    __tablename__ = 'admission_daily_stats'
+
+    day = Column(Date, primary_key=True)
+    doctor_id = Column(Integer, primary_key=True)
+    admissions = Column(Integer, nullable=False, default=0)
+    discharges = Column(Integer, nullable=False, default=0)
+    stay_minutes = Column(Integer, nullable=False, default=0)
+
+
+class PatientSearchGrams(Base):
+    # Trigrams of each patient's name and phone digits, for fuzzy search.
+    __tablename__ = 'patient_search_grams'
+
+    gram = Column(String(3), primary_key=True)
+    patient_id = Column(Integer, primary_key=True)
+
+    __table_args__ = (
+        Index('ix_patient_search_grams_patient_id', 'patient_id'),
+        # Clustered on the key, as SQL Server does by default.
+        {'sqlite_with_rowid': False},
+    )
+
+
+class CacheVersions(Base):
+    __tablename__ = 'cache_versions'
+
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class TokenRevocations(Base):
+    __tablename__ = 'token_revocations'
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_digest = Column(String(64))
+    user_id = Column(Integer)
+    revoked_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)
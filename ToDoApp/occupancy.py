@@ -0,0 +1,132 @@
+from datetime import datetime
+from types import SimpleNamespace
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from .crud import WriteHooks, after_commit
+from .indexes import MaintainedIndex
+from .invalidation import invalidation_bus
+from .models import Admissions, Doctors
+
+admissions = Admissions.__table__
+doctors = Doctors.__table__
+
+
+class Occupant(NamedTuple):
+    admission_id: int
+    room_number: str
+    patient_id: Optional[int]
+    attending_doctor_id: Optional[int]
+    department_id: Optional[int]
+    admitted_at: Optional[datetime]
+
+
+def occupies_room(row) -> bool:
+    return row.discharged_at is None and row.room_number is not None
+
+
+def occupant(row, department_id: Optional[int]) -> Occupant:
+    return Occupant(row.id, row.room_number, row.patient_id, row.attending_doctor_id, department_id,
+                    row.admitted_at)
+
+
+class OccupancyIndex(MaintainedIndex):
+    # Admissions that hold a room right now (no discharged_at), by admission,
+    # by room and by the attending doctor's department. Room and department
+    # lookups are one dict access each; the per-room and per-department maps
+    # are replaced on every change, never modified.
+    def __init__(self):
+        super().__init__(self.build(()))
+
+    def load(self, db: Session) -> list[Row]:
+        # Served by ix_admissions_discharged_at.
+        return db.execute(
+            select(admissions, doctors.c.department_id)
+            .select_from(admissions.outerjoin(doctors, doctors.c.id == admissions.c.attending_doctor_id))
+            .where(admissions.c.discharged_at.is_(None), admissions.c.room_number.is_not(None))
+        ).all()
+
+    def build(self, rows) -> SimpleNamespace:
+        state = SimpleNamespace(admissions={}, rooms={}, departments={})
+        for row in rows:
+            entry = occupant(row, row.department_id)
+            state.admissions[entry.admission_id] = entry
+            state.rooms.setdefault(entry.room_number, {})[entry.admission_id] = entry
+            if entry.department_id is not None:
+                state.departments.setdefault(entry.department_id, {})[entry.admission_id] = entry
+        return state
+
+    @staticmethod
+    def _replace(groups: dict, key, admission_id: int, entry: Optional[Occupant]) -> None:
+        group = dict(groups.get(key, ()))
+        if entry is None:
+            group.pop(admission_id, None)
+        else:
+            group[admission_id] = entry
+        if group:
+            groups[key] = group
+        else:
+            groups.pop(key, None)
+
+    def apply(self, state: SimpleNamespace, admission_id: int, entry: Optional[Occupant]) -> None:
+        previous = state.admissions.pop(admission_id, None)
+        if previous is not None:
+            self._replace(state.rooms, previous.room_number, admission_id, None)
+            if previous.department_id is not None:
+                self._replace(state.departments, previous.department_id, admission_id, None)
+        if entry is not None:
+            state.admissions[admission_id] = entry
+            self._replace(state.rooms, entry.room_number, admission_id, entry)
+            if entry.department_id is not None:
+                self._replace(state.departments, entry.department_id, admission_id, entry)
+
+    def occupants(self, room_number: Optional[str] = None, department_id: Optional[int] = None) -> list[Occupant]:
+        state = self.state
+        if room_number is not None:
+            found = state.rooms.get(room_number, {}).values()
+            if department_id is not None:
+                found = [entry for entry in found if entry.department_id == department_id]
+        elif department_id is not None:
+            found = state.departments.get(department_id, {}).values()
+        else:
+            found = list(state.admissions.values())
+        return sorted(found, key=lambda entry: (entry.room_number, entry.admission_id))
+
+
+class OccupancyUpdates(WriteHooks):
+    # Records admission writes in the occupancy index once they commit.
+    def __init__(self, index: OccupancyIndex):
+        self.index = index
+
+    def record(self, db: Session, rows: list[Row]) -> None:
+        doctor_ids = {row.attending_doctor_id for row in rows if occupies_room(row)}
+        departments = {}
+        if doctor_ids:
+            departments = dict(db.execute(
+                select(doctors.c.id, doctors.c.department_id).where(doctors.c.id.in_(doctor_ids))
+            ).all())
+        entries = [
+            (row.id, occupant(row, departments.get(row.attending_doctor_id)) if occupies_room(row) else None)
+            for row in rows
+        ]
+        after_commit(db, lambda: [self.index.record(admission_id, entry) for admission_id, entry in entries])
+
+    def created(self, db: Session, rows: list[Row]) -> None:
+        self.record(db, rows)
+
+    def updated(self, db: Session, old: Row, new: Row) -> None:
+        self.record(db, [new])
+
+    def deleted(self, db: Session, old: Row) -> None:
+        after_commit(db, lambda: self.index.record(old.id, None))
+
+
+occupancy_index = OccupancyIndex()
+# Reloaded on the next read after another worker writes admissions (and on
+# startup, via the bus's first poll), and after any doctor write since
+# departments may move.
+invalidation_bus.subscribe(admissions.name, occupancy_index.invalidate, remote_only=True)
+invalidation_bus.subscribe(doctors.name, occupancy_index.invalidate)
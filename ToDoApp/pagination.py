@@ -0,0 +1,82 @@
+import base64
+import json
+from typing import Annotated, Generic, Optional, TypeVar
+
+from fastapi import Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[str] = None
+
+
+class PageParams:
+    def __init__(self, limit: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None):
+        self.limit = limit
+        self.after = after
+
+
+async def page_params(
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(default=None),
+) -> PageParams:
+    # async so FastAPI runs it on the event loop instead of the threadpool.
+    return PageParams(limit, after)
+
+
+page_dependency = Annotated[PageParams, Depends(page_params)]
+
+
+def encode_cursor(position: dict) -> str:
+    raw = json.dumps(jsonable_encoder(position), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        position["id"] = int(position["id"])
+        return position
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def page_statement(list_query, page: PageParams):
+    # Keyset pagination on (sort key, id): fetch one extra row to know
+    # whether another page exists without running a COUNT.
+    statement = list_query.statement()
+    if page.after is not None:
+        statement = statement.where(list_query.after(decode_cursor(page.after)))
+    return statement.limit(page.limit + 1)
+
+
+def page_response(list_query, page: PageParams, rows: list):
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor(list_query.position(rows[-1]))
+    if list_query.fields is None:
+        return {"items": rows, "next_cursor": next_cursor}
+    # Sparse rows do not match the full response model, so they bypass it.
+    items = [list_query.sparse(row) for row in rows]
+    return JSONResponse(jsonable_encoder({"items": items, "next_cursor": next_cursor}))
+
+
+def paginate(db: Session, list_query, page: PageParams):
+    rows = db.execute(page_statement(list_query, page)).all()
+    return page_response(list_query, page, rows)
+
+
+async def paginate_async(db: AsyncSession, list_query, page: PageParams):
+    rows = (await db.execute(page_statement(list_query, page))).all()
+    return page_response(list_query, page, rows)
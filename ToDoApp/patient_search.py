@@ -0,0 +1,274 @@
+import argparse
+import logging
+import re
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+from sqlalchemy import and_, delete, func, insert, select, union_all
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .crud import WriteHooks
+from .database import SessionLocal
+from .models import PatientSearchGrams, Patients
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MAX_RESULTS = 50
+# Jaccard similarity of trigram sets below which a fuzzy match is dropped
+# (pg_trgm's default).
+SIMILARITY_THRESHOLD = 0.3
+# Fuzzy candidates fetched per result asked for, before exact ranking.
+FUZZY_CANDIDATES_PER_RESULT = 10
+# Index entries a fuzzy search may read, spent on its rarest grams first.
+FUZZY_SCAN_BUDGET = 20000
+GRAM_STATS_MAX_AGE = 3600
+REBUILD_CHUNK_SIZE = 5000
+
+NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+patients = Patients.__table__
+grams = PatientSearchGrams.__table__
+
+
+def normalize(text: Optional[str]) -> str:
+    # Lower case, accents dropped, anything but letters and digits a space.
+    text = text or ""
+    if not text.isascii():
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    return NON_ALPHANUMERIC.sub(" ", text.lower()).strip()
+
+
+def word_grams(text: Optional[str]) -> set[str]:
+    # Padded like pg_trgm, so a word's first letters make grams of their own
+    # and short queries still match.
+    found = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        found.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return found
+
+
+def phone_digits(text: Optional[str]) -> str:
+    return "".join(ch for ch in text or "" if ch.isdigit())
+
+
+def digit_grams(digits: str) -> set[str]:
+    return {digits[i:i + 3] for i in range(len(digits) - 2)}
+
+
+def full_name(row) -> str:
+    return f"{row.first_name or ''} {row.last_name or ''}"
+
+
+def patient_grams(row) -> set[str]:
+    return word_grams(full_name(row)) | digit_grams(phone_digits(row.phone))
+
+
+def similarity(first: set, second: set) -> float:
+    if not first or not second:
+        return 0.0
+    shared = len(first & second)
+    return shared / (len(first) + len(second) - shared)
+
+
+def name_similarity(query_grams: set, row) -> float:
+    # The best of first name, last name and both, so that a query for one
+    # name is not diluted by the other.
+    return max(similarity(query_grams, word_grams(text))
+               for text in (row.first_name, row.last_name, full_name(row)))
+
+
+class SearchGrams(WriteHooks):
+    # Keeps patient_search_grams in step with patients in the write's
+    # transaction, touching only the grams that changed.
+    def created(self, db: Session, rows: list[Row]) -> None:
+        values = [{"gram": gram, "patient_id": row.id} for row in rows for gram in patient_grams(row)]
+        if values:
+            db.execute(insert(grams), values)
+
+    def updated(self, db: Session, old: Row, new: Row) -> None:
+        before, after = patient_grams(old), patient_grams(new)
+        if before - after:
+            db.execute(delete(grams).where(grams.c.patient_id == new.id, grams.c.gram.in_(before - after)))
+        if after - before:
+            db.execute(insert(grams), [{"gram": gram, "patient_id": new.id} for gram in after - before])
+
+    def deleted(self, db: Session, old: Row) -> None:
+        db.execute(delete(grams).where(grams.c.patient_id == old.id))
+
+
+def prefix_range(column, prefix: str):
+    # `column LIKE 'prefix%'` as a range, which every backend can seek on an
+    # index whatever its LIKE case rules.
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def casings(word: str) -> list[str]:
+    return list(dict.fromkeys((word, word.lower(), word.capitalize())))
+
+
+def prefix_matches(db: Session, words: list[str], limit: int) -> list[int]:
+    # Index range seeks on last_name, first_name and email, as typed, lower
+    # case and capitalized (SQL Server's case-insensitive collation makes
+    # those the same range; SQLite's does not). Two or more words match a
+    # first name and a last name, in either order: the longer word, likely
+    # the narrower range, is sought and the other one filters.
+    statements = []
+    if len(words) == 1:
+        for column in (patients.c.last_name, patients.c.first_name, patients.c.email):
+            for prefix in casings(words[0]):
+                statements.append(select(patients.c.id).where(prefix_range(column, prefix))
+                                  .order_by(column).limit(limit))
+    else:
+        for first, last in ((words[0], words[-1]), (words[-1], words[0])):
+            pairs = [(patients.c.first_name, first), (patients.c.last_name, last)]
+            (sought, word), (filtered, other) = sorted(pairs, key=lambda pair: -len(pair[1]))
+            for prefix in casings(word):
+                statements.append(
+                    select(patients.c.id)
+                    .where(prefix_range(sought, prefix), filtered.istartswith(other, autoescape=True))
+                    .order_by(sought).limit(limit)
+                )
+    statement = union_all(*(statement.subquery().select() for statement in statements))
+    return list(dict.fromkeys(db.execute(statement).scalars()))
+
+
+class GramFrequencies:
+    # How many patients have each gram. It only decides which grams a search
+    # reads, so it is loaded on first use and refreshed in the background
+    # every GRAM_STATS_MAX_AGE seconds rather than kept exact.
+    def __init__(self, max_age: float = GRAM_STATS_MAX_AGE):
+        self.max_age = max_age
+        self.counts: Optional[dict[str, int]] = None
+        self.loaded_at = 0.0
+        self._refreshing = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        counts = dict(db.execute(select(grams.c.gram, func.count()).group_by(grams.c.gram)).all())
+        self.counts, self.loaded_at = counts, time.monotonic()
+
+    def refresh(self) -> None:
+        try:
+            with SessionLocal() as db:
+                self.load(db)
+        except SQLAlchemyError:
+            logger.warning("Loading patient search gram counts failed", exc_info=True)
+        finally:
+            self._refreshing.release()
+
+    def get(self, db: Session) -> dict[str, int]:
+        if self.counts is None:
+            self.load(db)
+        elif time.monotonic() - self.loaded_at > self.max_age and self._refreshing.acquire(blocking=False):
+            threading.Thread(target=self.refresh, name="gram-frequencies", daemon=True).start()
+        return self.counts
+
+
+gram_frequencies = GramFrequencies()
+
+
+def probe_grams(query_grams: set[str], counts: dict[str, int], budget: int = FUZZY_SCAN_BUDGET) -> list[str]:
+    # The rarest grams whose posting lists fit the budget (always at least
+    # one). Grams missing from the counts are new or misspelled and cost
+    # nothing to look up.
+    chosen, scanned = [], 0
+    for count, gram in sorted((counts.get(gram, 0), gram) for gram in query_grams):
+        if chosen and scanned + count > budget:
+            break
+        chosen.append(gram)
+        scanned += count
+    return chosen
+
+
+def fuzzy_matches(db: Session, probe: list[str], required: int, limit: int) -> list[int]:
+    # Patients with at least `required` of the probe grams, most first; each
+    # gram is a range seek on the (gram, patient_id) key.
+    shared = func.count().label("shared")
+    return list(db.execute(
+        select(grams.c.patient_id, shared)
+        .where(grams.c.gram.in_(probe))
+        .group_by(grams.c.patient_id)
+        .having(func.count() >= required)
+        .order_by(shared.desc(), grams.c.patient_id)
+        .limit(limit)
+    ).scalars())
+
+
+def load_patients(db: Session, ids: list[int]) -> list[Row]:
+    if not ids:
+        return []
+    return db.execute(select(patients).where(patients.c.id.in_(ids))).all()
+
+
+def search_patients(db: Session, q: str, limit: int) -> list[Row]:
+    # Phone digits when the query has no letters; otherwise prefix matches on
+    # the name and email indexes, topped up with trigram matches when there
+    # are fewer than `limit`. Trigram candidates come from the query's rarest
+    # grams and are ranked exactly here. Prefix matches rank first, then by
+    # trigram similarity to the name.
+    digits = phone_digits(q)
+    if not any(ch.isalpha() for ch in q):
+        if len(digits) < 3:
+            return []
+        probe = probe_grams(digit_grams(digits), gram_frequencies.get(db))
+        ids = fuzzy_matches(db, probe, len(probe), limit * FUZZY_CANDIDATES_PER_RESULT)
+        rows = [row for row in load_patients(db, ids) if digits in phone_digits(row.phone)]
+        rows.sort(key=lambda row: (not phone_digits(row.phone).startswith(digits), row.id))
+        return rows[:limit]
+
+    words = q.split()
+    if not words:
+        return []
+    query_grams = word_grams(q)
+    ranked = {}
+    for row in load_patients(db, prefix_matches(db, words, limit)):
+        ranked[row.id] = (0, -name_similarity(query_grams, row), row)
+    if len(ranked) < limit and query_grams:
+        probe = probe_grams(query_grams, gram_frequencies.get(db))
+        ids = [patient_id for patient_id in fuzzy_matches(db, probe, 1, limit * FUZZY_CANDIDATES_PER_RESULT)
+               if patient_id not in ranked]
+        for row in load_patients(db, ids):
+            score = name_similarity(query_grams, row)
+            if score >= SIMILARITY_THRESHOLD:
+                ranked[row.id] = (1, -score, row)
+    order = sorted(ranked.values(), key=lambda item: (item[0], item[1], item[2].last_name or "",
+                                                      item[2].first_name or "", item[2].id))
+    return [row for _, _, row in order[:limit]]
+
+
+def rebuild_search_grams(db: Session, chunk_size: int = REBUILD_CHUNK_SIZE) -> int:
+    # Recomputes every patient's grams in id order, one short transaction per
+    # chunk of patients. Returns the number of patients indexed.
+    indexed, after = 0, 0
+    while True:
+        rows = db.execute(
+            select(patients.c.id, patients.c.first_name, patients.c.last_name, patients.c.phone)
+            .where(patients.c.id > after).order_by(patients.c.id).limit(chunk_size)
+        ).all()
+        # Also drops the grams of patients deleted since they were indexed.
+        stale = grams.c.patient_id > after
+        if not rows:
+            db.execute(delete(grams).where(stale))
+            db.commit()
+            return indexed
+        db.execute(delete(grams).where(stale, grams.c.patient_id <= rows[-1].id))
+        SearchGrams().created(db, rows)
+        db.commit()
+        indexed += len(rows)
+        after = rows[-1].id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild patient_search_grams from patients.")
+    parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE)
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        print(f"Indexed {rebuild_search_grams(db, args.chunk_size)} patients.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime, timezone
 from typing import Annotated, Literal
+from ..cache import TTLCache
 from ..database import SessionLocal
+from ..invalidation import bump_version, invalidation_bus
 from fastapi import Depends, APIRouter, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
-from ..models import Users
+from ..models import TokenRevocations, Users
 from passlib.context import CryptContext
 from pydantic import BaseModel, Field
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
 
 router = APIRouter(
@@ -20,8 +29,26 @@ SECRET_KEY = '8e65260a9ec51a445401bd94131a1f0928c47b30c39dda04108de76a7420a076'
 ALGORITHM = 'HS256'
 
 bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# bcrypt releases the GIL, so a small dedicated pool keeps password work off
+# the event loop without taking slots from the request threadpool.
+password_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PASSWORD_HASH_WORKERS', '4')),
+    thread_name_prefix='password-hash',
+)
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 
+# Verified claims keyed by token digest; entries never outlive the token's exp.
+token_cache = TTLCache(maxsize=int(os.getenv('TOKEN_CACHE_SIZE', '10000')),
+                       ttl=int(os.getenv('TOKEN_CACHE_TTL', '300')))
+REVOCATION_TTL = 24 * 60 * 60
+revoked_tokens = TTLCache(maxsize=int(os.getenv('REVOKED_TOKENS_SIZE', '100000')), ttl=REVOCATION_TTL)
+# user id -> time of revocation; tokens issued at or before it are rejected.
+# Kept for REVOCATION_TTL, longer than any token lives.
+revoked_users = TTLCache(maxsize=int(os.getenv('REVOKED_USERS_SIZE', '100000')), ttl=REVOCATION_TTL)
+# Revocations are stored in token_revocations so every worker applies them;
+# this is the highest row id this worker has loaded.
+revocations_loaded = 0
+
 class CreateUserRequest(BaseModel):
     username: str = Field(min_length=3, max_length=100)
     email: str = Field(min_length=3, max_length=100)
@@ -55,34 +82,107 @@ def render_register_page(request: Request):
     return templates.TemplateResponse("register.html", {"request": request})
 
 ### endpoints ###
-def authenticate_user(username: str, password: str, db):
-    user = db.query(Users).filter(Users.username == username).first()
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(password_executor, bcrypt_context.hash, password)
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, bcrypt_context.verify, password, hashed_password
+    )
+
+def get_user_by_username(username: str, db):
+    return db.query(Users).filter(Users.username == username).first()
+
+def save(db, model) -> None:
+    db.add(model)
+    db.commit()
+
+async def authenticate_user(username: str, password: str, db):
+    user = await run_in_threadpool(get_user_by_username, username, db)
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
 def create_access_token(username: str, user_id:int, role:str, expires_delta: timedelta):
     encode = {'sub': username, 'id': user_id, 'role': role}
-    expires = datetime.now(timezone.utc) + expires_delta
-    encode.update({'exp': int(expires.timestamp())})
+    now = datetime.now(timezone.utc)
+    expires = now + expires_delta
+    encode.update({'iat': now.timestamp(), 'exp': int(expires.timestamp())})
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def apply_revocation(digest, user_id, revoked_at: float, expires_at: float) -> None:
+    if digest is not None:
+        revoked_tokens.set(digest, True, expires_at=expires_at)
+        token_cache.delete(digest)
+    if user_id is not None:
+        revoked_users.set(user_id, max(revoked_users.get(user_id, 0.0), revoked_at), expires_at=expires_at)
+        token_cache.clear()
+
+def record_revocation(db, digest, user_id, revoked_at: float, expires_at: float) -> None:
+    db.add(TokenRevocations(token_digest=digest, user_id=user_id, revoked_at=revoked_at, expires_at=expires_at))
+    bump_version(db, TokenRevocations.__tablename__)
+    db.commit()
+    apply_revocation(digest, user_id, revoked_at, expires_at)
+
+def load_revocations(version: int) -> None:
+    # Runs on the invalidation bus thread when another worker revoked something.
+    global revocations_loaded
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(TokenRevocations)
+            .where(TokenRevocations.id > revocations_loaded, TokenRevocations.expires_at > time.time())
+            .order_by(TokenRevocations.id)
+        ).scalars().all()
+    for row in rows:
+        apply_revocation(row.token_digest, row.user_id, row.revoked_at, row.expires_at)
+        revocations_loaded = row.id
+
+invalidation_bus.subscribe(TokenRevocations.__tablename__, load_revocations)
+
+def revoke_token(db, token: str) -> None:
+    claims = jwt.get_unverified_claims(token)
+    now = time.time()
+    record_revocation(db, token_digest(token), None, now, claims.get('exp') or now + REVOCATION_TTL)
+
+def revoke_user_tokens(db, user_id: int) -> None:
+    # Call after changing a user's password or role, or disabling them.
+    now = time.time()
+    record_revocation(db, None, user_id, now, now + REVOCATION_TTL)
+
+def is_revoked(digest: str, user: dict, issued_at) -> bool:
+    if digest in revoked_tokens:
+        return True
+    revoked_at = revoked_users.get(user['id'])
+    return revoked_at is not None and (issued_at is None or issued_at <= revoked_at)
+
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    digest = token_digest(token)
+    cached = token_cache.get(digest)
+    if cached is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='COULD NOT VALIDATE USER')
         username = payload.get('sub')
         user_id = payload.get('id')
         role = payload.get('role')
         if username is None or user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='COULD NOT VALIDATE USER')
-        return {'username': username, 'id': user_id, 'role': role}
-    except JWTError:
+        cached = ({'username': username, 'id': user_id, 'role': role}, payload.get('iat'))
+        token_cache.set(digest, cached, expires_at=payload.get('exp'))
+    user, issued_at = cached
+    if is_revoked(digest, user, issued_at):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='COULD NOT VALIDATE USER')
+    return dict(user)
 
 def require_roles(*allowed_roles: str):
-    def _checker(user: Annotated[dict, Depends(get_current_user)]):
+    # No I/O, so async: FastAPI then skips the threadpool hop.
+    async def _checker(user: Annotated[dict, Depends(get_current_user)]):
         if user is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication failed!')
         if user.get('role') not in allowed_roles:
@@ -100,20 +200,24 @@ async def create_user(db: db_dependency,
         firstname=create_user_request.firstname,
         lastname=create_user_request.lastname,
         role=create_user_request.role,
-        hashed_password=bcrypt_context.hash(create_user_request.password),
+        hashed_password=await hash_password(create_user_request.password),
         is_active=True,
         phoneNumber=create_user_request.phoneNumber,
     )
 
-    db.add(create_user_model)
-    db.commit()
+    await run_in_threadpool(save, db, create_user_model)
 
 @router.post("/token/", response_model=Token)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
                                  db: db_dependency):
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='COULD NOT VALIDATE USER')
     token = create_access_token(username=user.username, user_id=user.id, role=user.role, expires_delta=timedelta(minutes=20))
 
     return {'access_token': token, 'token_type': 'bearer'}
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: Annotated[str, Depends(oauth2_bearer)], db: db_dependency):
+    await get_current_user(token)
+    await run_in_threadpool(revoke_token, db, token)
@@ -1,11 +1,37 @@
-from datetime import date, datetime
-from typing import Annotated, Optional
-
-from fastapi import APIRouter, Depends, HTTPException, Path
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
-
+import asyncio
+import heapq
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, WebSocket, WebSocketDisconnect
+from fastapi.requests import HTTPConnection
+from fastapi.responses import StreamingResponse
+from pydantic import AliasPath, BaseModel, Field, PlainSerializer
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session, selectinload
+
+from ..billing import InvoiceTotals
+from ..census import CENSUS_MAX_DAYS, CensusRollup, census_report
+from ..crud import ChainedHooks, CRUDResource, add_crud_routes, create_with_children, get_row
 from ..database import SessionLocal
+from ..events import EVENT_KEEPALIVE_SECONDS, ChangeEvents, event_hub, parse_topic
+from ..filtering import ListQuery, list_query
+from ..formulary import SUGGEST_MAX_RESULTS, MedicationNameUpdates, medication_names
+from ..labqueue import CLAIM_MAX, claim_lab_tests
+from ..occupancy import OccupancyUpdates, occupancy_index
+from ..pagination import Page, decode_cursor, encode_cursor, page_dependency
+from ..patient_search import SEARCH_MAX_RESULTS, SearchGrams, search_patients
+from ..scheduling import (
+    AVAILABILITY_MAX_DAYS,
+    DEFAULT_APPOINTMENT_MINUTES,
+    MAX_APPOINTMENT_MINUTES,
+    AppointmentConflicts,
+    appointment_index,
+    available_slots,
+)
 from .auth import get_current_user, require_roles
 from ..models import (
     Admissions,
@@ -43,10 +69,12 @@ admin_secretary_dependency = Annotated[dict, Depends(require_roles("admin", "sec
 admin_doctor_dependency = Annotated[dict, Depends(require_roles("admin", "doctor"))]
 staff_dependency = Annotated[dict, Depends(require_roles("admin", "doctor", "secretary"))]
 
-
-def apply_updates(db_obj, data: dict) -> None:
-    for key, value in data.items():
-        setattr(db_obj, key, value)
+# Exact decimals in Python and the database, still rendered as JSON numbers.
+Money = Annotated[
+    Decimal,
+    Field(ge=0, max_digits=12, decimal_places=2),
+    PlainSerializer(float, return_type=float, when_used="json"),
+]
 
 
 class DepartmentBase(BaseModel):
@@ -179,6 +207,7 @@ class AppointmentBase(BaseModel):
     patient_id: int
     doctor_id: int
     scheduled_at: datetime
+    duration_minutes: int = Field(default=DEFAULT_APPOINTMENT_MINUTES, gt=0, le=MAX_APPOINTMENT_MINUTES)
     reason: Optional[str] = None
     status: str = Field(default="scheduled", max_length=50)
 
@@ -191,12 +220,15 @@ class AppointmentUpdate(BaseModel):
     patient_id: Optional[int] = None
     doctor_id: Optional[int] = None
     scheduled_at: Optional[datetime] = None
+    duration_minutes: Optional[int] = Field(default=None, gt=0, le=MAX_APPOINTMENT_MINUTES)
     reason: Optional[str] = None
     status: Optional[str] = Field(default=None, max_length=50)
 
 
 class AppointmentOut(AppointmentBase):
     id: int
+    # Rows booked before durations existed have none.
+    duration_minutes: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -252,6 +284,14 @@ class MedicationOut(MedicationBase):
         from_attributes = True
 
 
+class MedicationSuggestionOut(BaseModel):
+    id: int
+    name: str
+
+    class Config:
+        from_attributes = True
+
+
 class PrescriptionBase(BaseModel):
     patient_id: int
     doctor_id: int
@@ -304,6 +344,21 @@ class PrescriptionItemOut(PrescriptionItemBase):
         from_attributes = True
 
 
+class PrescriptionLine(BaseModel):
+    medication_id: int
+    dosage: str
+    frequency: str
+    duration_days: int = Field(gt=0)
+
+
+class PrescriptionWithItemsCreate(PrescriptionCreate):
+    items: list[PrescriptionLine] = Field(min_length=1)
+
+
+class PrescriptionWithItemsOut(PrescriptionOut):
+    items: list[PrescriptionItemOut]
+
+
 class LabTestBase(BaseModel):
     patient_id: int
     ordered_by_doctor_id: int
@@ -324,10 +379,15 @@ class LabTestUpdate(BaseModel):
     ordered_at: Optional[datetime] = None
     result: Optional[str] = None
     status: Optional[str] = Field(default=None, max_length=50)
+    # Set both to null, with status "ordered", to put a claimed test back.
+    claimed_by: Optional[int] = None
+    claimed_at: Optional[datetime] = None
 
 
 class LabTestOut(LabTestBase):
     id: int
+    claimed_by: Optional[int] = None
+    claimed_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -336,7 +396,6 @@ class LabTestOut(LabTestBase):
 class InvoiceBase(BaseModel):
     patient_id: int
     issued_at: datetime
-    total_amount: float = Field(ge=0)
     status: str = Field(default="unpaid", max_length=50)
 
 
@@ -347,12 +406,12 @@ class InvoiceCreate(InvoiceBase):
 class InvoiceUpdate(BaseModel):
     patient_id: Optional[int] = None
     issued_at: Optional[datetime] = None
-    total_amount: Optional[float] = Field(default=None, ge=0)
     status: Optional[str] = Field(default=None, max_length=50)
 
 
 class InvoiceOut(InvoiceBase):
     id: int
+    total_amount: Optional[Money] = None
 
     class Config:
         from_attributes = True
@@ -361,7 +420,7 @@ class InvoiceOut(InvoiceBase):
 class InvoiceItemBase(BaseModel):
     invoice_id: int
     description: str = Field(min_length=1, max_length=200)
-    amount: float = Field(ge=0)
+    amount: Money
 
 
 class InvoiceItemCreate(InvoiceItemBase):
@@ -371,7 +430,7 @@ class InvoiceItemCreate(InvoiceItemBase):
 class InvoiceItemUpdate(BaseModel):
     invoice_id: Optional[int] = None
     description: Optional[str] = Field(default=None, min_length=1, max_length=200)
-    amount: Optional[float] = Field(default=None, ge=0)
+    amount: Optional[Money] = None
 
 
 class InvoiceItemOut(InvoiceItemBase):
@@ -381,542 +440,384 @@ class InvoiceItemOut(InvoiceItemBase):
         from_attributes = True
 
 
-@router.post("/departments", response_model=DepartmentOut, status_code=201)
-def create_department(payload: DepartmentCreate, db: db_dependency, user: admin_secretary_dependency):
-    department = Departments(**payload.model_dump())
-    db.add(department)
-    db.commit()
-    db.refresh(department)
-    return department
-
-
-@router.get("/departments", response_model=list[DepartmentOut])
-def list_departments(db: db_dependency, user: staff_dependency):
-    return db.query(Departments).all()
+class InvoiceLine(BaseModel):
+    description: str = Field(min_length=1, max_length=200)
+    amount: Money
 
 
-@router.get("/departments/{department_id}", response_model=DepartmentOut)
-def get_department(db: db_dependency, department_id: int = Path(gt=0), user: staff_dependency = None):
-    department = db.query(Departments).filter(Departments.id == department_id).first()
-    if department is None:
-        raise HTTPException(status_code=404, detail="Department not found.")
-    return department
-
-
-@router.put("/departments/{department_id}", response_model=DepartmentOut)
-def update_department(
-    payload: DepartmentUpdate,
-    db: db_dependency,
-    department_id: int = Path(gt=0),
-    user: admin_secretary_dependency = None,
-):
-    department = db.query(Departments).filter(Departments.id == department_id).first()
-    if department is None:
-        raise HTTPException(status_code=404, detail="Department not found.")
-    apply_updates(department, payload.model_dump(exclude_unset=True))
-    db.add(department)
-    db.commit()
-    db.refresh(department)
-    return department
-
-
-@router.delete("/departments/{department_id}", status_code=204)
-def delete_department(db: db_dependency, department_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    department = db.query(Departments).filter(Departments.id == department_id).first()
-    if department is None:
-        raise HTTPException(status_code=404, detail="Department not found.")
-    db.delete(department)
-    db.commit()
-
-
-@router.post("/doctors", response_model=DoctorOut, status_code=201)
-def create_doctor(payload: DoctorCreate, db: db_dependency, user: admin_secretary_dependency):
-    doctor = Doctors(**payload.model_dump())
-    db.add(doctor)
-    db.commit()
-    db.refresh(doctor)
-    return doctor
-
-
-@router.get("/doctors", response_model=list[DoctorOut])
-def list_doctors(db: db_dependency, user: staff_dependency):
-    return db.query(Doctors).all()
-
-
-@router.get("/doctors/{doctor_id}", response_model=DoctorOut)
-def get_doctor(db: db_dependency, doctor_id: int = Path(gt=0), user: staff_dependency = None):
-    doctor = db.query(Doctors).filter(Doctors.id == doctor_id).first()
-    if doctor is None:
-        raise HTTPException(status_code=404, detail="Doctor not found.")
-    return doctor
-
-
-@router.put("/doctors/{doctor_id}", response_model=DoctorOut)
-def update_doctor(payload: DoctorUpdate, db: db_dependency, doctor_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    doctor = db.query(Doctors).filter(Doctors.id == doctor_id).first()
-    if doctor is None:
-        raise HTTPException(status_code=404, detail="Doctor not found.")
-    apply_updates(doctor, payload.model_dump(exclude_unset=True))
-    db.add(doctor)
-    db.commit()
-    db.refresh(doctor)
-    return doctor
-
-
-@router.delete("/doctors/{doctor_id}", status_code=204)
-def delete_doctor(db: db_dependency, doctor_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    doctor = db.query(Doctors).filter(Doctors.id == doctor_id).first()
-    if doctor is None:
-        raise HTTPException(status_code=404, detail="Doctor not found.")
-    db.delete(doctor)
-    db.commit()
-
-
-@router.post("/workers", response_model=WorkerOut, status_code=201)
-def create_worker(payload: WorkerCreate, db: db_dependency, user: admin_secretary_dependency):
-    worker = Workers(**payload.model_dump())
-    db.add(worker)
-    db.commit()
-    db.refresh(worker)
-    return worker
-
-
-@router.get("/workers", response_model=list[WorkerOut])
-def list_workers(db: db_dependency, user: admin_secretary_dependency):
-    return db.query(Workers).all()
-
-
-@router.get("/workers/{worker_id}", response_model=WorkerOut)
-def get_worker(db: db_dependency, worker_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    worker = db.query(Workers).filter(Workers.id == worker_id).first()
-    if worker is None:
-        raise HTTPException(status_code=404, detail="Worker not found.")
-    return worker
-
-
-@router.put("/workers/{worker_id}", response_model=WorkerOut)
-def update_worker(payload: WorkerUpdate, db: db_dependency, worker_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    worker = db.query(Workers).filter(Workers.id == worker_id).first()
-    if worker is None:
-        raise HTTPException(status_code=404, detail="Worker not found.")
-    apply_updates(worker, payload.model_dump(exclude_unset=True))
-    db.add(worker)
-    db.commit()
-    db.refresh(worker)
-    return worker
-
-
-@router.delete("/workers/{worker_id}", status_code=204)
-def delete_worker(db: db_dependency, worker_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    worker = db.query(Workers).filter(Workers.id == worker_id).first()
-    if worker is None:
-        raise HTTPException(status_code=404, detail="Worker not found.")
-    db.delete(worker)
-    db.commit()
-
-
-@router.post("/patients", response_model=PatientOut, status_code=201)
-def create_patient(payload: PatientCreate, db: db_dependency, user: admin_secretary_dependency):
-    patient = Patients(**payload.model_dump())
-    db.add(patient)
-    db.commit()
-    db.refresh(patient)
-    return patient
-
-
-@router.get("/patients", response_model=list[PatientOut])
-def list_patients(db: db_dependency, user: staff_dependency):
-    return db.query(Patients).all()
-
-
-@router.get("/patients/{patient_id}", response_model=PatientOut)
-def get_patient(db: db_dependency, patient_id: int = Path(gt=0), user: staff_dependency = None):
-    patient = db.query(Patients).filter(Patients.id == patient_id).first()
-    if patient is None:
-        raise HTTPException(status_code=404, detail="Patient not found.")
-    return patient
+class InvoiceWithItemsCreate(BaseModel):
+    patient_id: int
+    issued_at: datetime
+    status: str = Field(default="unpaid", max_length=50)
+    items: list[InvoiceLine] = Field(min_length=1)
 
 
-@router.put("/patients/{patient_id}", response_model=PatientOut)
-def update_patient(payload: PatientUpdate, db: db_dependency, patient_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    patient = db.query(Patients).filter(Patients.id == patient_id).first()
-    if patient is None:
-        raise HTTPException(status_code=404, detail="Patient not found.")
-    apply_updates(patient, payload.model_dump(exclude_unset=True))
-    db.add(patient)
-    db.commit()
-    db.refresh(patient)
-    return patient
+class InvoiceWithItemsOut(InvoiceOut):
+    items: list[InvoiceItemOut]
+
+
+class TimelinePrescriptionItem(PrescriptionItemOut):
+    medication_name: Optional[str] = Field(default=None, validation_alias=AliasPath("medication", "name"))
+
 
+class TimelinePrescription(PrescriptionOut):
+    items: list[TimelinePrescriptionItem]
 
-@router.delete("/patients/{patient_id}", status_code=204)
-def delete_patient(db: db_dependency, patient_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    patient = db.query(Patients).filter(Patients.id == patient_id).first()
-    if patient is None:
+
+class TimelineEvent(BaseModel):
+    kind: Literal["appointment", "admission", "prescription", "lab_test", "invoice"]
+    at: datetime
+    id: int
+    data: dict
+
+
+class AvailableSlot(BaseModel):
+    doctor_id: int
+    start: datetime
+    end: datetime
+
+
+class CensusDay(BaseModel):
+    day: date
+    doctor_id: Optional[int] = None
+    department_id: Optional[int] = None
+    admissions: int
+    discharges: int
+    # Inpatients at the end of the day.
+    census: int
+    # Of the patients discharged that day.
+    average_stay_days: Optional[float] = None
+
+
+class RoomOccupant(BaseModel):
+    admission_id: int
+    room_number: str
+    patient_id: Optional[int] = None
+    attending_doctor_id: Optional[int] = None
+    department_id: Optional[int] = None
+    admitted_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+department_query = Annotated[ListQuery, Depends(list_query(Departments, DepartmentOut, ("name",)))]
+doctor_query = Annotated[
+    ListQuery,
+    Depends(list_query(Doctors, DoctorOut, ("department_id", "specialization", "last_name", "is_active"))),
+]
+worker_query = Annotated[
+    ListQuery,
+    Depends(list_query(Workers, WorkerOut, ("department_id", "role", "last_name", "is_active"))),
+]
+patient_query = Annotated[
+    ListQuery,
+    Depends(list_query(Patients, PatientOut, ("first_name", "last_name", "dob", "email"))),
+]
+appointment_query = Annotated[
+    ListQuery,
+    Depends(list_query(Appointments, AppointmentOut, ("patient_id", "doctor_id", "status", "scheduled_at"))),
+]
+admission_query = Annotated[
+    ListQuery,
+    Depends(list_query(Admissions, AdmissionOut, ("patient_id", "attending_doctor_id", "admitted_at", "discharged_at", "room_number"))),
+]
+medication_query = Annotated[ListQuery, Depends(list_query(Medications, MedicationOut, ("name",)))]
+prescription_query = Annotated[
+    ListQuery,
+    Depends(list_query(Prescriptions, PrescriptionOut, ("patient_id", "doctor_id", "issued_at"))),
+]
+prescription_item_query = Annotated[
+    ListQuery,
+    Depends(list_query(PrescriptionItems, PrescriptionItemOut, ("prescription_id", "medication_id"))),
+]
+lab_test_query = Annotated[
+    ListQuery,
+    Depends(list_query(LabTests, LabTestOut, ("patient_id", "ordered_by_doctor_id", "status", "ordered_at"))),
+]
+invoice_query = Annotated[
+    ListQuery,
+    Depends(list_query(Invoices, InvoiceOut, ("patient_id", "status", "issued_at"))),
+]
+invoice_item_query = Annotated[ListQuery, Depends(list_query(InvoiceItems, InvoiceItemOut, ("invoice_id",)))]
+
+
+appointment_events = ChangeEvents(event_hub, "appointments")
+admission_events = ChangeEvents(event_hub, "admissions", ("attending_doctor_id",))
+lab_test_events = ChangeEvents(event_hub, "lab_tests", ("ordered_by_doctor_id",))
+
+RESOURCES = (
+    CRUDResource("/departments", Departments, DepartmentCreate, DepartmentUpdate, DepartmentOut, department_query,
+                 staff_dependency, admin_secretary_dependency, "Department", cached=True),
+    CRUDResource("/doctors", Doctors, DoctorCreate, DoctorUpdate, DoctorOut, doctor_query,
+                 staff_dependency, admin_secretary_dependency, "Doctor", cached=True),
+    CRUDResource("/workers", Workers, WorkerCreate, WorkerUpdate, WorkerOut, worker_query,
+                 admin_secretary_dependency, admin_secretary_dependency, "Worker"),
+    CRUDResource("/patients", Patients, PatientCreate, PatientUpdate, PatientOut, patient_query,
+                 staff_dependency, admin_secretary_dependency, "Patient", stream=True, bulk=True,
+                 hooks=SearchGrams()),
+    CRUDResource("/appointments", Appointments, AppointmentCreate, AppointmentUpdate, AppointmentOut,
+                 appointment_query, staff_dependency, staff_dependency, "Appointment", stream=True, bulk=True,
+                 hooks=ChainedHooks(AppointmentConflicts(appointment_index), appointment_events)),
+    CRUDResource("/admissions", Admissions, AdmissionCreate, AdmissionUpdate, AdmissionOut, admission_query,
+                 staff_dependency, admin_doctor_dependency, "Admission",
+                 hooks=ChainedHooks(OccupancyUpdates(occupancy_index), CensusRollup(), admission_events)),
+    CRUDResource("/medications", Medications, MedicationCreate, MedicationUpdate, MedicationOut, medication_query,
+                 staff_dependency, admin_doctor_dependency, "Medication", cached=True,
+                 hooks=MedicationNameUpdates(medication_names)),
+    CRUDResource("/prescriptions", Prescriptions, PrescriptionCreate, PrescriptionUpdate, PrescriptionOut,
+                 prescription_query, admin_doctor_dependency, admin_doctor_dependency, "Prescription"),
+    CRUDResource("/prescription-items", PrescriptionItems, PrescriptionItemCreate, PrescriptionItemUpdate,
+                 PrescriptionItemOut, prescription_item_query, admin_doctor_dependency, admin_doctor_dependency,
+                 "Prescription item"),
+    CRUDResource("/lab-tests", LabTests, LabTestCreate, LabTestUpdate, LabTestOut, lab_test_query,
+                 admin_doctor_dependency, admin_doctor_dependency, "Lab test", stream=True, bulk=True,
+                 hooks=lab_test_events),
+    CRUDResource("/invoices", Invoices, InvoiceCreate, InvoiceUpdate, InvoiceOut, invoice_query,
+                 admin_secretary_dependency, admin_secretary_dependency, "Invoice", stream=True),
+    CRUDResource("/invoice-items", InvoiceItems, InvoiceItemCreate, InvoiceItemUpdate, InvoiceItemOut,
+                 invoice_item_query, admin_secretary_dependency, admin_secretary_dependency, "Invoice item",
+                 bulk=True, hooks=InvoiceTotals()),
+)
+
+for resource in RESOURCES:
+    add_crud_routes(router, db_dependency, resource)
+
+
+@router.post("/prescriptions/with-items", response_model=PrescriptionWithItemsOut, status_code=201)
+def create_prescription_with_items(payload: PrescriptionWithItemsCreate, db: db_dependency,
+                                   user: admin_doctor_dependency):
+    prescription, items = create_with_children(
+        db, Prescriptions, payload.model_dump(exclude={"items"}),
+        PrescriptionItems, "prescription_id", [item.model_dump() for item in payload.items],
+    )
+    return {**prescription._mapping, "items": items}
+
+
+@router.post("/invoices/with-items", response_model=InvoiceWithItemsOut, status_code=201)
+def create_invoice_with_items(payload: InvoiceWithItemsCreate, db: db_dependency,
+                              user: admin_secretary_dependency):
+    values = payload.model_dump(exclude={"items"})
+    values["total_amount"] = sum(item.amount for item in payload.items)
+    invoice, items = create_with_children(
+        db, Invoices, values, InvoiceItems, "invoice_id", [item.model_dump() for item in payload.items],
+    )
+    return {**invoice._mapping, "items": items}
+
+
+# (kind, model, timestamp column, schema, loader options). Each source is read
+# newest first through its (patient_id, timestamp) index; the position in this
+# tuple breaks ties between events with the same timestamp.
+TIMELINE_SOURCES = (
+    ("appointment", Appointments, Appointments.scheduled_at, AppointmentOut, ()),
+    ("admission", Admissions, Admissions.admitted_at, AdmissionOut, ()),
+    ("prescription", Prescriptions, Prescriptions.issued_at, TimelinePrescription,
+     (selectinload(Prescriptions.items).selectinload(PrescriptionItems.medication),)),
+    ("lab_test", LabTests, LabTests.ordered_at, LabTestOut, ()),
+    ("invoice", Invoices, Invoices.issued_at, InvoiceOut, ()),
+)
+TIMELINE_RANKS = {source[0]: rank for rank, source in enumerate(TIMELINE_SOURCES)}
+
+
+def timeline_position(cursor: str) -> tuple:
+    position = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(position["k"]), TIMELINE_RANKS[position["t"]], position["id"]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def timeline_before(rank: int, model, column, position: tuple):
+    # Events sort by (timestamp, source rank, id) descending; keep the ones
+    # strictly below the cursor.
+    at, cursor_rank, cursor_id = position
+    if rank < cursor_rank:
+        return column <= at
+    if rank > cursor_rank:
+        return column < at
+    return or_(column < at, and_(column == at, model.id < cursor_id))
+
+
+@router.get("/patients/{patient_id}/timeline", response_model=Page[TimelineEvent])
+def get_patient_timeline(db: db_dependency, page: page_dependency, patient_id: int = Path(gt=0),
+                         user: staff_dependency = None):
+    if get_row(db, Patients, patient_id) is None:
         raise HTTPException(status_code=404, detail="Patient not found.")
-    db.delete(patient)
-    db.commit()
-
-
-@router.post("/appointments", response_model=AppointmentOut, status_code=201)
-def create_appointment(payload: AppointmentCreate, db: db_dependency, user: staff_dependency):
-    appointment = Appointments(**payload.model_dump())
-    db.add(appointment)
-    db.commit()
-    db.refresh(appointment)
-    return appointment
-
-
-@router.get("/appointments", response_model=list[AppointmentOut])
-def list_appointments(db: db_dependency, user: staff_dependency):
-    return db.query(Appointments).all()
-
-
-@router.get("/appointments/{appointment_id}", response_model=AppointmentOut)
-def get_appointment(db: db_dependency, appointment_id: int = Path(gt=0), user: staff_dependency = None):
-    appointment = db.query(Appointments).filter(Appointments.id == appointment_id).first()
-    if appointment is None:
-        raise HTTPException(status_code=404, detail="Appointment not found.")
-    return appointment
-
-
-@router.put("/appointments/{appointment_id}", response_model=AppointmentOut)
-def update_appointment(
-    payload: AppointmentUpdate,
-    db: db_dependency,
-    appointment_id: int = Path(gt=0),
-    user: staff_dependency = None,
-):
-    appointment = db.query(Appointments).filter(Appointments.id == appointment_id).first()
-    if appointment is None:
-        raise HTTPException(status_code=404, detail="Appointment not found.")
-    apply_updates(appointment, payload.model_dump(exclude_unset=True))
-    db.add(appointment)
-    db.commit()
-    db.refresh(appointment)
-    return appointment
-
-
-@router.delete("/appointments/{appointment_id}", status_code=204)
-def delete_appointment(db: db_dependency, appointment_id: int = Path(gt=0), user: staff_dependency = None):
-    appointment = db.query(Appointments).filter(Appointments.id == appointment_id).first()
-    if appointment is None:
-        raise HTTPException(status_code=404, detail="Appointment not found.")
-    db.delete(appointment)
-    db.commit()
-
-
-@router.post("/admissions", response_model=AdmissionOut, status_code=201)
-def create_admission(payload: AdmissionCreate, db: db_dependency, user: admin_doctor_dependency):
-    admission = Admissions(**payload.model_dump())
-    db.add(admission)
-    db.commit()
-    db.refresh(admission)
-    return admission
-
-
-@router.get("/admissions", response_model=list[AdmissionOut])
-def list_admissions(db: db_dependency, user: staff_dependency):
-    return db.query(Admissions).all()
-
-
-@router.get("/admissions/{admission_id}", response_model=AdmissionOut)
-def get_admission(db: db_dependency, admission_id: int = Path(gt=0), user: staff_dependency = None):
-    admission = db.query(Admissions).filter(Admissions.id == admission_id).first()
-    if admission is None:
-        raise HTTPException(status_code=404, detail="Admission not found.")
-    return admission
-
-
-@router.put("/admissions/{admission_id}", response_model=AdmissionOut)
-def update_admission(payload: AdmissionUpdate, db: db_dependency, admission_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    admission = db.query(Admissions).filter(Admissions.id == admission_id).first()
-    if admission is None:
-        raise HTTPException(status_code=404, detail="Admission not found.")
-    apply_updates(admission, payload.model_dump(exclude_unset=True))
-    db.add(admission)
-    db.commit()
-    db.refresh(admission)
-    return admission
-
-
-@router.delete("/admissions/{admission_id}", status_code=204)
-def delete_admission(db: db_dependency, admission_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    admission = db.query(Admissions).filter(Admissions.id == admission_id).first()
-    if admission is None:
-        raise HTTPException(status_code=404, detail="Admission not found.")
-    db.delete(admission)
-    db.commit()
-
-
-@router.post("/medications", response_model=MedicationOut, status_code=201)
-def create_medication(payload: MedicationCreate, db: db_dependency, user: admin_doctor_dependency):
-    medication = Medications(**payload.model_dump())
-    db.add(medication)
-    db.commit()
-    db.refresh(medication)
-    return medication
-
-
-@router.get("/medications", response_model=list[MedicationOut])
-def list_medications(db: db_dependency, user: staff_dependency):
-    return db.query(Medications).all()
-
-
-@router.get("/medications/{medication_id}", response_model=MedicationOut)
-def get_medication(db: db_dependency, medication_id: int = Path(gt=0), user: staff_dependency = None):
-    medication = db.query(Medications).filter(Medications.id == medication_id).first()
-    if medication is None:
-        raise HTTPException(status_code=404, detail="Medication not found.")
-    return medication
-
-
-@router.put("/medications/{medication_id}", response_model=MedicationOut)
-def update_medication(
-    payload: MedicationUpdate,
-    db: db_dependency,
-    medication_id: int = Path(gt=0),
-    user: admin_doctor_dependency = None,
-):
-    medication = db.query(Medications).filter(Medications.id == medication_id).first()
-    if medication is None:
-        raise HTTPException(status_code=404, detail="Medication not found.")
-    apply_updates(medication, payload.model_dump(exclude_unset=True))
-    db.add(medication)
-    db.commit()
-    db.refresh(medication)
-    return medication
-
-
-@router.delete("/medications/{medication_id}", status_code=204)
-def delete_medication(db: db_dependency, medication_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    medication = db.query(Medications).filter(Medications.id == medication_id).first()
-    if medication is None:
-        raise HTTPException(status_code=404, detail="Medication not found.")
-    db.delete(medication)
-    db.commit()
-
-
-@router.post("/prescriptions", response_model=PrescriptionOut, status_code=201)
-def create_prescription(payload: PrescriptionCreate, db: db_dependency, user: admin_doctor_dependency):
-    prescription = Prescriptions(**payload.model_dump())
-    db.add(prescription)
-    db.commit()
-    db.refresh(prescription)
-    return prescription
-
-
-@router.get("/prescriptions", response_model=list[PrescriptionOut])
-def list_prescriptions(db: db_dependency, user: admin_doctor_dependency):
-    return db.query(Prescriptions).all()
-
-
-@router.get("/prescriptions/{prescription_id}", response_model=PrescriptionOut)
-def get_prescription(db: db_dependency, prescription_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    prescription = db.query(Prescriptions).filter(Prescriptions.id == prescription_id).first()
-    if prescription is None:
-        raise HTTPException(status_code=404, detail="Prescription not found.")
-    return prescription
-
-
-@router.put("/prescriptions/{prescription_id}", response_model=PrescriptionOut)
-def update_prescription(
-    payload: PrescriptionUpdate,
-    db: db_dependency,
-    prescription_id: int = Path(gt=0),
-    user: admin_doctor_dependency = None,
-):
-    prescription = db.query(Prescriptions).filter(Prescriptions.id == prescription_id).first()
-    if prescription is None:
-        raise HTTPException(status_code=404, detail="Prescription not found.")
-    apply_updates(prescription, payload.model_dump(exclude_unset=True))
-    db.add(prescription)
-    db.commit()
-    db.refresh(prescription)
-    return prescription
-
-
-@router.delete("/prescriptions/{prescription_id}", status_code=204)
-def delete_prescription(db: db_dependency, prescription_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    prescription = db.query(Prescriptions).filter(Prescriptions.id == prescription_id).first()
-    if prescription is None:
-        raise HTTPException(status_code=404, detail="Prescription not found.")
-    db.delete(prescription)
-    db.commit()
-
-
-@router.post("/prescription-items", response_model=PrescriptionItemOut, status_code=201)
-def create_prescription_item(payload: PrescriptionItemCreate, db: db_dependency, user: admin_doctor_dependency):
-    item = PrescriptionItems(**payload.model_dump())
-    db.add(item)
-    db.commit()
-    db.refresh(item)
-    return item
-
-
-@router.get("/prescription-items", response_model=list[PrescriptionItemOut])
-def list_prescription_items(db: db_dependency, user: admin_doctor_dependency):
-    return db.query(PrescriptionItems).all()
-
-
-@router.get("/prescription-items/{item_id}", response_model=PrescriptionItemOut)
-def get_prescription_item(db: db_dependency, item_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    item = db.query(PrescriptionItems).filter(PrescriptionItems.id == item_id).first()
-    if item is None:
-        raise HTTPException(status_code=404, detail="Prescription item not found.")
-    return item
-
-
-@router.put("/prescription-items/{item_id}", response_model=PrescriptionItemOut)
-def update_prescription_item(
-    payload: PrescriptionItemUpdate,
-    db: db_dependency,
-    item_id: int = Path(gt=0),
-    user: admin_doctor_dependency = None,
-):
-    item = db.query(PrescriptionItems).filter(PrescriptionItems.id == item_id).first()
-    if item is None:
-        raise HTTPException(status_code=404, detail="Prescription item not found.")
-    apply_updates(item, payload.model_dump(exclude_unset=True))
-    db.add(item)
-    db.commit()
-    db.refresh(item)
-    return item
-
-
-@router.delete("/prescription-items/{item_id}", status_code=204)
-def delete_prescription_item(db: db_dependency, item_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    item = db.query(PrescriptionItems).filter(PrescriptionItems.id == item_id).first()
-    if item is None:
-        raise HTTPException(status_code=404, detail="Prescription item not found.")
-    db.delete(item)
-    db.commit()
-
-
-@router.post("/lab-tests", response_model=LabTestOut, status_code=201)
-def create_lab_test(payload: LabTestCreate, db: db_dependency, user: admin_doctor_dependency):
-    test = LabTests(**payload.model_dump())
-    db.add(test)
-    db.commit()
-    db.refresh(test)
-    return test
-
-
-@router.get("/lab-tests", response_model=list[LabTestOut])
-def list_lab_tests(db: db_dependency, user: admin_doctor_dependency):
-    return db.query(LabTests).all()
-
-
-@router.get("/lab-tests/{test_id}", response_model=LabTestOut)
-def get_lab_test(db: db_dependency, test_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    test = db.query(LabTests).filter(LabTests.id == test_id).first()
-    if test is None:
-        raise HTTPException(status_code=404, detail="Lab test not found.")
-    return test
-
-
-@router.put("/lab-tests/{test_id}", response_model=LabTestOut)
-def update_lab_test(payload: LabTestUpdate, db: db_dependency, test_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    test = db.query(LabTests).filter(LabTests.id == test_id).first()
-    if test is None:
-        raise HTTPException(status_code=404, detail="Lab test not found.")
-    apply_updates(test, payload.model_dump(exclude_unset=True))
-    db.add(test)
-    db.commit()
-    db.refresh(test)
-    return test
-
-
-@router.delete("/lab-tests/{test_id}", status_code=204)
-def delete_lab_test(db: db_dependency, test_id: int = Path(gt=0), user: admin_doctor_dependency = None):
-    test = db.query(LabTests).filter(LabTests.id == test_id).first()
-    if test is None:
-        raise HTTPException(status_code=404, detail="Lab test not found.")
-    db.delete(test)
-    db.commit()
-
-
-@router.post("/invoices", response_model=InvoiceOut, status_code=201)
-def create_invoice(payload: InvoiceCreate, db: db_dependency, user: admin_secretary_dependency):
-    invoice = Invoices(**payload.model_dump())
-    db.add(invoice)
-    db.commit()
-    db.refresh(invoice)
-    return invoice
-
-
-@router.get("/invoices", response_model=list[InvoiceOut])
-def list_invoices(db: db_dependency, user: admin_secretary_dependency):
-    return db.query(Invoices).all()
-
-
-@router.get("/invoices/{invoice_id}", response_model=InvoiceOut)
-def get_invoice(db: db_dependency, invoice_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    invoice = db.query(Invoices).filter(Invoices.id == invoice_id).first()
-    if invoice is None:
-        raise HTTPException(status_code=404, detail="Invoice not found.")
-    return invoice
-
-
-@router.put("/invoices/{invoice_id}", response_model=InvoiceOut)
-def update_invoice(payload: InvoiceUpdate, db: db_dependency, invoice_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    invoice = db.query(Invoices).filter(Invoices.id == invoice_id).first()
-    if invoice is None:
-        raise HTTPException(status_code=404, detail="Invoice not found.")
-    apply_updates(invoice, payload.model_dump(exclude_unset=True))
-    db.add(invoice)
-    db.commit()
-    db.refresh(invoice)
-    return invoice
-
-
-@router.delete("/invoices/{invoice_id}", status_code=204)
-def delete_invoice(db: db_dependency, invoice_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    invoice = db.query(Invoices).filter(Invoices.id == invoice_id).first()
-    if invoice is None:
-        raise HTTPException(status_code=404, detail="Invoice not found.")
-    db.delete(invoice)
-    db.commit()
-
-
-@router.post("/invoice-items", response_model=InvoiceItemOut, status_code=201)
-def create_invoice_item(payload: InvoiceItemCreate, db: db_dependency, user: admin_secretary_dependency):
-    item = InvoiceItems(**payload.model_dump())
-    db.add(item)
-    db.commit()
-    db.refresh(item)
-    return item
-
-
-@router.get("/invoice-items", response_model=list[InvoiceItemOut])
-def list_invoice_items(db: db_dependency, user: admin_secretary_dependency):
-    return db.query(InvoiceItems).all()
-
-
-@router.get("/invoice-items/{item_id}", response_model=InvoiceItemOut)
-def get_invoice_item(db: db_dependency, item_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    item = db.query(InvoiceItems).filter(InvoiceItems.id == item_id).first()
-    if item is None:
-        raise HTTPException(status_code=404, detail="Invoice item not found.")
-    return item
-
-
-@router.put("/invoice-items/{item_id}", response_model=InvoiceItemOut)
-def update_invoice_item(payload: InvoiceItemUpdate, db: db_dependency, item_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    item = db.query(InvoiceItems).filter(InvoiceItems.id == item_id).first()
-    if item is None:
-        raise HTTPException(status_code=404, detail="Invoice item not found.")
-    apply_updates(item, payload.model_dump(exclude_unset=True))
-    db.add(item)
-    db.commit()
-    db.refresh(item)
-    return item
-
-
-@router.delete("/invoice-items/{item_id}", status_code=204)
-def delete_invoice_item(db: db_dependency, item_id: int = Path(gt=0), user: admin_secretary_dependency = None):
-    item = db.query(InvoiceItems).filter(InvoiceItems.id == item_id).first()
-    if item is None:
-        raise HTTPException(status_code=404, detail="Invoice item not found.")
-    db.delete(item)
-    db.commit()
+    position = timeline_position(page.after) if page.after is not None else None
+
+    streams = []
+    for rank, (kind, model, column, schema, options) in enumerate(TIMELINE_SOURCES):
+        statement = select(model).where(model.patient_id == patient_id, column.is_not(None))
+        if position is not None:
+            statement = statement.where(timeline_before(rank, model, column, position))
+        statement = statement.options(*options).order_by(column.desc(), model.id.desc()).limit(page.limit + 1)
+        rows = db.execute(statement).scalars().all()
+        streams.append([(getattr(row, column.key), rank, row.id, kind, schema, row) for row in rows])
+
+    events = list(islice(heapq.merge(*streams, key=lambda event: event[:3], reverse=True), page.limit + 1))
+    next_cursor = None
+    if len(events) > page.limit:
+        events = events[:page.limit]
+        at, _, item_id, kind, _, _ = events[-1]
+        next_cursor = encode_cursor({"id": item_id, "k": at.isoformat(), "t": kind})
+    items = [
+        {"kind": kind, "at": at, "id": item_id, "data": schema.model_validate(row).model_dump(mode="json")}
+        for at, _, item_id, kind, schema, row in events
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/doctors/availability", response_model=list[AvailableSlot])
+def get_doctor_availability(db: db_dependency, user: staff_dependency,
+                            start: datetime = Query(alias="from"), end: datetime = Query(alias="to"),
+                            department_id: Optional[int] = None, specialization: Optional[str] = None,
+                            duration_minutes: int = Query(default=DEFAULT_APPOINTMENT_MINUTES, gt=0,
+                                                          le=MAX_APPOINTMENT_MINUTES),
+                            limit: int = Query(default=10, gt=0, le=100)):
+    if start.tzinfo is not None or end.tzinfo is not None:
+        # Appointment times are stored without an offset.
+        raise HTTPException(status_code=400, detail="Times must not include a UTC offset.")
+    if not start < end <= start + timedelta(days=AVAILABILITY_MAX_DAYS):
+        raise HTTPException(status_code=400,
+                            detail=f"'to' must be after 'from' and at most {AVAILABILITY_MAX_DAYS} days later.")
+    statement = select(Doctors.id).where(or_(Doctors.is_active.is_(None), Doctors.is_active))
+    if department_id is not None:
+        statement = statement.where(Doctors.department_id == department_id)
+    if specialization is not None:
+        statement = statement.where(Doctors.specialization == specialization)
+    doctor_ids = db.execute(statement).scalars().all()
+    length = timedelta(minutes=duration_minutes)
+    return [
+        {"doctor_id": doctor_id, "start": slot, "end": slot + length}
+        for slot, doctor_id in available_slots(db, appointment_index, doctor_ids, start, end, length, limit)
+    ]
+
+
+@router.get("/admissions/occupancy", response_model=list[RoomOccupant])
+def get_admission_occupancy(db: db_dependency, user: staff_dependency, room_number: Optional[str] = None,
+                            department_id: Optional[int] = None):
+    # Served from memory; a worker that has not warmed the index yet (the bus
+    # was never started) loads it here once.
+    if not occupancy_index.warmed:
+        occupancy_index.warm(db)
+    return occupancy_index.occupants(room_number=room_number, department_id=department_id)
+
+
+@router.get("/reports/census", response_model=list[CensusDay])
+def get_census_report(db: db_dependency, user: admin_dependency, start: date = Query(alias="from"),
+                      end: date = Query(alias="to"),
+                      group_by: Literal["hospital", "department", "doctor"] = "hospital"):
+    # `to` is inclusive.
+    if not start <= end < start + timedelta(days=CENSUS_MAX_DAYS):
+        raise HTTPException(status_code=400,
+                            detail=f"'to' must not be before 'from' and the range at most {CENSUS_MAX_DAYS} days.")
+    return census_report(db, start, end + timedelta(days=1), group_by)
+
+
+@router.get("/patients/search", response_model=list[PatientOut])
+def search_patient_records(db: db_dependency, user: staff_dependency, q: str = Query(min_length=1, max_length=100),
+                           limit: int = Query(default=10, gt=0, le=SEARCH_MAX_RESULTS)):
+    # Best matches first: name and email prefixes, then similar names, or
+    # phone numbers containing the digits when `q` has no letters.
+    return search_patients(db, q.strip(), limit)
+
+
+@router.get("/medications/suggest", response_model=list[MedicationSuggestionOut])
+def suggest_medications(db: db_dependency, user: staff_dependency, prefix: str = Query(min_length=1, max_length=120),
+                        limit: int = Query(default=10, gt=0, le=SUGGEST_MAX_RESULTS)):
+    # Served from memory; a worker that has not warmed the index yet (the bus
+    # was never started) loads it here once.
+    if not medication_names.warmed:
+        medication_names.warm(db)
+    return medication_names.suggest(prefix, limit)
+
+
+@router.post("/lab-tests/queue/claim", response_model=list[LabTestOut])
+def claim_lab_test_queue(db: db_dependency, user: admin_doctor_dependency,
+                         limit: int = Query(default=1, gt=0, le=CLAIM_MAX)):
+    # Takes up to `limit` of the oldest ordered tests for the caller; an empty
+    # list means the queue is empty.
+    return claim_lab_tests(db, user["id"], limit, lab_test_events)
+
+
+EVENT_MAX_TOPICS = 50
+
+
+async def event_token(connection: HTTPConnection, token: Optional[str] = None) -> str:
+    # Browsers cannot set headers on EventSource and WebSocket requests, so
+    # the access token may also come as ?token=.
+    scheme, _, credentials = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        return credentials
+    if token:
+        return token
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
+
+async def event_user(token: Annotated[str, Depends(event_token)]) -> dict:
+    return await get_current_user(token)
+
+
+def event_topics(db: db_dependency, user: Annotated[dict, Depends(event_user)],
+                 topic: list[str] = Query()) -> list[str]:
+    # Staff may follow any patient, doctor or department; a patient only
+    # themselves.
+    topics = list(dict.fromkeys(topic))
+    if len(topics) > EVENT_MAX_TOPICS:
+        raise HTTPException(status_code=400, detail=f"At most {EVENT_MAX_TOPICS} topics.")
+    for name in topics:
+        if parse_topic(name) is None:
+            raise HTTPException(status_code=400, detail=f"Unknown topic '{name}'.")
+    if user.get("role") not in ("admin", "doctor", "secretary"):
+        patient_id = db.execute(select(Patients.id).where(Patients.user_id == user["id"])).scalar_one_or_none()
+        if patient_id is None or set(topics) != {f"patient:{patient_id}"}:
+            raise HTTPException(status_code=403, detail="Not enough permissions.")
+    # The connection stays open for as long as the client listens; don't hold
+    # a database connection for it.
+    db.close()
+    return topics
+
+
+event_topics_dependency = Annotated[list[str], Depends(event_topics)]
+
+
+@router.get("/events")
+async def stream_events(topics: event_topics_dependency):
+    # Server-Sent Events: one `data:` line of JSON per change, plus a comment
+    # every EVENT_KEEPALIVE_SECONDS so proxies keep the connection open.
+    subscription = event_hub.subscribe(topics)
+
+    async def lines():
+        try:
+            yield f"data: {json.dumps({'type': 'subscribed', 'topics': topics})}\n\n"
+            while True:
+                message = await subscription.get(EVENT_KEEPALIVE_SECONDS)
+                yield ": keepalive\n\n" if message is None else f"data: {message}\n\n"
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(lines(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/events/ws")
+async def websocket_events(websocket: WebSocket, topics: event_topics_dependency):
+    # Same events as /events, one JSON text message each. Messages from the
+    # client are ignored; reading them is how a disconnect is noticed.
+    subscription = event_hub.subscribe(topics)
+    await websocket.accept()
+
+    async def send_events():
+        await websocket.send_text(json.dumps({"type": "subscribed", "topics": topics}))
+        while True:
+            await websocket.send_text(await subscription.get())
+
+    sender = asyncio.create_task(send_events())
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        event_hub.unsubscribe(subscription)
@@ -0,0 +1,26 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..crud import add_async_crud_routes
+from ..database import AsyncSessionLocal
+from .hospital import RESOURCES
+
+# Opt-in (HOSPITAL_ASYNC=1) variant of the hospital CRUD routes. Handlers run
+# on the event loop with an AsyncSession instead of occupying a threadpool slot.
+router = APIRouter(
+    prefix="/hospital",
+    tags=["hospital"],
+)
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+
+for resource in RESOURCES:
+    add_async_crud_routes(router, db_dependency, resource)
@@ -2,12 +2,12 @@ from typing import Annotated
 
 from ..database import SessionLocal
 from fastapi import Depends, HTTPException, APIRouter
-from passlib.context import CryptContext
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 
-from .auth import get_current_user
+from .auth import get_current_user, hash_password, revoke_user_tokens, save, verify_password
 from ..models import Users
 
 router = APIRouter(
@@ -24,7 +24,6 @@ def get_db():
 
 db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
 class UserResponse(BaseModel):
     id: int
@@ -40,6 +39,9 @@ class UserRequest(BaseModel):
     password: str
     new_password: str
 
+def get_user_model(db, user_id: int):
+    return db.query(Users).filter(Users.id == user_id).first()
+
 @router.get('/', status_code=status.HTTP_200_OK, response_model=UserResponse)
 async def get_user(user:user_dependency , db:db_dependency):
     if user is None:
@@ -56,16 +58,17 @@ async def change_password(user:user_dependency, db:db_dependency, user_request:U
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication failed!')
 
-    user_model = db.query(Users).filter(Users.id == user.get('id')).first()
+    user_model = await run_in_threadpool(get_user_model, db, user.get('id'))
     if user_model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='User not found!')
 
-    if not bcrypt_context.verify(user_request.password, user_model.hashed_password):
+    if not await verify_password(user_request.password, user_model.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Please enter the correct password.')
 
-    user_model.hashed_password = bcrypt_context.hash(user_request.new_password)
-    db.add(user_model)
-    db.commit()
+    user_model.hashed_password = await hash_password(user_request.new_password)
+    await run_in_threadpool(save, db, user_model)
+    # Tokens issued with the old password stop working on every worker.
+    await run_in_threadpool(revoke_user_tokens, db, user_model.id)
 
 @router.put('/phoneNumber/{phone_number}', status_code=status.HTTP_204_NO_CONTENT)
 async def update_phone_number (user:user_dependency, db:db_dependency, phone_number:str):
@@ -0,0 +1,274 @@
+import bisect
+import heapq
+import os
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+from types import SimpleNamespace
+from typing import Iterator, Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from .crud import WriteHooks, WriteRejected, after_commit
+from .indexes import MaintainedIndex
+from .invalidation import invalidation_bus
+from .models import Appointments, Doctors
+
+DEFAULT_APPOINTMENT_MINUTES = 30
+MAX_APPOINTMENT_MINUTES = 12 * 60
+# Appointments in these states no longer hold the doctor's time.
+INACTIVE_APPOINTMENT_STATUSES = ("cancelled",)
+
+MAX_DURATION = timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+
+WORKDAY_START = time.fromisoformat(os.getenv('WORKDAY_START', '08:00'))
+WORKDAY_END = time.fromisoformat(os.getenv('WORKDAY_END', '17:00'))
+# Monday to Friday.
+WORKING_WEEKDAYS = (0, 1, 2, 3, 4)
+AVAILABILITY_MAX_DAYS = 31
+
+appointments = Appointments.__table__
+doctors = Doctors.__table__
+
+
+def appointment_interval(row) -> tuple[datetime, datetime]:
+    minutes = row.duration_minutes or DEFAULT_APPOINTMENT_MINUTES
+    return row.scheduled_at, row.scheduled_at + timedelta(minutes=minutes)
+
+
+def is_booked(row) -> bool:
+    return (row.doctor_id is not None and row.scheduled_at is not None
+            and row.status not in INACTIVE_APPOINTMENT_STATUSES)
+
+
+booked = or_(appointments.c.status.is_(None), appointments.c.status.not_in(INACTIVE_APPOINTMENT_STATUSES))
+
+
+class AppointmentIndex(MaintainedIndex):
+    # Each doctor's booked intervals as (start, end, id) tuples sorted by start.
+    # Durations are capped, so an overlap check is a bisect for the first
+    # interval starting at or after the new end plus a short walk back.
+    #
+    # Every entry came from a committed write, so a hit is rejected without a
+    # query; other workers' deletes reach the index on the bus's next poll.
+    # Bookings it has not seen (other workers, rows older than the warm-up
+    # window) are caught by the database check, so a missing entry costs a
+    # query, never a double booking.
+    def __init__(self, rows=()):
+        super().__init__(self.build((None, rows)))
+
+    def load(self, db: Session) -> tuple:
+        # Bookings that can still overlap a new appointment.
+        horizon = datetime.now() - MAX_DURATION
+        rows = db.execute(
+            select(appointments.c.id, appointments.c.doctor_id, appointments.c.scheduled_at,
+                   appointments.c.duration_minutes, appointments.c.status)
+            .where(appointments.c.scheduled_at >= horizon)
+            .where(appointments.c.doctor_id.is_not(None), booked)
+        ).all()
+        return horizon, rows
+
+    def build(self, data: tuple) -> SimpleNamespace:
+        # warmed_from: bookings starting before it were not loaded.
+        warmed_from, rows = data
+        schedules, entries = defaultdict(list), {}
+        for row in rows:
+            entry = (*appointment_interval(row), row.id)
+            schedules[row.doctor_id].append(entry)
+            entries[row.id] = (row.doctor_id, entry)
+        for schedule in schedules.values():
+            schedule.sort()
+        return SimpleNamespace(schedules=schedules, entries=entries, warmed_from=warmed_from)
+
+    def apply(self, state: SimpleNamespace, item_id: int, row) -> None:
+        previous = state.entries.pop(item_id, None)
+        if previous is not None:
+            doctor_id, entry = previous
+            schedule = list(state.schedules[doctor_id])
+            del schedule[bisect.bisect_left(schedule, entry)]
+            state.schedules[doctor_id] = schedule
+        if row is not None:
+            entry = (*appointment_interval(row), row.id)
+            schedule = list(state.schedules[row.doctor_id])
+            bisect.insort(schedule, entry)
+            state.schedules[row.doctor_id] = schedule
+            state.entries[row.id] = (row.doctor_id, entry)
+
+    def put(self, row) -> None:
+        self.record(row.id, row if is_booked(row) else None)
+
+    def discard(self, item_id: int) -> None:
+        self.record(item_id, None)
+
+    def find_conflict(self, doctor_id: int, start: datetime, end: datetime,
+                      exclude: Optional[int] = None) -> Optional[int]:
+        earliest = start - MAX_DURATION
+        schedule = self.state.schedules.get(doctor_id, ())
+        position = bisect.bisect_left(schedule, (end,))
+        while position > 0:
+            position -= 1
+            other_start, other_end, other_id = schedule[position]
+            if other_start <= earliest:
+                break
+            if other_end > start and other_id != exclude:
+                return other_id
+        return None
+
+    def covers(self, start: datetime) -> bool:
+        warmed_from = self.state.warmed_from
+        return warmed_from is not None and start - MAX_DURATION >= warmed_from
+
+    def booked(self, doctor_id: int, start: datetime, end: datetime) -> Iterator[tuple[datetime, datetime]]:
+        # The doctor's intervals overlapping [start, end), ordered by start, read lazily.
+        schedule = self.state.schedules.get(doctor_id, ())
+        for position in range(bisect.bisect_left(schedule, (start - MAX_DURATION,)), len(schedule)):
+            other_start, other_end, _ = schedule[position]
+            if other_start >= end:
+                return
+            if other_end > start:
+                yield other_start, other_end
+
+
+def lock_doctors_statement(doctor_ids):
+    # SQL Server ignores FOR UPDATE, so it gets the lock as a table hint.
+    return (
+        select(doctors.c.id)
+        .where(doctors.c.id.in_(sorted(doctor_ids)))
+        .with_for_update()
+        .with_hint(doctors, "WITH (UPDLOCK, ROWLOCK)", "mssql")
+    )
+
+
+def lock_doctors(db: Session, doctor_ids) -> None:
+    # Serialises bookings per doctor: FOR UPDATE on PostgreSQL, UPDLOCK on SQL
+    # Server, the single writer on SQLite. Two workers cannot both pass the
+    # range check for the same slot.
+    db.execute(lock_doctors_statement(doctor_ids)).all()
+
+
+def load_bookings(db: Session, doctor_ids, start: datetime, end: datetime) -> AppointmentIndex:
+    # One range scan on ix_appointments_doctor_id_scheduled_at for every
+    # booking that could overlap [start, end); the duration cap bounds how
+    # far back an overlapping appointment can start.
+    return AppointmentIndex(db.execute(
+        select(appointments.c.id, appointments.c.doctor_id, appointments.c.scheduled_at,
+               appointments.c.duration_minutes)
+        .where(appointments.c.doctor_id.in_(sorted(doctor_ids)))
+        .where(appointments.c.scheduled_at < end, appointments.c.scheduled_at > start - MAX_DURATION)
+        .where(booked)
+    ))
+
+
+def working_hours(start: datetime, end: datetime) -> Iterator[tuple[datetime, datetime]]:
+    # (opens, closes) for each working day, clipped to [start, end).
+    day = start.date()
+    while day <= end.date():
+        if day.weekday() in WORKING_WEEKDAYS:
+            opens = max(datetime.combine(day, WORKDAY_START), start)
+            closes = min(datetime.combine(day, WORKDAY_END), end)
+            if opens < closes:
+                yield opens, closes
+        day += timedelta(days=1)
+
+
+def free_slots(booked: Iterator[tuple[datetime, datetime]], hours, length: timedelta) -> Iterator[datetime]:
+    # Walks working hours and the bookings (ordered by start) together and
+    # yields the start of every slot of `length` that fits in a gap.
+    booking = next(booked, None)
+    for cursor, closes in hours:
+        while cursor + length <= closes:
+            while booking is not None and booking[1] <= cursor:
+                booking = next(booked, None)
+            if booking is not None and booking[0] < cursor + length:
+                cursor = booking[1]
+                continue
+            yield cursor
+            cursor += length
+
+
+def first_slots(index: AppointmentIndex, doctor_ids: list[int], start: datetime, end: datetime,
+                length: timedelta, limit: int) -> list[tuple[datetime, int]]:
+    # Each doctor's slots come from a lazy generator and heapq.merge only
+    # advances the earliest one, so most schedules are barely walked.
+    hours = list(working_hours(start, end))
+
+    def doctor_slots(doctor_id: int):
+        for slot in free_slots(index.booked(doctor_id, start, end), hours, length):
+            yield slot, doctor_id
+
+    return list(islice(heapq.merge(*map(doctor_slots, doctor_ids)), limit))
+
+
+def available_slots(db: Session, index: AppointmentIndex, doctor_ids: list[int], start: datetime,
+                    end: datetime, length: timedelta, limit: int) -> list[tuple[datetime, int]]:
+    # The first `limit` (start, doctor_id) slots across all doctors. This is
+    # advice: booking a slot is still checked for conflicts.
+    if index.covers(start):
+        return first_slots(index, doctor_ids, start, end, length, limit)
+    # Without a warm index, load bookings for a window that doubles until it
+    # holds enough slots. Slots inside [start, window_end) are exactly the
+    # earliest ones overall, and the first day is usually enough.
+    window = timedelta(days=1)
+    while True:
+        window_end = min(start + window, end)
+        bookings = load_bookings(db, doctor_ids, start, window_end)
+        slots = first_slots(bookings, doctor_ids, start, window_end, length, limit)
+        if len(slots) == limit or window_end == end:
+            return slots
+        window *= 2
+
+
+class AppointmentConflicts(WriteHooks):
+    # Rejects appointments that overlap another booking of the same doctor.
+    # The written row is already in the transaction, so it is excluded from
+    # the checks and a rejection rolls it back.
+    def __init__(self, index: AppointmentIndex):
+        self.index = index
+
+    def reject(self, doctor_id: int, conflict: Optional[int]) -> None:
+        if conflict is not None:
+            raise WriteRejected(f"Doctor {doctor_id} is already booked by appointment {conflict}.")
+
+    def check(self, db: Session, rows: list[Row]) -> None:
+        rows = [row for row in rows if is_booked(row)]
+        if not rows:
+            return
+        intervals = [appointment_interval(row) for row in rows]
+        for row, interval in zip(rows, intervals):
+            self.reject(row.doctor_id, self.index.find_conflict(row.doctor_id, *interval, exclude=row.id))
+        doctor_ids = {row.doctor_id for row in rows}
+        lock_doctors(db, doctor_ids)
+        # The new rows are in the transaction too, so a bulk chunk is also
+        # checked against itself.
+        bookings = load_bookings(db, doctor_ids, min(start for start, _ in intervals),
+                                 max(end for _, end in intervals))
+        for row, interval in zip(rows, intervals):
+            self.reject(row.doctor_id, bookings.find_conflict(row.doctor_id, *interval, exclude=row.id))
+
+    def creating(self, values: list[dict]) -> None:
+        # Known conflicts are refused before the INSERT. Stored times are naive,
+        # so timezone-aware ones wait for the checks on the written row.
+        for booking in (SimpleNamespace(**item) for item in values):
+            if is_booked(booking) and booking.scheduled_at.tzinfo is None:
+                self.reject(booking.doctor_id, self.index.find_conflict(booking.doctor_id,
+                                                                        *appointment_interval(booking)))
+
+    def created(self, db: Session, rows: list[Row]) -> None:
+        self.check(db, rows)
+        after_commit(db, lambda: [self.index.put(row) for row in rows])
+
+    def updated(self, db: Session, old: Row, new: Row) -> None:
+        fields = ("doctor_id", "scheduled_at", "duration_minutes", "status")
+        if any(getattr(old, field) != getattr(new, field) for field in fields):
+            self.check(db, [new])
+        after_commit(db, lambda: self.index.put(new))
+
+    def deleted(self, db: Session, old: Row) -> None:
+        after_commit(db, lambda: self.index.discard(old.id))
+
+
+appointment_index = AppointmentIndex()
+# The bus polls on startup, so this also warms the index on a worker's first read.
+invalidation_bus.subscribe(appointments.name, appointment_index.invalidate, remote_only=True)
@@ -0,0 +1,48 @@
+from typing import Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .pagination import decode_cursor
+
+STREAM_BATCH_SIZE = 1000
+
+
+def export_statement(list_query, after: Optional[str]):
+    statement = list_query.statement()
+    if after is not None:
+        statement = statement.where(list_query.after(decode_cursor(after)))
+    return statement
+
+
+def stream_ndjson(db: Session, list_query, after: Optional[str] = None,
+                  batch_size: int = STREAM_BATCH_SIZE) -> StreamingResponse:
+    statement = export_statement(list_query, after)
+
+    # The request session is closed before the body is sent, so the export
+    # opens its own connection on the same engine. Rows are read in batches
+    # with a server-side cursor and never become ORM objects.
+    bind = db.get_bind()
+
+    def lines():
+        with bind.connect() as connection:
+            result = connection.execution_options(yield_per=batch_size).execute(statement)
+            for batch in result.partitions():
+                yield "".join(list_query.to_json(row) + "\n" for row in batch)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def stream_ndjson_async(db: AsyncSession, list_query, after: Optional[str] = None,
+                        batch_size: int = STREAM_BATCH_SIZE) -> StreamingResponse:
+    statement = export_statement(list_query, after)
+    bind = db.bind
+
+    async def lines():
+        async with bind.connect() as connection:
+            result = await connection.stream(statement.execution_options(yield_per=batch_size))
+            async for batch in result.partitions():
+                yield "".join(list_query.to_json(row) + "\n" for row in batch)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
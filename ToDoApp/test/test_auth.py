@@ -1,27 +1,32 @@
 from fastapi import HTTPException
 
 from .utils import *
-from ..routers.auth import get_db, authenticate_user, create_access_token, SECRET_KEY, ALGORITHM, get_current_user
+from ..routers.auth import get_db, authenticate_user, create_access_token, SECRET_KEY, ALGORITHM, get_current_user, \
+    revoke_token, revoke_user_tokens, token_cache, token_digest, apply_revocation, revoked_users, REVOCATION_TTL
 from jose import jwt
 from datetime import timedelta
 import pytest
+import time
 
 app.dependency_overrides[get_db]  = override_get_db
 
-def test_authenticate_user(test_user):
+@pytest.mark.asyncio
+async def test_authenticate_user(test_user):
     db = TestSessionLocal()
-    authenticated_user = authenticate_user(test_user.username, '123', db)
+    authenticated_user = await authenticate_user(test_user.username, '123', db)
     assert authenticated_user is not None
     assert authenticated_user.username == test_user.username
 
-def test_non_existing_user(test_user):
+@pytest.mark.asyncio
+async def test_non_existing_user(test_user):
     db = TestSessionLocal()
-    non_existing_user = authenticate_user('wrongUsername', '123', db)
+    non_existing_user = await authenticate_user('wrongUsername', '123', db)
     assert non_existing_user is False
 
-def test_wrong_password_user(test_user):
+@pytest.mark.asyncio
+async def test_wrong_password_user(test_user):
     db = TestSessionLocal()
-    wrong_password_user = authenticate_user(test_user.username, 'wrongPassword', db)
+    wrong_password_user = await authenticate_user(test_user.username, 'wrongPassword', db)
     assert wrong_password_user is False
 
 def test_create_access_token():
@@ -55,3 +60,42 @@ async def test_get_current_user_invalid_token():
 
     assert e.value.status_code == 401
     assert e.value.detail == 'COULD NOT VALIDATE USER'
+
+@pytest.mark.asyncio
+async def test_get_current_user_caches_verified_token():
+    token = create_access_token(username='cached', user_id=7, role='doctor', expires_delta=timedelta(minutes=5))
+
+    user = await get_current_user(token=token)
+    assert user == {'username': 'cached', 'id': 7, 'role': 'doctor'}
+    assert token_digest(token) in token_cache
+    assert await get_current_user(token=token) == user
+
+@pytest.mark.asyncio
+async def test_revoked_token_is_rejected():
+    token = create_access_token(username='revoked', user_id=8, role='doctor', expires_delta=timedelta(minutes=5))
+    await get_current_user(token=token)
+
+    revoke_token(TestSessionLocal(), token)
+
+    with pytest.raises(HTTPException) as e:
+        await get_current_user(token=token)
+    assert e.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_revoked_user_needs_new_token():
+    old_token = create_access_token(username='promoted', user_id=9, role='doctor', expires_delta=timedelta(minutes=5))
+    await get_current_user(token=old_token)
+
+    revoke_user_tokens(TestSessionLocal(), 9)
+
+    with pytest.raises(HTTPException):
+        await get_current_user(token=old_token)
+    new_token = create_access_token(username='promoted', user_id=9, role='admin', expires_delta=timedelta(minutes=5))
+    assert (await get_current_user(token=new_token))['role'] == 'admin'
+
+def test_user_revocations_expire():
+    now = time.time()
+    apply_revocation(None, 42, now, now + REVOCATION_TTL)
+    apply_revocation(None, 43, now - REVOCATION_TTL - 1, now - 1)
+    assert 42 in revoked_users
+    assert 43 not in revoked_users
@@ -0,0 +1,833 @@
+import json
+from datetime import date
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import mssql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.testclient import WebSocketDenialResponse
+
+from ..billing import reconcile_invoice_totals
+from ..census import rebuild_admission_stats
+from ..crud import lock_statement
+from ..database import Base
+from .. import indexes
+from ..formulary import medication_names
+from ..invalidation import InvalidationBus, invalidation_bus
+from ..occupancy import occupancy_index
+from ..patient_search import rebuild_search_grams
+from ..main import app
+from ..models import Departments, InvoiceItems, Patients
+from ..routers.hospital import event_user, get_db, get_current_user
+from ..scheduling import appointment_index, lock_doctors_statement
+
+SQLALCHEMY_DATABASE_URL = 'sqlite:///./testdb.db'
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+def override_get_db():
+    db = TestSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def override_get_current_user():
+    return {'username': 'isejda', 'id': 1, 'role': 'admin'}
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[event_user] = override_get_current_user
+
+client = TestClient(app)
+
+@pytest.fixture
+def remote_writes(monkeypatch):
+    # The bus and the indexes it reloads read the test database; returns a
+    # function that writes as another worker would, bumping the version.
+    monkeypatch.setattr(invalidation_bus, 'bind', engine)
+    monkeypatch.setattr(indexes, 'SessionLocal', TestSessionLocal)
+    invalidation_bus.seed()
+    invalidation_bus.poll()
+
+    def write(sql, name):
+        with engine.connect() as connection:
+            connection.execute(text(sql))
+            connection.execute(text(f"UPDATE cache_versions SET version = version + 1 WHERE name = '{name}'"))
+            connection.commit()
+    return write
+
+@pytest.fixture
+def test_patients():
+    db = TestSessionLocal()
+    patients = [
+        Patients(first_name=f'Patient{i}', last_name='Test', dob=date(1990, 1, i + 1), email=f'p{i}@test.com')
+        for i in range(5)
+    ]
+    db.add_all(patients)
+    db.commit()
+    yield patients
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM patient_search_grams"))
+        connection.execute(text("DELETE FROM patients"))
+        connection.commit()
+
+def test_list_patients_paginates_by_cursor(test_patients):
+    response = client.get('/hospital/patients?limit=2')
+    assert response.status_code == status.HTTP_200_OK
+    first_page = response.json()
+    assert [p['first_name'] for p in first_page['items']] == ['Patient0', 'Patient1']
+    assert first_page['next_cursor'] is not None
+
+    response = client.get(f"/hospital/patients?limit=2&after={first_page['next_cursor']}")
+    assert [p['first_name'] for p in response.json()['items']] == ['Patient2', 'Patient3']
+
+    response = client.get(f"/hospital/patients?limit=2&after={response.json()['next_cursor']}")
+    assert [p['first_name'] for p in response.json()['items']] == ['Patient4']
+    assert response.json()['next_cursor'] is None
+
+def test_list_patients_invalid_cursor(test_patients):
+    response = client.get('/hospital/patients?after=not-a-cursor')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor.'}
+
+def test_list_patients_stream_ndjson(test_patients):
+    response = client.get('/hospital/patients?stream=ndjson')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [p['first_name'] for p in lines] == [f'Patient{i}' for i in range(5)]
+    assert lines[0]['dob'] == '1990-01-01'
+
+def test_list_patients_filters_and_orders(test_patients):
+    response = client.get('/hospital/patients?dob__gte=1990-01-02&dob__lt=1990-01-05&order_by=-dob&limit=2')
+    assert response.status_code == status.HTTP_200_OK
+    assert [p['first_name'] for p in response.json()['items']] == ['Patient3', 'Patient2']
+
+    cursor = response.json()['next_cursor']
+    response = client.get(f'/hospital/patients?dob__gte=1990-01-02&dob__lt=1990-01-05&order_by=-dob&after={cursor}')
+    assert [p['first_name'] for p in response.json()['items']] == ['Patient1']
+    assert response.json()['next_cursor'] is None
+
+def test_list_patients_cursor_must_match_order(test_patients):
+    cursor = client.get('/hospital/patients?order_by=dob&limit=1').json()['next_cursor']
+    response = client.get(f'/hospital/patients?order_by=-dob&after={cursor}')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {'detail': 'Cursor does not match order_by.'}
+
+def test_list_patients_sparse_fields(test_patients):
+    response = client.get('/hospital/patients?fields=first_name&email=p1@test.com')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {'items': [{'id': test_patients[1].id, 'first_name': 'Patient1'}], 'next_cursor': None}
+
+def test_list_patients_rejects_unindexed_filter(test_patients):
+    response = client.get('/hospital/patients?address=Tirana')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {'detail': "Filtering on 'address' is not supported."}
+
+def test_update_patient_returns_updated_row(test_patients):
+    patient_id = test_patients[0].id
+    response = client.put(f'/hospital/patients/{patient_id}', json={'first_name': 'Renamed'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['first_name'] == 'Renamed'
+    assert response.json()['email'] == 'p0@test.com'
+
+    response = client.put(f'/hospital/patients/{patient_id}', json={})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['first_name'] == 'Renamed'
+
+def test_update_and_delete_missing_patient(test_patients):
+    assert client.put('/hospital/patients/9999', json={'first_name': 'Nobody'}).status_code == 404
+    response = client.delete('/hospital/patients/9999')
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'Patient not found.'}
+
+def test_create_and_delete_patient(test_patients):
+    response = client.post('/hospital/patients', json={
+        'first_name': 'New', 'last_name': 'Patient', 'dob': '2000-01-01', 'email': 'new@test.com',
+    })
+    assert response.status_code == status.HTTP_201_CREATED
+    patient_id = response.json()['id']
+    assert client.delete(f'/hospital/patients/{patient_id}').status_code == status.HTTP_204_NO_CONTENT
+    assert client.get(f'/hospital/patients/{patient_id}').status_code == 404
+
+def test_list_departments_cached_until_write():
+    db = TestSessionLocal()
+    db.add(Departments(name='Cardiology'))
+    db.commit()
+    db.close()
+    try:
+        first = client.get('/hospital/departments')
+        assert [d['name'] for d in first.json()['items']] == ['Cardiology']
+
+        # Rows written behind the API's back are not seen until the cache is invalidated.
+        with engine.connect() as connection:
+            connection.execute(text("INSERT INTO departments (name) VALUES ('Direct')"))
+            connection.commit()
+        assert client.get('/hospital/departments').content == first.content
+
+        response = client.post('/hospital/departments', json={'name': 'Neurology'})
+        assert response.status_code == status.HTTP_201_CREATED
+        names = [d['name'] for d in client.get('/hospital/departments').json()['items']]
+        assert names == ['Cardiology', 'Direct', 'Neurology']
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM departments"))
+            connection.commit()
+
+def test_list_cache_dropped_when_another_worker_writes(monkeypatch):
+    monkeypatch.setattr(invalidation_bus, 'bind', engine)
+    try:
+        assert client.post('/hospital/medications', json={'name': 'Aspirin'}).status_code == 201
+        first = client.get('/hospital/medications')
+        assert [m['name'] for m in first.json()['items']] == ['Aspirin']
+
+        # Another worker inserts a row and bumps the version in the same transaction.
+        with engine.connect() as connection:
+            connection.execute(text("INSERT INTO medications (name) VALUES ('Ibuprofen')"))
+            connection.execute(text("UPDATE cache_versions SET version = version + 1 WHERE name = 'medications'"))
+            connection.commit()
+        assert client.get('/hospital/medications').content == first.content
+
+        invalidation_bus.poll()
+        names = [m['name'] for m in client.get('/hospital/medications').json()['items']]
+        assert names == ['Aspirin', 'Ibuprofen']
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM medications"))
+            connection.commit()
+
+def test_invalidation_bus_treats_skipped_versions_as_remote():
+    bus = InvalidationBus(engine, 1)
+    seen = []
+    bus.subscribe('things', lambda version: seen.append(('local', version)))
+    bus.subscribe('things', lambda version: seen.append(('remote', version)), remote_only=True)
+
+    bus.observe('things', 1, remote=True)
+    bus.observe('things', 2)
+    # Version 3 came from another worker and was not polled before this write.
+    bus.observe('things', 4)
+    bus.observe('things', 3, remote=True)
+    assert seen == [('local', 1), ('remote', 1), ('local', 2), ('local', 4), ('remote', 4)]
+
+def test_list_and_detail_not_modified_until_write(test_patients):
+    response = client.get('/hospital/patients')
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    response = client.get('/hospital/patients', headers={'If-None-Match': etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b''
+
+    patient_id = test_patients[0].id
+    detail = client.get(f'/hospital/patients/{patient_id}')
+    assert detail.headers['ETag'] == etag
+    assert client.get(f'/hospital/patients/{patient_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    client.put(f'/hospital/patients/{patient_id}', json={'phone': '555'})
+    response = client.get('/hospital/patients', headers={'If-None-Match': etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['ETag'] != etag
+
+def test_bulk_create_patients_reports_each_item(test_patients):
+    response = client.post('/hospital/patients/bulk', json=[
+        {'first_name': 'Bulk0', 'last_name': 'Test', 'dob': '1980-01-01'},
+        {'first_name': '', 'last_name': 'Test', 'dob': '1980-01-01'},
+        'not a patient',
+        {'first_name': 'Bulk1', 'last_name': 'Test', 'dob': '1980-01-02'},
+    ])
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert (body['created'], body['failed']) == (2, 2)
+    assert [item['status'] for item in body['items']] == ['created', 'invalid', 'invalid', 'created']
+    assert body['items'][1]['errors'][0]['loc'] == ['first_name']
+
+    created = client.get(f"/hospital/patients/{body['items'][3]['id']}").json()
+    assert created['first_name'] == 'Bulk1'
+
+def test_bulk_create_isolates_rows_rejected_by_database(test_patients):
+    response = client.post('/hospital/patients/bulk', json=[
+        {'first_name': 'Fresh', 'last_name': 'Test', 'dob': '1980-01-01', 'email': 'fresh@test.com'},
+        {'first_name': 'Dup', 'last_name': 'Test', 'dob': '1980-01-01', 'email': 'p0@test.com'},
+    ])
+    body = response.json()
+    assert [item['status'] for item in body['items']] == ['created', 'failed']
+    assert body['items'][0]['id'] is not None
+
+def test_create_prescription_with_items(test_patients):
+    medication_id = client.post('/hospital/medications', json={'name': 'Amoxicillin'}).json()['id']
+    doctor_id = client.post('/hospital/doctors', json={
+        'first_name': 'Dr', 'last_name': 'Script', 'email': 'script@test.com',
+    }).json()['id']
+
+    def prescribe(*items, **values):
+        return client.post('/hospital/prescriptions/with-items', json={
+            'patient_id': test_patients[0].id, 'doctor_id': doctor_id, 'issued_at': '2026-03-01T10:00:00',
+            'items': [{'medication_id': medication_id, 'dosage': '500mg', 'frequency': 'tid', 'duration_days': 7,
+                       **item} for item in items],
+            **values,
+        })
+
+    def count(table):
+        with engine.connect() as connection:
+            return connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+
+    try:
+        response = prescribe({}, {'dosage': '250mg', 'duration_days': 5})
+        assert response.status_code == status.HTTP_201_CREATED
+        prescription = response.json()
+        assert [item['prescription_id'] for item in prescription['items']] == [prescription['id']] * 2
+        assert [item['dosage'] for item in prescription['items']] == ['500mg', '250mg']
+
+        # One bad item keeps the whole prescription out.
+        assert prescribe({}, {'duration_days': 0}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        unknown = prescribe({}, {'medication_id': medication_id + 100})
+        assert unknown.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert unknown.json()['detail'] == f'Unknown medication_id {medication_id + 100}.'
+        assert prescribe({}, doctor_id=doctor_id + 100).json()['detail'] == f'Unknown doctor_id {doctor_id + 100}.'
+        assert prescribe({}, patient_id=9999).json()['detail'] == 'Unknown patient_id 9999.'
+        assert (count('prescriptions'), count('prescription_items')) == (1, 2)
+    finally:
+        with engine.connect() as connection:
+            for table in ('prescription_items', 'prescriptions', 'medications', 'doctors'):
+                connection.execute(text(f"DELETE FROM {table}"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            medication_names.warm(db)
+
+def test_create_invoice_with_items_computes_total(test_patients):
+    response = client.post('/hospital/invoices/with-items', json={
+        'patient_id': test_patients[0].id,
+        'issued_at': '2026-03-01T10:00:00',
+        'items': [{'description': 'Consultation', 'amount': 80.1}, {'description': 'X-ray', 'amount': 40.2}],
+    })
+    assert response.status_code == status.HTTP_201_CREATED
+    invoice = response.json()
+    assert invoice['total_amount'] == 120.3
+    assert [item['invoice_id'] for item in invoice['items']] == [invoice['id'], invoice['id']]
+    assert [item['description'] for item in invoice['items']] == ['Consultation', 'X-ray']
+
+    listed = client.get(f"/hospital/invoice-items?invoice_id={invoice['id']}").json()['items']
+    assert len(listed) == 2
+
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM invoice_items"))
+        connection.execute(text("DELETE FROM invoices"))
+        connection.commit()
+
+def test_update_hooks_lock_the_old_row_on_sql_server():
+    sql = str(lock_statement(InvoiceItems, 1).compile(dialect=mssql.dialect()))
+    assert 'FROM invoice_items WITH (UPDLOCK, ROWLOCK)' in sql
+
+def test_invoice_total_follows_item_writes(test_patients):
+    def total(invoice_id):
+        return client.get(f'/hospital/invoices/{invoice_id}').json()['total_amount']
+
+    new_invoice = {'patient_id': test_patients[0].id, 'issued_at': '2026-03-01T10:00:00'}
+    first = client.post('/hospital/invoices', json=new_invoice).json()['id']
+    second = client.post('/hospital/invoices', json=new_invoice).json()['id']
+    assert total(first) == 0
+
+    item = client.post('/hospital/invoice-items', json={'invoice_id': first, 'description': 'Visit', 'amount': 0.1}).json()
+    client.post('/hospital/invoice-items/bulk', json=[
+        {'invoice_id': first, 'description': 'Lab', 'amount': 0.2},
+        {'invoice_id': second, 'description': 'Lab', 'amount': 5},
+    ])
+    assert total(first) == 0.3
+
+    client.put(f"/hospital/invoice-items/{item['id']}", json={'amount': 1.15})
+    assert total(first) == 1.35
+
+    client.put(f"/hospital/invoice-items/{item['id']}", json={'invoice_id': second})
+    assert (total(first), total(second)) == (0.2, 6.15)
+
+    client.delete(f"/hospital/invoice-items/{item['id']}")
+    assert total(second) == 5
+
+    with engine.connect() as connection:
+        connection.execute(text("UPDATE invoices SET total_amount = 99"))
+        connection.commit()
+    db = TestSessionLocal()
+    assert reconcile_invoice_totals(db, chunk_size=1) == 2
+    assert reconcile_invoice_totals(db, chunk_size=1) == 0
+    db.close()
+    assert (total(first), total(second)) == (0.2, 5)
+
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM invoice_items"))
+        connection.execute(text("DELETE FROM invoices"))
+        connection.commit()
+
+def test_patient_timeline_merges_collections_newest_first(test_patients):
+    patient_id = test_patients[0].id
+    client.post('/hospital/appointments', json={'patient_id': patient_id, 'doctor_id': 1, 'scheduled_at': '2026-01-03T09:00:00'})
+    client.post('/hospital/lab-tests', json={'patient_id': patient_id, 'ordered_by_doctor_id': 1, 'test_name': 'CBC', 'ordered_at': '2026-01-02T09:00:00'})
+    medication_id = client.post('/hospital/medications', json={'name': 'Timelinol'}).json()['id']
+    doctor_id = client.post('/hospital/doctors', json={
+        'first_name': 'Dr', 'last_name': 'Timeline', 'email': 'timeline@test.com',
+    }).json()['id']
+    client.post('/hospital/prescriptions/with-items', json={
+        'patient_id': patient_id, 'doctor_id': doctor_id, 'issued_at': '2026-01-03T09:00:00',
+        'items': [{'medication_id': medication_id, 'dosage': '5mg', 'frequency': 'daily', 'duration_days': 3}],
+    })
+    client.post('/hospital/appointments', json={'patient_id': test_patients[1].id, 'doctor_id': 1, 'scheduled_at': '2026-01-04T09:00:00'})
+
+    first = client.get(f'/hospital/patients/{patient_id}/timeline?limit=2').json()
+    assert [(e['kind'], e['at']) for e in first['items']] == [
+        ('prescription', '2026-01-03T09:00:00'), ('appointment', '2026-01-03T09:00:00'),
+    ]
+    assert first['items'][0]['data']['items'][0]['medication_name'] == 'Timelinol'
+
+    second = client.get(f"/hospital/patients/{patient_id}/timeline?limit=2&after={first['next_cursor']}").json()
+    assert [e['kind'] for e in second['items']] == ['lab_test']
+    assert second['next_cursor'] is None
+
+    assert client.get('/hospital/patients/9999/timeline').status_code == 404
+
+    with engine.connect() as connection:
+        for table in ('appointments', 'lab_tests', 'prescription_items', 'prescriptions', 'medications', 'doctors'):
+            connection.execute(text(f"DELETE FROM {table}"))
+        connection.commit()
+
+def test_appointments_reject_double_booking(test_patients):
+    def book(scheduled_at, **extra):
+        return client.post('/hospital/appointments', json={
+            'patient_id': test_patients[0].id, 'doctor_id': 7, 'scheduled_at': scheduled_at, **extra,
+        })
+
+    try:
+        first = book('2027-03-01T09:00:00', duration_minutes=60)
+        assert first.status_code == 201
+        assert first.json()['duration_minutes'] == 60
+        assert book('2027-03-01T09:30:00').status_code == status.HTTP_409_CONFLICT
+        second = book('2027-03-01T10:00:00')
+        assert second.status_code == 201
+
+        moved = client.put(f"/hospital/appointments/{second.json()['id']}", json={'scheduled_at': '2027-03-01T09:45:00'})
+        assert moved.status_code == status.HTTP_409_CONFLICT
+        client.put(f"/hospital/appointments/{first.json()['id']}", json={'status': 'cancelled'})
+        assert book('2027-03-01T09:15:00').status_code == 201
+
+        response = client.post('/hospital/appointments/bulk', json=[
+            {'patient_id': test_patients[0].id, 'doctor_id': 7, 'scheduled_at': '2027-03-02T09:00:00'},
+            {'patient_id': test_patients[1].id, 'doctor_id': 7, 'scheduled_at': '2027-03-02T09:10:00'},
+        ])
+        assert [item['status'] for item in response.json()['items']] == ['created', 'failed']
+
+        # Booked by another worker, so only the database check can see it.
+        with engine.connect() as connection:
+            connection.execute(text(
+                "INSERT INTO appointments (doctor_id, scheduled_at, duration_minutes, status) "
+                "VALUES (7, '2027-03-03 09:00:00.000000', 30, 'scheduled')"
+            ))
+            connection.commit()
+        assert book('2027-03-03T09:10:00').status_code == status.HTTP_409_CONFLICT
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM appointments"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            appointment_index.warm(db)
+
+def test_lock_doctors_takes_update_lock_on_sql_server():
+    sql = str(lock_doctors_statement([2, 1]).compile(dialect=mssql.dialect()))
+    assert 'FROM doctors WITH (UPDLOCK, ROWLOCK)' in sql
+
+def test_doctor_availability_merges_free_slots():
+    def doctor(last_name, specialization):
+        return client.post('/hospital/doctors', json={
+            'first_name': 'Dr', 'last_name': last_name, 'email': f'{last_name}@test.com',
+            'specialization': specialization,
+        }).json()['id']
+
+    def book(doctor_id, scheduled_at, minutes):
+        client.post('/hospital/appointments', json={
+            'patient_id': 1, 'doctor_id': doctor_id, 'scheduled_at': scheduled_at, 'duration_minutes': minutes,
+        })
+
+    try:
+        first, second = doctor('Heart', 'Cardiology'), doctor('Valve', 'Cardiology')
+        doctor('Brain', 'Neurology')
+        # 2027-03-01 is a Monday.
+        book(first, '2027-03-01T08:00:00', 60)
+        book(second, '2027-03-01T08:00:00', 30)
+
+        response = client.get('/hospital/doctors/availability', params={
+            'specialization': 'Cardiology', 'from': '2027-03-01T00:00:00', 'to': '2027-03-02T00:00:00', 'limit': 4,
+        })
+        assert response.status_code == status.HTTP_200_OK
+        assert [(slot['doctor_id'], slot['start']) for slot in response.json()] == [
+            (second, '2027-03-01T08:30:00'), (first, '2027-03-01T09:00:00'),
+            (second, '2027-03-01T09:00:00'), (first, '2027-03-01T09:30:00'),
+        ]
+
+        # Saturday and Sunday are skipped.
+        response = client.get('/hospital/doctors/availability', params={
+            'specialization': 'Cardiology', 'from': '2027-03-06T00:00:00', 'to': '2027-03-09T00:00:00', 'limit': 1,
+        })
+        assert response.json() == [{'doctor_id': first, 'start': '2027-03-08T08:00:00', 'end': '2027-03-08T08:30:00'}]
+
+        response = client.get('/hospital/doctors/availability', params={
+            'from': '2027-03-02T00:00:00', 'to': '2027-03-01T00:00:00',
+        })
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM appointments"))
+            connection.execute(text("DELETE FROM doctors"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            appointment_index.warm(db)
+
+def test_doctor_availability_after_missed_remote_write(remote_writes):
+    doctor_id = client.post('/hospital/doctors', json={
+        'first_name': 'Dr', 'last_name': 'Gap', 'email': 'gap@test.com', 'specialization': 'Oncology',
+    }).json()['id']
+
+    def book(scheduled_at):
+        return client.post('/hospital/appointments', json={
+            'patient_id': 1, 'doctor_id': doctor_id, 'scheduled_at': scheduled_at,
+        })
+
+    def first_free():
+        return client.get('/hospital/doctors/availability', params={
+            'specialization': 'Oncology', 'from': '2027-03-01T00:00:00', 'to': '2027-03-02T00:00:00', 'limit': 1,
+        }).json()[0]['start']
+
+    try:
+        with TestSessionLocal() as db:
+            appointment_index.warm(db)
+        booked = book('2027-03-01T08:00:00').json()['id']
+        book('2027-03-01T10:00:00')
+        assert first_free() == '2027-03-01T08:30:00'
+
+        # Another worker cancels the booking, and this worker writes before polling.
+        remote_writes(f"DELETE FROM appointments WHERE id = {booked}", 'appointments')
+        assert book('2027-03-01T12:00:00').status_code == 201
+        invalidation_bus.poll()
+        assert first_free() == '2027-03-01T08:00:00'
+        assert book('2027-03-01T08:00:00').status_code == 201
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM appointments"))
+            connection.execute(text("DELETE FROM doctors"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            appointment_index.warm(db)
+
+def test_admission_occupancy_follows_admission_writes(test_patients):
+    def admit(room_number, doctor_id, **extra):
+        return client.post('/hospital/admissions', json={
+            'patient_id': test_patients[0].id, 'attending_doctor_id': doctor_id,
+            'admitted_at': '2027-02-01T10:00:00', 'room_number': room_number, **extra,
+        }).json()['id']
+
+    def occupancy(**params):
+        response = client.get('/hospital/admissions/occupancy', params=params)
+        assert response.status_code == status.HTTP_200_OK
+        return [(entry['room_number'], entry['admission_id']) for entry in response.json()]
+
+    try:
+        doctor_id = client.post('/hospital/doctors', json={
+            'first_name': 'Dr', 'last_name': 'Ward', 'email': 'ward@test.com', 'department_id': 3,
+        }).json()['id']
+        first = admit('101', doctor_id)
+        admit('102', doctor_id, discharged_at='2027-02-03T10:00:00')
+        second = admit('101', 9999)
+
+        assert occupancy() == [('101', first), ('101', second)]
+        assert occupancy(room_number='102') == []
+        assert occupancy(department_id=3) == [('101', first)]
+
+        client.put(f'/hospital/admissions/{first}', json={'discharged_at': '2027-02-04T10:00:00'})
+        assert occupancy(room_number='101') == [('101', second)]
+        client.put(f'/hospital/admissions/{second}', json={'room_number': '103'})
+        assert occupancy() == [('103', second)]
+        client.delete(f'/hospital/admissions/{second}')
+        assert occupancy() == []
+    finally:
+        with engine.connect() as connection:
+            for table in ('admission_daily_stats', 'admissions', 'doctors'):
+                connection.execute(text(f"DELETE FROM {table}"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            occupancy_index.warm(db)
+
+def test_admission_occupancy_after_missed_remote_write(test_patients, remote_writes):
+    def admit(room_number):
+        return client.post('/hospital/admissions', json={
+            'patient_id': test_patients[0].id, 'attending_doctor_id': 9999, 'admitted_at': '2027-02-01T10:00:00',
+            'room_number': room_number,
+        }).json()['id']
+
+    try:
+        with TestSessionLocal() as db:
+            occupancy_index.warm(db)
+        first = admit('201')
+        admit('202')
+        # Another worker discharges the first, and this worker writes before polling.
+        remote_writes(f"UPDATE admissions SET discharged_at = '2027-02-02 10:00:00.000000' WHERE id = {first}",
+                      'admissions')
+        admit('203')
+        invalidation_bus.poll()
+        rooms = [entry['room_number'] for entry in client.get('/hospital/admissions/occupancy').json()]
+        assert rooms == ['202', '203']
+    finally:
+        with engine.connect() as connection:
+            for table in ('admission_daily_stats', 'admissions'):
+                connection.execute(text(f"DELETE FROM {table}"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            occupancy_index.warm(db)
+
+def test_census_report_follows_admission_writes(test_patients):
+    def admit(doctor_id, admitted_at, discharged_at=None):
+        return client.post('/hospital/admissions', json={
+            'patient_id': test_patients[0].id, 'attending_doctor_id': doctor_id,
+            'admitted_at': admitted_at, 'discharged_at': discharged_at,
+        }).json()['id']
+
+    def report(**params):
+        response = client.get('/hospital/reports/census', params={'from': '2027-02-01', 'to': '2027-02-03', **params})
+        assert response.status_code == status.HTTP_200_OK
+        return [(day['day'], day['admissions'], day['discharges'], day['census'], day['average_stay_days'])
+                for day in response.json()]
+
+    try:
+        first = client.post('/hospital/doctors', json={
+            'first_name': 'Dr', 'last_name': 'First', 'email': 'first@test.com', 'department_id': 4,
+        }).json()['id']
+        second = client.post('/hospital/doctors', json={
+            'first_name': 'Dr', 'last_name': 'Second', 'email': 'second@test.com', 'department_id': 5,
+        }).json()['id']
+        admit(first, '2027-01-30T12:00:00', '2027-02-02T12:00:00')
+        admit(first, '2027-02-01T10:00:00', '2027-02-03T10:00:00')
+        open_stay = admit(second, '2027-02-02T08:00:00')
+
+        assert report() == [
+            ('2027-02-01', 1, 0, 2, None),
+            ('2027-02-02', 1, 1, 2, 3.0),
+            ('2027-02-03', 0, 1, 1, 2.0),
+        ]
+        client.put(f'/hospital/admissions/{open_stay}', json={'discharged_at': '2027-02-03T08:00:00'})
+        assert report()[-1] == ('2027-02-03', 0, 2, 0, 1.5)
+
+        by_department = client.get('/hospital/reports/census', params={
+            'from': '2027-02-03', 'to': '2027-02-03', 'group_by': 'department',
+        }).json()
+        assert [(day['department_id'], day['discharges'], day['census']) for day in by_department] == [(4, 1, 0), (5, 1, 0)]
+
+        expected = report(group_by='doctor')
+        with engine.connect() as connection:
+            connection.execute(text("UPDATE admission_daily_stats SET admissions = 99"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            assert rebuild_admission_stats(db, chunk_days=1) == 6
+        assert report(group_by='doctor') == expected
+
+        assert client.get('/hospital/reports/census', params={'from': '2027-02-03', 'to': '2027-02-01'}).status_code == 400
+        # No rollup rows at all in or before the range.
+        empty = client.get('/hospital/reports/census', params={'from': '2020-01-01', 'to': '2020-01-02'}).json()
+        assert [(day['day'], day['admissions'], day['census']) for day in empty] == [
+            ('2020-01-01', 0, 0), ('2020-01-02', 0, 0),
+        ]
+        assert client.get('/hospital/reports/census', params={
+            'from': '2020-01-01', 'to': '2020-01-02', 'group_by': 'doctor',
+        }).json() == []
+    finally:
+        with engine.connect() as connection:
+            for table in ('admission_daily_stats', 'admissions', 'doctors'):
+                connection.execute(text(f"DELETE FROM {table}"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            occupancy_index.warm(db)
+
+def test_lab_test_queue_claims_oldest_unclaimed(test_patients):
+    patient_id = test_patients[0].id
+    for test_name, ordered_at in (('CBC', '2027-01-01T09:00:00'), ('Lipids', '2027-01-01T08:00:00'),
+                                  ('TSH', '2027-01-01T10:00:00')):
+        client.post('/hospital/lab-tests', json={'patient_id': patient_id, 'ordered_by_doctor_id': 1,
+                                                 'test_name': test_name, 'ordered_at': ordered_at})
+    client.post('/hospital/lab-tests', json={'patient_id': patient_id, 'ordered_by_doctor_id': 1, 'test_name': 'Done',
+                                             'ordered_at': '2027-01-01T07:00:00', 'status': 'completed'})
+    try:
+        first = client.post('/hospital/lab-tests/queue/claim?limit=2')
+        assert first.status_code == 200
+        assert [t['test_name'] for t in first.json()] == ['Lipids', 'CBC']
+        assert {(t['status'], t['claimed_by']) for t in first.json()} == {('in_progress', 1)}
+
+        second = client.post('/hospital/lab-tests/queue/claim?limit=2').json()
+        assert [t['test_name'] for t in second] == ['TSH']
+        assert client.post('/hospital/lab-tests/queue/claim').json() == []
+
+        released = client.put(f"/hospital/lab-tests/{second[0]['id']}",
+                              json={'status': 'ordered', 'claimed_by': None, 'claimed_at': None})
+        assert released.json()['claimed_by'] is None
+        assert [t['id'] for t in client.post('/hospital/lab-tests/queue/claim').json()] == [second[0]['id']]
+        assert client.post('/hospital/lab-tests/queue/claim?limit=0').status_code == 422
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM lab_tests"))
+            connection.commit()
+
+def test_events_push_lab_test_and_appointment_changes(test_patients):
+    patient_id = test_patients[0].id
+    try:
+        with client.websocket_connect(f'/hospital/events/ws?topic=patient:{patient_id}&topic=doctor:3') as websocket:
+            assert websocket.receive_json() == {'type': 'subscribed', 'topics': [f'patient:{patient_id}', 'doctor:3']}
+            lab_test = client.post('/hospital/lab-tests', json={
+                'patient_id': patient_id, 'ordered_by_doctor_id': 3, 'test_name': 'CBC',
+                'ordered_at': '2027-01-01T09:00:00',
+            }).json()
+            created = [websocket.receive_json(), websocket.receive_json()]
+            assert {event['topic'] for event in created} == {f'patient:{patient_id}', 'doctor:3'}
+            assert {(event['type'], event['id']) for event in created} == {('lab_tests.created', lab_test['id'])}
+
+            client.put(f"/hospital/lab-tests/{lab_test['id']}", json={'result': 'normal', 'status': 'completed'})
+            updated = websocket.receive_json()
+            assert updated['type'] == 'lab_tests.updated'
+            assert updated['data']['result'] == 'normal'
+            websocket.receive_json()
+
+            # Another patient with another doctor: not on our topics.
+            client.post('/hospital/appointments', json={'patient_id': test_patients[1].id, 'doctor_id': 4,
+                                                        'scheduled_at': '2027-01-05T09:00:00'})
+            client.post('/hospital/appointments', json={'patient_id': test_patients[1].id, 'doctor_id': 3,
+                                                        'scheduled_at': '2027-01-05T10:00:00'})
+            event = websocket.receive_json()
+            assert (event['topic'], event['type']) == ('doctor:3', 'appointments.created')
+            assert event['data']['patient_id'] == test_patients[1].id
+
+        with pytest.raises(WebSocketDenialResponse) as denied:
+            with client.websocket_connect('/hospital/events/ws?topic=ward:1'):
+                pass
+        assert denied.value.status_code == 400
+    finally:
+        with engine.connect() as connection:
+            for table in ('appointments', 'lab_tests'):
+                connection.execute(text(f"DELETE FROM {table}"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            appointment_index.warm(db)
+
+def test_events_resync_after_missed_remote_write(test_patients, remote_writes):
+    patient_id = test_patients[0].id
+    try:
+        with client.websocket_connect(f'/hospital/events/ws?topic=patient:{patient_id}') as websocket:
+            websocket.receive_json()
+            remote_writes("UPDATE lab_tests SET result = 'pending' WHERE 0", 'lab_tests')
+            # This worker writes before it polls: the gap still reaches subscribers.
+            client.post('/hospital/lab-tests', json={'patient_id': patient_id, 'ordered_by_doctor_id': 3,
+                                                     'test_name': 'CBC', 'ordered_at': '2027-01-01T09:00:00'})
+            assert websocket.receive_json()['type'] == 'lab_tests.created'
+            assert websocket.receive_json() == {'type': 'resync', 'reason': 'remote_write', 'resource': 'lab_tests'}
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM lab_tests"))
+            connection.commit()
+
+def test_patient_search_ranks_prefix_then_fuzzy_matches(test_patients):
+    created = {}
+    for first_name, last_name, phone in (('John', 'Smith', '+1 (555) 010-2233'), ('Jane', 'Smithson', '555-777-8899'),
+                                         ('Joan', 'Smyth', None), ('Bob', 'Jones', '555 010 9999')):
+        created[last_name] = client.post('/hospital/patients', json={
+            'first_name': first_name, 'last_name': last_name, 'dob': '1980-05-01', 'phone': phone,
+            'email': f'{first_name.lower()}.{last_name.lower()}@example.com',
+        }).json()['id']
+
+    def search(q, **params):
+        response = client.get('/hospital/patients/search', params={'q': q, **params})
+        assert response.status_code == 200
+        return [patient['last_name'] for patient in response.json()]
+
+    assert search('smith') == ['Smith', 'Smithson', 'Smyth']
+    assert search('Smith', limit=1) == ['Smith']
+    assert search('smiht') == ['Smith']
+    assert search('john smith')[0] == 'Smith'
+    assert search('jane.smi') == ['Smithson']
+    assert search('010') == ['Smith', 'Jones']
+    assert search('5550102233') == ['Smith']
+    assert search('zzz') == []
+
+    client.put(f"/hospital/patients/{created['Smyth']}", json={'last_name': 'Smithers'})
+    assert search('smithers') == ['Smithers', 'Smith', 'Smithson']
+    client.delete(f"/hospital/patients/{created['Smith']}")
+    assert 'Smith' not in search('smith')
+
+    with TestSessionLocal() as db:
+        assert rebuild_search_grams(db, chunk_size=2) == 8
+    assert search('smitherz') == ['Smithers', 'Smithson']
+    assert client.get('/hospital/patients/search', params={'q': ''}).status_code == 422
+
+def test_medication_suggestions_follow_medication_writes():
+    created = {}
+    for name in ('Amoxicillin', 'Amoxicillin Clavulanate', 'Amlodipine', 'Co-amoxiclav', 'Ibuprofen'):
+        created[name] = client.post('/hospital/medications', json={'name': name}).json()['id']
+
+    def suggest(prefix, **params):
+        response = client.get('/hospital/medications/suggest', params={'prefix': prefix, **params})
+        assert response.status_code == 200
+        return [medication['name'] for medication in response.json()]
+
+    try:
+        assert suggest('am') == ['Amlodipine', 'Amoxicillin', 'Amoxicillin Clavulanate', 'Co-amoxiclav']
+        assert suggest('AMOX', limit=2) == ['Amoxicillin', 'Amoxicillin Clavulanate']
+        assert suggest('clav') == ['Amoxicillin Clavulanate']
+        assert client.get('/hospital/medications/suggest', params={'prefix': 'ibu'}).json() == [
+            {'id': created['Ibuprofen'], 'name': 'Ibuprofen'},
+        ]
+
+        client.put(f"/hospital/medications/{created['Ibuprofen']}", json={'name': 'Naproxen'})
+        assert suggest('ibu') == []
+        assert suggest('nap') == ['Naproxen']
+        client.delete(f"/hospital/medications/{created['Amlodipine']}")
+        assert suggest('aml') == []
+        assert suggest('zz') == []
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM medications"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            medication_names.warm(db)
+
+def test_medication_suggestions_after_missed_remote_write(remote_writes):
+    def suggest(prefix):
+        return [m['name'] for m in client.get('/hospital/medications/suggest', params={'prefix': prefix}).json()]
+
+    try:
+        with TestSessionLocal() as db:
+            medication_names.warm(db)
+        first = client.post('/hospital/medications', json={'name': 'Metformin'}).json()['id']
+        client.post('/hospital/medications', json={'name': 'Methotrexate'})
+        # Another worker renames one, and this worker writes before polling.
+        remote_writes(f"UPDATE medications SET name = 'Glipizide' WHERE id = {first}", 'medications')
+        client.post('/hospital/medications', json={'name': 'Metoprolol'})
+        invalidation_bus.poll()
+        assert suggest('met') == ['Methotrexate', 'Metoprolol']
+        assert suggest('gli') == ['Glipizide']
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM medications"))
+            connection.commit()
+        with TestSessionLocal() as db:
+            medication_names.warm(db)
+
+def test_index_reloads_once_on_first_read_after_invalidations(monkeypatch):
+    monkeypatch.setattr(indexes, 'SessionLocal', TestSessionLocal)
+    loads = []
+    load = medication_names.load
+    monkeypatch.setattr(medication_names, 'load', lambda db: loads.append(db) or load(db))
+
+    for version in range(5):
+        medication_names.invalidate(version)
+    assert loads == []
+    medication_names.suggest('a', 5)
+    medication_names.suggest('b', 5)
+    assert len(loads) == 1
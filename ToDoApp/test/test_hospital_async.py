@@ -0,0 +1,138 @@
+from datetime import date
+
+import fastapi.dependencies.utils
+import fastapi.routing
+
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, StaticPool
+
+from ..database import Base, apply_sqlite_profile, async_database_url
+from ..models import Patients
+from ..routers import hospital, hospital_async
+from ..routers.hospital import get_current_user
+from ..scheduling import appointment_index
+
+SQLALCHEMY_DATABASE_URL = 'sqlite:///./testdb.db'
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base.metadata.create_all(bind=engine)
+
+# The same database through aiosqlite, as HOSPITAL_ASYNC=1 would open it.
+async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+apply_sqlite_profile(async_engine.sync_engine)
+TestAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def override_get_db():
+    async with TestAsyncSessionLocal() as db:
+        yield db
+
+def override_get_sync_db():
+    db = TestSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def override_get_current_user():
+    return {'username': 'isejda', 'id': 1, 'role': 'admin'}
+
+# Routers in the order main.py includes them when HOSPITAL_ASYNC is set.
+app = FastAPI()
+app.include_router(hospital_async.router)
+app.include_router(hospital.router)
+app.dependency_overrides[hospital_async.get_db] = override_get_db
+app.dependency_overrides[hospital.get_db] = override_get_sync_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def test_patient():
+    db = TestSessionLocal()
+    patient = Patients(first_name='Async', last_name='Test', dob=date(1990, 1, 1), email='async@test.com')
+    db.add(patient)
+    db.commit()
+    yield patient
+    with engine.connect() as connection:
+        for table in ('appointments', 'patient_search_grams', 'patients'):
+            connection.execute(text(f"DELETE FROM {table}"))
+        connection.commit()
+    db.close()
+
+def test_async_routes_create_get_update_delete(client, test_patient):
+    response = client.post('/hospital/patients', json={
+        'first_name': 'Ada', 'last_name': 'Lovelace', 'dob': '1815-12-10', 'email': 'ada@test.com',
+    })
+    assert response.status_code == status.HTTP_201_CREATED
+    patient_id = response.json()['id']
+
+    assert client.get(f'/hospital/patients/{patient_id}').json()['last_name'] == 'Lovelace'
+    updated = client.put(f'/hospital/patients/{patient_id}', json={'phone': '555-0100'})
+    assert updated.json()['phone'] == '555-0100'
+    # The hooks ran on the async write too.
+    assert [p['id'] for p in client.get('/hospital/patients/search', params={'q': 'lovel'}).json()] == [patient_id]
+
+    assert client.delete(f'/hospital/patients/{patient_id}').status_code == status.HTTP_204_NO_CONTENT
+    assert client.get(f'/hospital/patients/{patient_id}').status_code == status.HTTP_404_NOT_FOUND
+    assert client.put(f'/hospital/patients/{patient_id}', json={'phone': '1'}).status_code == 404
+    assert client.delete(f'/hospital/patients/{patient_id}').status_code == 404
+
+def test_async_routes_reject_double_booking(client, test_patient):
+    def book(scheduled_at):
+        return client.post('/hospital/appointments', json={
+            'patient_id': test_patient.id, 'doctor_id': 11, 'scheduled_at': scheduled_at,
+        })
+
+    try:
+        first = book('2027-05-03T09:00:00')
+        assert first.status_code == status.HTTP_201_CREATED
+        assert book('2027-05-03T09:15:00').status_code == status.HTTP_409_CONFLICT
+        second = book('2027-05-03T10:00:00').json()['id']
+        moved = client.put(f'/hospital/appointments/{second}', json={'scheduled_at': '2027-05-03T09:10:00'})
+        assert moved.status_code == status.HTTP_409_CONFLICT
+    finally:
+        with TestSessionLocal() as db:
+            db.execute(text("DELETE FROM appointments"))
+            db.commit()
+            appointment_index.warm(db)
+
+def test_async_routes_bulk_create(client, test_patient):
+    try:
+        response = client.post('/hospital/appointments/bulk', json=[
+            {'patient_id': test_patient.id, 'doctor_id': 11, 'scheduled_at': '2027-05-04T09:00:00'},
+            {'patient_id': test_patient.id, 'doctor_id': 11, 'scheduled_at': '2027-05-04T09:10:00'},
+            {'patient_id': test_patient.id, 'doctor_id': 11, 'scheduled_at': '2027-05-04T11:00:00'},
+        ])
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['status'] for item in response.json()['items']] == ['created', 'failed', 'created']
+        listed = client.get('/hospital/appointments', params={'doctor_id': 11}).json()['items']
+        assert [a['scheduled_at'] for a in listed] == ['2027-05-04T09:00:00', '2027-05-04T11:00:00']
+    finally:
+        with TestSessionLocal() as db:
+            db.execute(text("DELETE FROM appointments"))
+            db.commit()
+            appointment_index.warm(db)
+
+def test_async_routes_do_not_use_the_threadpool(client, test_patient, monkeypatch):
+    hops = []
+    for module in (fastapi.dependencies.utils, fastapi.routing):
+        def counted(func, *args, run=module.run_in_threadpool, **kwargs):
+            hops.append(getattr(func, '__name__', func))
+            return run(func, *args, **kwargs)
+        monkeypatch.setattr(module, 'run_in_threadpool', counted)
+
+    assert client.get(f'/hospital/patients/{test_patient.id}').status_code == status.HTTP_200_OK
+    assert client.get('/hospital/patients', params={'last_name': 'Test', 'limit': 5}).status_code == 200
+    assert hops == []
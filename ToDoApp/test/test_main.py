@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
 from ..main import app
+from ..routers.auth import get_current_user
 from fastapi import status
 
 client = TestClient(app)
@@ -7,4 +8,16 @@ client = TestClient(app)
 def test_return_health_check():
     response = client.get('/healthy')
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == {'status': 'healthy'}
\ No newline at end of file
+    assert response.json() == {'status': 'healthy'}
+
+def test_db_pool_metrics_requires_admin(monkeypatch):
+    monkeypatch.delitem(app.dependency_overrides, get_current_user, raising=False)
+    assert client.get('/metrics/db-pool').status_code == status.HTTP_401_UNAUTHORIZED
+
+    monkeypatch.setitem(app.dependency_overrides, get_current_user, lambda: {'username': 'doc', 'id': 2, 'role': 'doctor'})
+    assert client.get('/metrics/db-pool').status_code == status.HTTP_403_FORBIDDEN
+
+    monkeypatch.setitem(app.dependency_overrides, get_current_user, lambda: {'username': 'isejda', 'id': 1, 'role': 'admin'})
+    response = client.get('/metrics/db-pool')
+    assert response.status_code == status.HTTP_200_OK
+    assert 'checkouts' in response.json()
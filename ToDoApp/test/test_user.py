@@ -1,6 +1,10 @@
-from fastapi import status
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException, status
 
 from .utils import *
+from ..routers.auth import create_access_token
 from ..routers.users import get_db, get_current_user
 
 app.dependency_overrides[get_db]  = override_get_db
@@ -20,6 +24,17 @@ def test_change_password_success(test_user):
     response = client.post("/user/change_password/", json={"password": "123", "new_password":"1234"})
     assert response.status_code == status.HTTP_204_NO_CONTENT
 
+@pytest.mark.asyncio
+async def test_change_password_revokes_existing_tokens(test_user):
+    token = create_access_token(username='isejda', user_id=test_user.id, role='admin', expires_delta=timedelta(minutes=5))
+    assert (await get_current_user(token=token))['id'] == test_user.id
+
+    response = client.post("/user/change_password/", json={"password": "123", "new_password":"1234"})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    with pytest.raises(HTTPException) as e:
+        await get_current_user(token=token)
+    assert e.value.status_code == 401
+
 def test_change_password_invalid_current_password(test_user):
     response = client.post("/user/change_password/", json={"password": "WRONG", "new_password":"1234"})
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
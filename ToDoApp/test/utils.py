@@ -6,7 +6,7 @@ from sqlalchemy.pool import StaticPool
 
 from ..database import Base
 from ..main import app
-from ..models import Todos, Users
+from ..models import Users
 from ..routers.auth import bcrypt_context
 
 SQLALCHEMY_DATABASE_URL = 'sqlite:///./testdb.db'
@@ -30,24 +30,6 @@ def override_get_current_user():
 
 client = TestClient(app)
 
-@pytest.fixture
-def test_todo():
-    todo =  Todos(
-        title="learn the codee!",
-        description="Need to learn everyday",
-        priority=5,
-        complete=False,
-        owner_id=1,
-    )
-
-    db = TestSessionLocal()
-    db.add(todo)
-    db.commit()
-    yield todo
-    with engine.connect() as connection:
-        connection.execute(text("DELETE FROM todos"))
-        connection.commit()
-
 @pytest.fixture
 def test_user():
     user =  Users(
@@ -0,0 +1,92 @@
+"""Appointment conflict checks: the in-memory per-doctor index on its own,
+then bookings per second through POST /hospital/appointments for accepted
+and double-booked slots, on a throwaway SQLite database.
+
+    python -m benchmarks.bench_appointments --doctors 200 --bookings 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_appointments.db")
+
+from fastapi.testclient import TestClient
+
+from ToDoApp.main import app
+from ToDoApp.routers.auth import get_current_user
+from ToDoApp.scheduling import AppointmentIndex
+
+START = datetime(2027, 1, 4, 8, 0)
+
+
+def slot(i: int, doctors: int) -> tuple[int, datetime]:
+    # Half-hour slots, filling every doctor's day before moving on to the next.
+    return 1 + i % doctors, START + timedelta(minutes=30 * (i // doctors))
+
+
+def bench_index(doctors: int, per_doctor: int, checks: int) -> float:
+    index = AppointmentIndex()
+    for i in range(doctors * per_doctor):
+        doctor_id, scheduled_at = slot(i, doctors)
+        index.put(SimpleNamespace(id=i + 1, doctor_id=doctor_id, scheduled_at=scheduled_at,
+                                  duration_minutes=30, status="scheduled"))
+    probes = [slot(random.randrange(doctors * per_doctor * 2), doctors) for _ in range(checks)]
+    started = time.perf_counter()
+    for doctor_id, scheduled_at in probes:
+        index.find_conflict(doctor_id, scheduled_at, scheduled_at + timedelta(minutes=30))
+    return (time.perf_counter() - started) / checks * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=5000, help="bookings sent one request at a time")
+    parser.add_argument("--bulk-bookings", type=int, default=50000, help="bookings sent through /bulk")
+    parser.add_argument("--batch", type=int, default=5000, help="items per bulk request")
+    parser.add_argument("--per-doctor", type=int, default=2000, help="bookings per doctor in the index-only run")
+    parser.add_argument("--checks", type=int, default=200000)
+    args = parser.parse_args()
+
+    micros = bench_index(args.doctors, args.per_doctor, args.checks)
+    print(f"index check : {micros:9.2f} us  ({args.doctors * args.per_doctor} bookings indexed)")
+
+    app.dependency_overrides[get_current_user] = lambda: {'username': 'bench', 'id': 1, 'role': 'admin'}
+    # As a context manager the client keeps one event loop and runs the
+    # lifespan, which warms the appointment index like a real worker boot.
+    with TestClient(app) as client:
+        def appointment(i: int) -> dict:
+            doctor_id, scheduled_at = slot(i, args.doctors)
+            return {"patient_id": 1, "doctor_id": doctor_id, "scheduled_at": scheduled_at.isoformat()}
+
+        def book(i: int) -> int:
+            return client.post("/hospital/appointments", json=appointment(i)).status_code
+
+        started = time.perf_counter()
+        for i in range(args.bookings):
+            assert book(i) == 201
+        accepted = args.bookings / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for i in range(args.bookings):
+            assert book(i) == 409
+        rejected = args.bookings / (time.perf_counter() - started)
+
+        # Later slots, so none of these collide with the bookings above.
+        items = [appointment(args.bookings + i) for i in range(args.bulk_bookings)]
+        started = time.perf_counter()
+        for start in range(0, len(items), args.batch):
+            response = client.post("/hospital/appointments/bulk", json=items[start:start + args.batch])
+            assert response.json()["created"] == len(items[start:start + args.batch])
+        bulk = args.bulk_bookings / (time.perf_counter() - started)
+
+    print(f"accepted    : {accepted:9.0f} bookings/s")
+    print(f"conflicting : {rejected:9.0f} bookings/s  (rejected from the index, no query)")
+    print(f"bulk        : {bulk:9.0f} bookings/s  ({args.batch} items per request)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Throughput of the sync and async hospital routers under concurrent load.
+
+Each statement sleeps for --db-latency-ms to model a remote database. Sync
+handlers hold one of the 40 Starlette threadpool slots for that time; async
+handlers only hold a pooled connection.
+
+    python -m benchmarks.bench_async_router --clients 200 --db-latency-ms 20
+    python -m benchmarks.bench_async_router --path "/hospital/patients?last_name=Smith&limit=20"
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_async.db")
+os.environ["HOSPITAL_ASYNC"] = "1"
+# More connections than clients, so the pool is never the bottleneck.
+os.environ.setdefault("DB_POOL_SIZE", "250")
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.util import await_only
+
+from ToDoApp.database import SessionLocal, async_engine, engine
+from ToDoApp.main import app as _app  # noqa: F401  creates the tables
+from ToDoApp.models import Departments
+from ToDoApp.routers import hospital, hospital_async
+from ToDoApp.routers.auth import get_current_user
+
+
+async def bench_user():
+    return {'username': 'bench', 'id': 1, 'role': 'admin'}
+
+
+def build_app(router) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_current_user] = bench_user
+    return app
+
+
+async def load(app: FastAPI, path: str, clients: int, requests_per_client: int) -> tuple:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in range(requests_per_client):
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(clients)])
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests-per-client", type=int, default=5)
+    parser.add_argument("--db-latency-ms", type=float, default=20)
+    parser.add_argument("--path", default="/hospital/departments/1")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    if db.get(Departments, 1) is None:
+        db.add(Departments(id=1, name="Cardiology"))
+        db.commit()
+    db.close()
+
+    delay = args.db_latency_ms / 1000
+
+    # Sync statements wait in their worker thread; async ones yield to the loop.
+    event.listen(engine, "before_cursor_execute", lambda *_: time.sleep(delay))
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *_: await_only(asyncio.sleep(delay)))
+
+    async def run():
+        for label, router in (("sync ", hospital.router), ("async", hospital_async.router)):
+            app = build_app(router)
+            await load(app, args.path, args.clients, 1)  # warm the pool so connects are not timed
+            throughput, p50, p99 = await load(app, args.path, args.clients, args.requests_per_client)
+            print(f"{label}: {throughput:7.1f} req/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms")
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
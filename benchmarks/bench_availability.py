@@ -0,0 +1,90 @@
+"""Latency of GET /hospital/doctors/availability over 500 doctors and 30 days
+of bookings, answered from the warm appointment index and, for comparison,
+from a range query with a cold index, on a throwaway SQLite database.
+
+    python -m benchmarks.bench_availability --doctors 500 --days 30
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_availability.db")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from ToDoApp.database import SessionLocal
+from ToDoApp.main import app
+from ToDoApp.models import Appointments, Doctors
+from ToDoApp.routers.auth import get_current_user
+from ToDoApp.scheduling import AppointmentIndex, available_slots, working_hours
+
+
+def seed(doctors: int, start: datetime, days: int, per_day: int) -> None:
+    # Every doctor is booked for the first `per_day` half hours of each working day.
+    with SessionLocal() as db:
+        db.execute(insert(Doctors.__table__), [
+            {"first_name": "Dr", "last_name": f"D{i}", "email": f"d{i}@bench", "specialization": "Cardiology"}
+            for i in range(doctors)
+        ])
+        rows = [
+            {"patient_id": 1, "doctor_id": doctor_id, "scheduled_at": opens + timedelta(minutes=30 * slot),
+             "duration_minutes": 30, "status": "scheduled"}
+            for opens, _ in working_hours(start, start + timedelta(days=days))
+            for doctor_id in range(1, doctors + 1)
+            for slot in range(per_day)
+        ]
+        db.execute(insert(Appointments.__table__), rows)
+        db.commit()
+    print(f"seeded {doctors} doctors and {len(rows)} appointments")
+
+
+def timed(call, repeat: int) -> tuple:
+    call()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--per-day", type=int, default=12, help="booked half hours per doctor and working day")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today + timedelta(days=7 - today.weekday())  # next Monday
+    end = start + timedelta(days=args.days)
+    seed(args.doctors, start, args.days, args.per_day)
+
+    app.dependency_overrides[get_current_user] = lambda: {'username': 'bench', 'id': 1, 'role': 'admin'}
+    params = {"specialization": "Cardiology", "from": start.isoformat(), "to": end.isoformat(), "limit": args.limit}
+    with TestClient(app) as client:  # the lifespan warms the index
+        def request():
+            return client.get("/hospital/doctors/availability", params=params).json()
+        p50, p95 = timed(request, args.repeat)
+        print(f"endpoint, warm index: p50 {p50:7.1f} ms  p95 {p95:7.1f} ms")
+        warm = [(slot["start"], slot["doctor_id"]) for slot in request()]
+
+    doctor_ids = list(range(1, args.doctors + 1))
+    with SessionLocal() as db:
+        def cold():
+            return available_slots(db, AppointmentIndex(), doctor_ids, start, end, timedelta(minutes=30),
+                                   args.limit)
+        p50, p95 = timed(cold, max(args.repeat // 10, 3))
+        print(f"range query, cold   : p50 {p50:7.1f} ms  p95 {p95:7.1f} ms")
+        assert [(slot.isoformat(), doctor_id) for slot, doctor_id in cold()] == warm
+
+
+if __name__ == "__main__":
+    main()
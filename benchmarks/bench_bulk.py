@@ -0,0 +1,55 @@
+"""Rows per second for creating lab tests one request at a time versus
+through POST /hospital/lab-tests/bulk, on a throwaway SQLite database.
+
+    python -m benchmarks.bench_bulk --rows 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_bulk.db")
+
+from fastapi.testclient import TestClient
+
+from ToDoApp.main import app
+from ToDoApp.routers.auth import get_current_user
+
+
+def lab_test(i: int) -> dict:
+    return {
+        "patient_id": 1 + i % 500,
+        "ordered_by_doctor_id": 1 + i % 20,
+        "test_name": f"Panel {i % 40}",
+        "ordered_at": f"2026-01-{1 + i % 28:02d}T08:00:00",
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--single-rows", type=int, default=1000, help="rows sent one request at a time")
+    parser.add_argument("--batch", type=int, default=10000, help="items per bulk request")
+    args = parser.parse_args()
+
+    app.dependency_overrides[get_current_user] = lambda: {'username': 'bench', 'id': 1, 'role': 'admin'}
+    client = TestClient(app)
+
+    started = time.perf_counter()
+    for i in range(args.single_rows):
+        assert client.post("/hospital/lab-tests", json=lab_test(i)).status_code == 201
+    single = args.single_rows / (time.perf_counter() - started)
+
+    items = [lab_test(i) for i in range(args.rows)]
+    started = time.perf_counter()
+    for start in range(0, args.rows, args.batch):
+        response = client.post("/hospital/lab-tests/bulk", json=items[start:start + args.batch])
+        assert response.json()["created"] == len(items[start:start + args.batch])
+    bulk = args.rows / (time.perf_counter() - started)
+
+    print(f"single: {single:9.0f} rows/s")
+    print(f"bulk  : {bulk:9.0f} rows/s  ({args.batch} items per request)")
+
+
+if __name__ == "__main__":
+    main()
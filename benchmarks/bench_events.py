@@ -0,0 +1,60 @@
+"""Event hub fan-out: events published from a worker thread, as sync
+handlers do, to subscribers on an event loop, with publish cost and
+publish-to-delivery latency.
+
+    python -m benchmarks.bench_events --subscribers 2000 --topics 200 --events 5000
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+from ToDoApp.events import EventHub
+
+
+async def run(subscribers: int, topics: int, events: int) -> None:
+    hub = EventHub(size=events + 1)
+    subscriptions = [hub.subscribe([f"doctor:{i % topics}"]) for i in range(subscribers)]
+    per_topic = subscribers // topics
+    publish_times = []
+
+    def publisher() -> None:
+        for i in range(events):
+            started = time.perf_counter()
+            hub.publish(f"doctor:{i % topics}", {"type": "lab_tests.updated", "id": i, "sent": time.perf_counter()})
+            publish_times.append((time.perf_counter() - started) * 1e6)
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=publisher)
+    thread.start()
+    latencies = []
+    expected = events * per_topic
+    while len(latencies) < expected:
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        for subscription in subscriptions:
+            while not subscription.queue.empty():
+                message = subscription.queue.get_nowait()
+                sent = float(message.rsplit('"sent": ', 1)[1].rstrip("}"))
+                latencies.append((now - sent) * 1000)
+    elapsed = time.perf_counter() - started
+    thread.join()
+
+    latencies.sort()
+    print(f"{subscribers} subscribers on {topics} topics, {events} events: {expected / elapsed:9.0f} deliveries/s")
+    print(f"publish: p50 {statistics.median(publish_times):6.1f} us  "
+          f"delivery: p50 {statistics.median(latencies):6.2f} ms  p95 {latencies[int(len(latencies) * 0.95) - 1]:6.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--events", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.subscribers, args.topics, args.events))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Query plans and latency for the hospital access paths, before and after
+the 9b2f4e6a1d3c index migration, on a seeded SQLite database.
+
+    python -m benchmarks.bench_indexes --patients 20000 --appointments 200000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, text
+
+from ToDoApp.models import (
+    Admissions,
+    Appointments,
+    Base,
+    Doctors,
+    InvoiceItems,
+    Invoices,
+    LabTests,
+    Patients,
+    PrescriptionItems,
+    Prescriptions,
+)
+
+INDEXED_TABLES = (Appointments, Admissions, Prescriptions, PrescriptionItems, LabTests, Invoices, InvoiceItems)
+
+QUERIES = {
+    "appointments by patient": (
+        "SELECT * FROM appointments WHERE patient_id = :patient_id ORDER BY scheduled_at DESC",
+    ),
+    "doctor day schedule": (
+        "SELECT * FROM appointments WHERE doctor_id = :doctor_id "
+        "AND scheduled_at >= :day AND scheduled_at < :next_day ORDER BY scheduled_at",
+    ),
+    "current admissions": ("SELECT * FROM admissions WHERE discharged_at IS NULL",),
+    "lab work queue": (
+        "SELECT * FROM lab_tests WHERE status = 'ordered' ORDER BY ordered_at LIMIT 20",
+    ),
+    "invoices by patient": (
+        "SELECT * FROM invoices WHERE patient_id = :patient_id ORDER BY issued_at DESC",
+    ),
+    "invoice items": ("SELECT * FROM invoice_items WHERE invoice_id = :invoice_id",),
+    "prescription items": ("SELECT * FROM prescription_items WHERE prescription_id = :prescription_id",),
+}
+
+
+def seed(engine, patients: int, doctors: int, appointments: int) -> None:
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1, 8)
+    child_rows = appointments // 4
+
+    def when() -> datetime:
+        return start + timedelta(minutes=30 * rng.randrange(365 * 18))
+
+    with engine.begin() as connection:
+        connection.execute(insert(Patients), [
+            {"first_name": f"First{i}", "last_name": f"Last{i}", "email": f"patient{i}@example.com"}
+            for i in range(patients)
+        ])
+        connection.execute(insert(Doctors), [
+            {"first_name": f"Doc{i}", "last_name": f"Tor{i}", "email": f"doctor{i}@example.com"}
+            for i in range(doctors)
+        ])
+        connection.execute(insert(Appointments), [
+            {"patient_id": rng.randint(1, patients), "doctor_id": rng.randint(1, doctors),
+             "scheduled_at": when(), "status": "scheduled"}
+            for _ in range(appointments)
+        ])
+        connection.execute(insert(Admissions), [
+            {"patient_id": rng.randint(1, patients), "attending_doctor_id": rng.randint(1, doctors),
+             "admitted_at": when(), "discharged_at": None if rng.random() < 0.02 else when(),
+             "room_number": str(rng.randint(100, 999))}
+            for _ in range(child_rows)
+        ])
+        connection.execute(insert(LabTests), [
+            {"patient_id": rng.randint(1, patients), "ordered_by_doctor_id": rng.randint(1, doctors),
+             "test_name": "CBC", "ordered_at": when(),
+             "status": "ordered" if rng.random() < 0.05 else "completed"}
+            for _ in range(child_rows)
+        ])
+        connection.execute(insert(Invoices), [
+            {"patient_id": rng.randint(1, patients), "issued_at": when(), "total_amount": 0, "status": "unpaid"}
+            for _ in range(child_rows)
+        ])
+        connection.execute(insert(InvoiceItems), [
+            {"invoice_id": rng.randint(1, child_rows), "description": "Consultation", "amount": 50}
+            for _ in range(child_rows * 3)
+        ])
+        connection.execute(insert(Prescriptions), [
+            {"patient_id": rng.randint(1, patients), "doctor_id": rng.randint(1, doctors), "issued_at": when()}
+            for _ in range(child_rows)
+        ])
+        connection.execute(insert(PrescriptionItems), [
+            {"prescription_id": rng.randint(1, child_rows), "medication_id": None,
+             "dosage": "1", "frequency": "daily", "duration_days": 7}
+            for _ in range(child_rows * 2)
+        ])
+
+
+def access_path_indexes():
+    return [index for model in INDEXED_TABLES for index in model.__table__.indexes
+            if index.name != f"ix_{model.__tablename__}_id"]
+
+
+def measure(engine, params: dict, repeat: int) -> dict:
+    results = {}
+    with engine.connect() as connection:
+        for name, (sql,) in QUERIES.items():
+            plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).all()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                connection.execute(text(sql), params).all()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (statistics.median(timings), " | ".join(row[-1] for row in plan))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--appointments", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    for index in access_path_indexes():
+        index.drop(engine)
+    seed(engine, args.patients, args.doctors, args.appointments)
+
+    day = datetime(2025, 3, 3)
+    params = {"patient_id": args.patients // 2, "doctor_id": args.doctors // 2, "day": day,
+              "next_day": day + timedelta(days=1), "invoice_id": 1, "prescription_id": 1}
+
+    before = measure(engine, params, args.repeat)
+    for index in access_path_indexes():
+        index.create(engine)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    after = measure(engine, params, args.repeat)
+
+    for name in QUERIES:
+        (before_ms, before_plan), (after_ms, after_plan) = before[name], after[name]
+        print(f"{name}: {before_ms:.3f} ms -> {after_ms:.3f} ms ({before_ms / max(after_ms, 1e-6):.0f}x)")
+        print(f"    before: {before_plan}")
+        print(f"    after:  {after_plan}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Claims per second from the lab test queue with dozens of concurrent
+claimers, each taking a few tests at a time until the queue is empty, on a
+throwaway SQLite database. Checks that no test is claimed twice.
+
+    python -m benchmarks.bench_lab_queue --tests 20000 --claimers 32 --batch 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_lab_queue.db")
+
+from sqlalchemy import insert
+
+from ToDoApp.database import Base, SessionLocal, engine
+from ToDoApp.labqueue import claim_lab_tests
+from ToDoApp.models import LabTests
+
+
+def seed(tests: int) -> None:
+    start = datetime(2027, 1, 1)
+    with SessionLocal() as db:
+        db.execute(insert(LabTests.__table__), [
+            {"patient_id": 1, "ordered_by_doctor_id": 1, "test_name": f"T{i}",
+             "ordered_at": start + timedelta(seconds=i), "status": "ordered"}
+            for i in range(tests)
+        ])
+        db.commit()
+    print(f"seeded {tests} ordered lab tests")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tests", type=int, default=20000)
+    parser.add_argument("--claimers", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    seed(args.tests)
+    claimed, timings = [], []
+    lock = threading.Lock()
+
+    def claimer(user_id: int) -> None:
+        with SessionLocal() as db:
+            while True:
+                started = time.perf_counter()
+                rows = claim_lab_tests(db, user_id, args.batch)
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    claimed.extend(row.id for row in rows)
+                    timings.append(elapsed)
+                if not rows:
+                    return
+
+    threads = [threading.Thread(target=claimer, args=(i + 1,)) for i in range(args.claimers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    assert len(claimed) == len(set(claimed)) == args.tests, "a test was claimed twice or not at all"
+    timings.sort()
+    print(f"{args.claimers} claimers: {len(claimed) / elapsed:8.0f} tests/s, {len(timings) / elapsed:6.0f} claims/s")
+    print(f"claim latency: p50 {statistics.median(timings):6.2f} ms  "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:6.2f} ms  max {timings[-1]:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
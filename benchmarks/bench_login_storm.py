@@ -0,0 +1,95 @@
+"""Latency of an unrelated route while a burst of logins is in flight.
+
+Compares the dedicated password executor with bcrypt running inline on the
+event loop (--inline reproduces the old behaviour).
+
+    python -m benchmarks.bench_login_storm --logins 40
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import Executor, Future
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_login.db")
+
+import httpx
+
+from ToDoApp.main import app
+from ToDoApp.database import SessionLocal
+from ToDoApp.models import Users
+from ToDoApp.routers import auth
+
+
+class InlineExecutor(Executor):
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event) -> list:
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/healthy")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+async def run(logins: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        idle_probe = asyncio.create_task(probe(client, stop))
+        await asyncio.sleep(1)
+        stop.set()
+        idle = await idle_probe
+
+        stop = asyncio.Event()
+        storm_probe = asyncio.create_task(probe(client, stop))
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/auth/token/", data={"username": "bench", "password": "bench-password"})
+            for _ in range(logins)
+        ])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        storm = await storm_probe
+
+    assert all(response.status_code == 200 for response in responses)
+    print(f"{logins} logins in {elapsed:.2f} s")
+    print(f"/healthy idle:   p50 {statistics.median(idle):.1f} ms  p99 {percentile(idle, 0.99):.1f} ms")
+    print(f"/healthy storm:  p50 {statistics.median(storm):.1f} ms  p99 {percentile(storm, 0.99):.1f} ms"
+          f"  ({len(storm)} probes)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--inline", action="store_true", help="hash on the event loop (old behaviour)")
+    args = parser.parse_args()
+
+    if args.inline:
+        auth.password_executor = InlineExecutor()
+
+    db = SessionLocal()
+    if auth.get_user_by_username("bench", db) is None:
+        db.add(Users(username="bench", email="bench@example.com", role="admin",
+                     hashed_password=auth.bcrypt_context.hash("bench-password")))
+        db.commit()
+    db.close()
+
+    asyncio.run(run(args.logins))
+
+
+if __name__ == "__main__":
+    main()
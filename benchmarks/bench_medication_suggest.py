@@ -0,0 +1,85 @@
+"""Medication autocomplete: suggest() on the in-memory name index, one
+incremental write, and GET /hospital/medications/suggest end to end, over a
+generated formulary on a throwaway SQLite database.
+
+    python -m benchmarks.bench_medication_suggest --medications 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_medication_suggest.db")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from ToDoApp.database import SessionLocal
+from ToDoApp.formulary import medication_names
+from ToDoApp.main import app
+from ToDoApp.models import Medications
+from ToDoApp.routers.auth import get_current_user
+
+STEMS = ("amox", "clav", "ibu", "para", "met", "losar", "atorva", "predni", "cef", "doxy", "lev", "omep", "sert",
+         "flu", "gaba", "hydro", "lis", "war", "insu", "azi")
+ENDINGS = ("icillin", "ulanate", "profen", "cetamol", "formin", "tan", "statin", "solone", "alexin", "cycline",
+           "othyroxine", "razole", "raline", "oxetine", "pentin", "chlorothiazide", "inopril", "farin", "lin", "thromycin")
+FORMS = ("", " 250 mg", " 500 mg", " oral suspension", " tablets", " injection", " XR")
+
+
+def formulary(count: int, rng: random.Random) -> list[str]:
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(STEMS)}{rng.choice(ENDINGS)}{rng.choice(FORMS)} {rng.randrange(1000)}".capitalize())
+    return sorted(names)
+
+
+def percentiles(timings: list) -> str:
+    timings.sort()
+    return f"p50 {statistics.median(timings):7.1f}  p95 {timings[int(len(timings) * 0.95) - 1]:7.1f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--medications", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    names = formulary(args.medications, rng)
+    with SessionLocal() as db:
+        db.execute(insert(Medications.__table__), [{"name": name} for name in names])
+        db.commit()
+        started = time.perf_counter()
+        medication_names.warm(db)
+    print(f"{len(names)} medications, index built in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    prefixes = [rng.choice(names)[:rng.randint(1, 6)] for _ in range(args.queries)]
+    timings = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        medication_names.suggest(prefix, 10)
+        timings.append((time.perf_counter() - started) * 1e6)
+    print(f"suggest(), in memory  : {percentiles(timings)} us")
+
+    timings = []
+    for i in range(200):
+        started = time.perf_counter()
+        medication_names.record(10 ** 9 + i, f"Benchmarkol {i}")
+        timings.append((time.perf_counter() - started) * 1e6)
+    print(f"record(), incremental : {percentiles(timings)} us")
+
+    app.dependency_overrides[get_current_user] = lambda: {'username': 'bench', 'id': 1, 'role': 'admin'}
+    with TestClient(app) as client:
+        timings = []
+        for prefix in prefixes[:500]:
+            started = time.perf_counter()
+            client.get("/hospital/medications/suggest", params={"prefix": prefix})
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"endpoint              : {percentiles(timings)} ms")
+
+
+if __name__ == "__main__":
+    main()
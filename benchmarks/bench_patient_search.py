@@ -0,0 +1,101 @@
+"""Latency of GET /hospital/patients/search over a large patient table for a
+mix of name prefixes, misspelled names, full names and phone fragments, on a
+throwaway SQLite database.
+
+    python -m benchmarks.bench_patient_search --patients 2000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_patient_search.db")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from ToDoApp.database import SessionLocal
+from ToDoApp.main import app
+from ToDoApp.models import Patients
+from ToDoApp.patient_search import rebuild_search_grams
+from ToDoApp.routers.auth import get_current_user
+
+SYLLABLES = ("an", "ber", "car", "dan", "el", "fer", "gar", "hal", "is", "jo", "ka", "lin", "mar", "ne", "ol",
+             "per", "qu", "ro", "sa", "ton", "ul", "vin", "wil", "xa", "yo", "zen", "mith", "son", "ley", "ez")
+
+
+def names(count: int, rng: random.Random) -> list[str]:
+    found = set()
+    while len(found) < count:
+        found.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize())
+    return sorted(found)
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def seed(patients: int, rng: random.Random) -> tuple[list, list]:
+    first_names, last_names = names(800, rng), names(5000, rng)
+    rows = []
+    with SessionLocal() as db:
+        for start in range(0, patients, 50000):
+            batch = [
+                {"first_name": rng.choice(first_names), "last_name": rng.choice(last_names),
+                 "dob": date(1950 + i % 60, 1 + i % 12, 1 + i % 28), "phone": f"555{rng.randrange(10 ** 7):07d}",
+                 "email": f"patient{i}@bench.example"}
+                for i in range(start, min(start + 50000, patients))
+            ]
+            db.execute(insert(Patients.__table__), batch)
+            db.commit()
+            rows.extend(rng.sample(batch, 20))
+        started = time.perf_counter()
+        rebuild_search_grams(db)
+    print(f"seeded {patients} patients, indexed in {time.perf_counter() - started:.1f} s")
+    return rows, last_names
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    samples, last_names = seed(args.patients, rng)
+    kinds = {
+        "prefix": lambda row: row["last_name"][:rng.randint(2, 5)].lower(),
+        "full name": lambda row: f"{row['first_name']} {row['last_name'][:4]}",
+        "misspelled": lambda row: misspell(row["last_name"], rng),
+        "phone": lambda row: row["phone"][-rng.randint(4, 7):],
+    }
+    app.dependency_overrides[get_current_user] = lambda: {'username': 'bench', 'id': 1, 'role': 'admin'}
+    with TestClient(app) as client:
+        every = []
+        for kind, make in kinds.items():
+            timings, found = [], 0
+            for _ in range(args.queries // len(kinds)):
+                row = rng.choice(samples)
+                q = make(row)
+                started = time.perf_counter()
+                response = client.get("/hospital/patients/search", params={"q": q, "limit": args.limit})
+                timings.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200
+                # Did the sampled patient's name (or phone) make the results?
+                found += any(match["last_name"] == row["last_name"] if kind != "phone" else match["phone"] == row["phone"]
+                             for match in response.json())
+            timings.sort()
+            every.extend(timings)
+            print(f"{kind:10}: p50 {statistics.median(timings):6.1f} ms  p95 {timings[int(len(timings) * 0.95) - 1]:6.1f} ms"
+                  f"  found {found / len(timings):4.0%}")
+        every.sort()
+        print(f"{'all':10}: p50 {statistics.median(every):6.1f} ms  p95 {every[int(len(every) * 0.95) - 1]:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()